@@ -0,0 +1,189 @@
+"""
+duration_spill.py - Spill the durations of workflow runs to disk under a memory budget, and select exact medians.
+
+Description:
+    The average and median durations of a group of runs are exact, so every duration of the group is kept until the
+    stats are calculated. For the runs of a whole org over a year, the durations of the busiest workflows may not fit
+    in memory. When the `EVALUATION_MEMORY_MB` environment variable is set, `evaluate_workflow_runs.py` keeps the
+    durations held in memory by all groups under that budget, counting `BYTES_PER_DURATION` bytes per duration (a
+    list slot and a float object). When the budget is exceeded, the durations of the group with the most durations
+    in memory are appended to a temporary file as 8-byte floats, and removed from memory. The groups are kept in
+    buckets by the number of durations they hold in memory, so the largest group is found without a scan of every
+    group. Every group keeps the segments of the file that it spilled, and all groups share one file, so the open
+    files do not grow with the number of groups.
+
+    The stats of a group with spilled durations are calculated exactly as they are in memory:
+
+        - The average is the exact sum of the durations streamed from the file, divided by their number and rounded
+          once, as `statistics.mean` returns it, without holding the durations in memory.
+        - The median is selected by rank with a multi-pass radix selection over the streamed durations. Every pass
+          counts the durations in 65,536 buckets of the next 16 bits of their sortable bit pattern, within the bucket
+          of the previous passes that holds the rank. Once the bucket holds few enough durations to fit in the
+          budget, or in the memory of the counters of a pass, they are sorted in memory. The median of an even
+          number of durations is the mean of the two middle durations, as `statistics.median` returns it.
+
+    So the results are bit-identical to the in-memory stats, while the memory held is bounded by the budget and
+    the 65,536 counters of a pass.
+"""
+
+import array
+import os
+import struct
+import tempfile
+
+from fractions import Fraction
+
+BYTES_PER_DURATION = 32
+
+# Number of durations read from a spill file at a time
+READ_CHUNK = 65536
+
+# Number of bits of the sortable bit pattern of a duration counted in every pass of the selection
+RADIX_BITS = 16
+
+# Number of buckets counted in every pass of the selection
+SELECT_BUCKETS = 1 << RADIX_BITS
+
+_SIGN_BIT = 1 << 63
+_MASK = (1 << 64) - 1
+
+
+def memory_budget():
+    """Return the number of durations that can be held in memory, as set in `EVALUATION_MEMORY_MB`, or None."""
+    value = os.getenv('EVALUATION_MEMORY_MB')
+    if not value:
+        return None
+    return max(1, int(float(value) * 1024 * 1024) // BYTES_PER_DURATION)
+
+
+def sort_key(value):
+    """Return the bit pattern of a float as an unsigned integer that sorts in the same order as the floats."""
+    bits = struct.unpack('<Q', struct.pack('<d', value))[0]
+    return (~bits & _MASK) if bits & _SIGN_BIT else bits | _SIGN_BIT
+
+
+def exact_mean(values):
+    """Return the mean of an iterable of numbers, as `statistics.mean` returns it for a list of them.
+
+    The values are summed exactly as integer numerators per power-of-two denominator, so only the partial sums are
+    held in memory.
+    """
+    partials = {}
+    count = 0
+    for value in values:
+        numerator, denominator = value.as_integer_ratio()
+        partials[denominator] = partials.get(denominator, 0) + numerator
+        count += 1
+    return float(sum(Fraction(numerator, denominator) for denominator, numerator in partials.items()) / count)
+
+
+class SpillFile:
+    """A temporary file that the durations of every group are spilled to, in segments."""
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.size = 0
+
+    def append(self, durations):
+        """Append durations to the file, and return the offset of their segment."""
+        offset = self.size
+        self.file.seek(0, os.SEEK_END)
+        array.array('d', durations).tofile(self.file)
+        self.size += len(durations)
+        return offset
+
+    def read(self, offset, count):
+        """Return an iterator over the durations of a segment."""
+        while count:
+            # Seek before every chunk, as the segments of other groups may be read in between
+            self.file.seek(offset * 8)
+            chunk = array.array('d')
+            chunk.fromfile(self.file, min(READ_CHUNK, count))
+            offset += len(chunk)
+            count -= len(chunk)
+            yield from chunk
+
+
+class SpilledDurations:
+    """The durations of a group that were spilled to the segments of a spill file."""
+
+    def __init__(self, spill_file):
+        self.spill_file = spill_file
+        self.segments = []
+        self.count = 0
+
+    def append(self, durations):
+        self.segments.append((self.spill_file.append(durations), len(durations)))
+        self.count += len(durations)
+
+    def __iter__(self):
+        for offset, count in self.segments:
+            yield from self.spill_file.read(offset, count)
+
+
+class DurationBudget:
+    """Keeps the durations held in memory by every group under a budget, by spilling the largest groups to disk."""
+
+    def __init__(self, max_durations):
+        self.max_durations = max_durations
+        self.in_memory = 0
+        self.spill_file = None
+        # Groups by the number of durations they hold in memory, and the largest number
+        self.groups_by_size = {}
+        self.largest_size = 0
+
+    def move(self, stats, old_size, new_size):
+        if old_size:
+            groups = self.groups_by_size[old_size]
+            del groups[stats]
+            if not groups:
+                del self.groups_by_size[old_size]
+        if new_size:
+            self.groups_by_size.setdefault(new_size, {})[stats] = None
+            self.largest_size = max(self.largest_size, new_size)
+        while self.largest_size and self.largest_size not in self.groups_by_size:
+            self.largest_size -= 1
+
+    def added(self, stats):
+        """Count a duration added to the durations of a group in memory, and spill the largest group if over budget."""
+        size = len(stats.durations)
+        self.move(stats, size - 1, size)
+        self.in_memory += 1
+        if self.in_memory > self.max_durations:
+            largest_size = self.largest_size
+            largest = next(iter(self.groups_by_size[largest_size]))
+            self.move(largest, largest_size, 0)
+            self.in_memory -= largest_size
+            if self.spill_file is None:
+                self.spill_file = SpillFile()
+            largest.spill(self.spill_file)
+
+
+def select(iter_durations, count, rank, max_in_memory):
+    """Return the duration of the given rank (from 0) in sorted order, of the count durations of a group.
+
+    iter_durations is called for every pass, and returns an iterator over the durations.
+    """
+    prefix = 0
+    prefix_bits = 0
+    while True:
+        # The durations in the bucket of the previous passes fit in memory, so they are sorted
+        if count <= max_in_memory or prefix_bits == 64:
+            if prefix_bits:
+                candidates = [value for value in iter_durations() if sort_key(value) >> (64 - prefix_bits) == prefix]
+            else:
+                candidates = list(iter_durations())
+            return sorted(candidates)[rank]
+        shift = 64 - prefix_bits - RADIX_BITS
+        counts = [0] * SELECT_BUCKETS
+        for value in iter_durations():
+            key = sort_key(value)
+            if not prefix_bits or key >> (64 - prefix_bits) == prefix:
+                counts[(key >> shift) & ((1 << RADIX_BITS) - 1)] += 1
+        for bucket, bucket_count in enumerate(counts):
+            if rank < bucket_count:
+                break
+            rank -= bucket_count
+        prefix = (prefix << RADIX_BITS) | bucket
+        prefix_bits += RADIX_BITS
+        count = bucket_count
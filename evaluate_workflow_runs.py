@@ -2,14 +2,32 @@
 This script evaluates the stats for each workflow in the `runs.json` file and outputs the results to a CSV file.
 
 Usage:
-    python evaluate_workflow_runs.py
+    python evaluate_workflow_runs.py [runs_file] [--since <date>] [--until <date>] [--repository <owner/repo>]
 
 Requirements:
     - Python 3.x
     - `runs.json` file containing the workflow runs to evaluate
 
 Optional:
+    - `runs_file` argument with the path of the runs file to evaluate, which defaults to `runs.json`, or to
+      `runs.ndjson.gz` or `runs.ndjson.zst` when `OUTPUT_COMPRESSION` is set, or the directory of a runs archive
+    - `--since` and `--until` options with the first and last day of the runs to evaluate, e.g. `2023-07-01`, and
+      `--repository` options with the repositories to evaluate, e.g. `myorg/web-*`
     - `workflow-names.txt` file containing the unique workflow names to evaluate
+    - `GROUP_BY` environment variable containing additional groupings to evaluate, e.g. `head_branch;event;name,run_attempt`
+    - `TOP_K` environment variable containing the number of slowest and most retried runs of every workflow to list
+    - `WORKFLOW_CHAINS` environment variable, set to evaluate the lead time of the chains of workflows triggered by
+      `workflow_run` events
+    - `CONCURRENCY_TIMELINE` environment variable, set to evaluate the concurrency of the runs, and
+      `CONCURRENCY_INTERVAL` containing the seconds of every interval of its time series
+    - `SAMPLE_PRECISION` environment variable, set when the runs file holds a sample of the runs
+    - `EVALUATION_MEMORY_MB` environment variable containing the memory budget of the durations, in megabytes
+    - `BILLABLE_TIMING` environment variable, set when the runs hold their billable time on each runner OS
+    - `PROFILE` environment variable, set to profile the evaluation (see `profiling.py`)
+    - `DEDUP_POLICY` environment variable containing the deduplication policy of the runs: `latest`, `all` or `off`
+    - `STATS_STATE` environment variable containing the path of a state file to fold the runs into, e.g.
+      `workflow-stats-state.json`, and `STATS_WINDOW_DAYS` containing the number of days of its sliding window
+    - `COMPARE_DAYS` environment variable containing the number of days of the windows to compare in the state
 
 Description:
     This script reads the `runs.json` file and extracts the workflow runs for each workflow specified in the
@@ -26,11 +44,92 @@ Description:
         - Total number of runs: The total number of runs for the workflow.
         - Success rate (in percentage): The percentage of successful runs for the workflow.
 
+    Compressed runs files (`.gz` or `.zst`) are decompressed as they are read, and newline-delimited JSON runs files
+    (`.ndjson`) are evaluated one run at a time, so that only the stats of each workflow are held in memory. Run cache
+    files (`.runcache`, see `run_cache.py`) are memory-mapped, and only the columns that are evaluated are read.
+
+    If the runs file is the directory of a runs archive (see `run_archive.py`), only the partitions of the repositories
+    and months that match the `--since`, `--until` and `--repository` options are read, using the manifests of the
+    archive. The same options filter the runs of a runs file, which is read in full. The date range is compared with
+    the `run_started_at` of every run, or its `created_at` if it has not started, as the runs are archived. Only the
+    runs files of orgs hold the repository of their runs, so `--repository` is an error with `runs.json`.
+
+    Runs are deduplicated by repository and run id as they are read (see `run_dedup.py`), so that the runs of
+    overlapping or repeated merges are counted once. Only the latest attempt of every run is evaluated, unless the
+    `DEDUP_POLICY` environment variable is set to `all`, which evaluates every attempt once, or `off`.
+
+    Additional groupings can be evaluated with the `GROUP_BY` environment variable. Groupings are separated by `;`,
+    and the run fields of a composite grouping key are separated by `,`. For example, `head_branch;name,run_attempt`
+    evaluates the stats per branch, and per workflow and run attempt. All groupings are evaluated together in a single
+    pass over the runs, and each grouping is written to its own CSV file named after its fields, e.g.
+    `workflow-stats-by-head_branch.csv` and `workflow-stats-by-name-run_attempt.csv`. The CSV file of a grouping has
+    a column for each of its fields, followed by the stats columns.
+
+    If the `EVALUATION_MEMORY_MB` environment variable is set, the durations held in memory by all workflows and
+    groupings are kept under that budget, and the durations of the largest groups are spilled to disk when it is
+    exceeded (see `duration_spill.py`). The stats of spilled groups are the same as the stats evaluated in memory.
+
+    If the `BILLABLE_TIMING` environment variable is set, the billable time of the runs (see `run_timing.py`) is
+    summed per workflow, and `workflow-stats.csv` has the following additional columns:
+
+        - billable_ms_ubuntu, billable_ms_macos, billable_ms_windows: The billable milliseconds of the runs of the
+          workflow on each runner OS.
+        - billable_ms: The billable milliseconds of the runs of the workflow on every runner OS.
+
+    If the `TOP_K` environment variable is set, the `TOP_K` slowest runs and the `TOP_K` runs with the most attempts
+    of every workflow are kept in bounded heaps during the same pass, in O(N log K) time and O(W * K) memory for N
+    runs of W workflows. They are written to `workflow-top-runs.csv`, with the following columns:
+
+        - workflow_name: The name of the workflow.
+        - ranking: `slowest` or `most_retried`.
+        - rank: The rank of the run in its ranking, from 1.
+        - url, head_branch, run_number, run_attempt, duration: The fields of the run.
+
+    If the `CONCURRENCY_TIMELINE` environment variable is set, the number of runs that were executing at once is
+    evaluated with a sweep over the start and end times of the runs (see `run_concurrency.py`), for every workflow and
+    for all runs, in a row named `*`. The peak and average concurrency are written to `workflow-concurrency.csv`, the
+    seconds spent at every concurrency level to `workflow-concurrency-levels.csv`, and the maximum and average
+    concurrency of every interval of `CONCURRENCY_INTERVAL` seconds (3600 by default) to
+    `workflow-concurrency-timeline.csv`.
+
+    If the `WORKFLOW_CHAINS` environment variable is set, the runs are linked into chains of workflows triggered by
+    `workflow_run` events, by their `head_sha` (see `workflow_chains.py`), and the lead time percentiles of the chains
+    and the critical workflow of their critical paths are written to `workflow-chains.csv`.
+
+    If the `SAMPLE_PRECISION` environment variable is set, the runs file holds a sample of the pages of runs (see
+    `run_sampling.py`), and the stats of every workflow are also written as estimates with confidence intervals to
+    `workflow-stats-estimates.csv`, with the following columns:
+
+        - workflow_name: The name of the workflow.
+        - sample_size: The number of sampled runs of the workflow.
+        - average_duration, average_duration_low, average_duration_high: The estimated average duration, and its
+          confidence interval.
+        - median_duration, median_duration_low, median_duration_high: The same for the median duration.
+        - success_rate, success_rate_low, success_rate_high: The same for the success rate.
+
+    If the `STATS_STATE` environment variable is set, the runs are folded into the per-workflow aggregates of the
+    state file (see `workflow_aggregates.py`) instead, and `workflow-stats.csv` is evaluated from the state. Runs
+    in progress, and runs that are not newer than the state are skipped, so the runs file only needs to hold the
+    runs since the previous evaluation. The re-run of a run that was folded replaces its earlier attempt. If
+    `STATS_WINDOW_DAYS` is also set, the days before the sliding window are expired from the state. The additional
+    groupings of `GROUP_BY` are still evaluated from the runs file only.
+
+    If `COMPARE_DAYS` is also set, the stats of the last `COMPARE_DAYS` days of the state are compared with the stats
+    of the `COMPARE_DAYS` days before them (see `window_comparison.py`), and written to
+    `workflow-stats-comparison.csv`, with the deltas of the median and 95th percentile durations and of the success
+    rate of every workflow, and whether they are significant regressions. The sliding window of `STATS_WINDOW_DAYS`
+    must hold both windows.
+
     To run the script, you need to have Python 3.x installed on your system. You also need to have the `runs.json`
     file and the `workflow-names.txt` file in the same directory as the script.
 
 Output:
-    The script outputs the results to a CSV file named `workflow-stats.csv` in the same directory as the script.
+    The script outputs the results to a CSV file named `workflow-stats.csv` in the same directory as the script, and
+    to a `workflow-stats-by-<fields>.csv` file for each grouping in `GROUP_BY`, to `workflow-top-runs.csv` if
+    `TOP_K` is set, to the `workflow-concurrency*.csv` files if `CONCURRENCY_TIMELINE` is set, to
+    `workflow-chains.csv` if `WORKFLOW_CHAINS` is set, to
+    `workflow-stats-estimates.csv` if `SAMPLE_PRECISION` is set, and to
+    `workflow-stats-comparison.csv` if `COMPARE_DAYS` is set.
 
 Example:
     python evaluate_workflow_runs.py
@@ -43,67 +142,231 @@ Note:
     - The script ignores failed runs when calculating the average duration of successful runs.
 """
 
+import argparse
 import os
-import json
-import statistics
+import csv
+import sys
+
+from duration_spill import DurationBudget, memory_budget
+from profiling import start_profiling
+from run_archive import in_range, iter_archive_runs, matches_repository, select_partitions, start_time
+from run_concurrency import INTERVAL_FIELDS, ConcurrencyTimeline, concurrency_interval, concurrency_timeline
+from run_dedup import KEY_FIELDS, dedup_policy, run_index
+from run_sampling import ESTIMATES_COLUMNS, estimate_row, sample_precision
+from workflow_aggregates import AggregateState
+from workflow_chains import CHAIN_FIELDS, CHAINS_FILE, ChainIndex, workflow_chains
+from workflow_stats import (TopRuns, WorkflowStats, BILLABLE_FIELDS, STATS_COLUMNS, TOP_RUNS_COLUMNS, billable_timing,
+                            header_name, stats_columns, stats_row)
+from workflow_runs_io import find_runs_file, iter_runs
+from window_comparison import comparison_alpha, compare_states, recent_windows, write_comparison
+
+# Profile the evaluation of the runs if PROFILE is set (see profiling.py)
+start_profiling('evaluate_workflow_runs')
 
 WORKFLOW_NAMES_FILE = 'workflow-names.txt'
-RUNS_FILE = 'runs.json'
+parser = argparse.ArgumentParser(description='Evaluate the stats of every workflow in a runs file.')
+parser.add_argument('runs_file', nargs='?', help='Runs file or runs archive directory to evaluate')
+parser.add_argument('--since', help='First day of the runs to evaluate, e.g. 2023-07-01')
+parser.add_argument('--until', help='Last day of the runs to evaluate, e.g. 2023-07-31')
+parser.add_argument('--repository', action='append', help='Repository to evaluate, e.g. myorg/web-*')
+args = parser.parse_args()
+
+RUNS_FILE = args.runs_file or find_runs_file('runs')
 STATS_FILE = 'workflow-stats.csv'
+GROUP_BY_STATS_FILE = 'workflow-stats-by-{}.csv'
+TOP_RUNS_FILE = 'workflow-top-runs.csv'
+TOP_K = int(os.getenv('TOP_K') or 0)
+ESTIMATES_FILE = 'workflow-stats-estimates.csv'
+STATS_STATE = os.getenv('STATS_STATE')
+STATS_WINDOW_DAYS = int(os.getenv('STATS_WINDOW_DAYS') or 0)
+COMPARISON_FILE = 'workflow-stats-comparison.csv'
+COMPARE_DAYS = int(os.getenv('COMPARE_DAYS') or 0)
+BILLABLE_TIMING = billable_timing()
+CONCURRENCY_TIMELINE = concurrency_timeline()
+WORKFLOW_CHAINS = workflow_chains()
+
+# Parse the additional groupings, e.g. "head_branch;name,run_attempt"
+group_by = []
+for grouping in os.getenv('GROUP_BY', '').split(';'):
+    fields = tuple(field.strip() for field in grouping.split(',') if field.strip())
+    if fields and fields != ('name',) and fields not in group_by:
+        group_by.append(fields)
 
 # Check if the workflow names file exists
+workflow_names_filter = None
 if os.path.isfile(WORKFLOW_NAMES_FILE):
     print(f'  Info: {WORKFLOW_NAMES_FILE} file is found. Workflow runs will be filtered by the workflow names listed in the file.')
+    # Load the workflow names from the workflow names file
+    with open(WORKFLOW_NAMES_FILE, 'r') as f:
+        workflow_names = f.read().splitlines()
+    workflow_names_filter = set(workflow_names)
 else:
     print(f'  Warning: {WORKFLOW_NAMES_FILE} file not found')
-    # Load the workflow names from the RUNS_FILE
-    with open(RUNS_FILE, 'r') as f:
-        runs = json.load(f)
-    workflow_names = list(set(run['name'] for run in runs))
-    # Write the workflow names to the workflow names file
-    with open(WORKFLOW_NAMES_FILE, 'w') as f:
-        f.write('\n'.join(workflow_names))
-
-# Load the workflow names from the workflow names file
-with open(WORKFLOW_NAMES_FILE, 'r') as f:
-    workflow_names = f.read().splitlines()
+    # Evaluate every workflow in the runs file, in order of appearance
+    workflow_names = []
 
-# Output the results to a CSV file
-with open(STATS_FILE, 'w') as f:
-    f.write('workflow_name,average_duration,median_duration,success_rate,total_runs\n')
-
-# Evaluate the stats for each workflow
-for workflow_name in workflow_names:
-    print(f'  Evaluating: {workflow_name}')
-
-    # Filter the runs by workflow name
-    try:
-        with open(RUNS_FILE, 'r') as f:
-            runs = json.load(f)
-        runs_filtered = [run for run in runs if run['name'] == workflow_name]
-    except FileNotFoundError:
+def filter_runs(runs):
+    """Yield the runs of a runs file in the date range and the repositories of the options."""
+    for run in runs:
+        try:
+            matches = matches_repository(run.get('owner_name'), run.get('repository_name'), args.repository)
+        except ValueError as e:
+            # The runs of a single repository are not filtered by repository
+            sys.exit(f'Error: --repository cannot filter {RUNS_FILE}, as {e}. Use an org runs file or a runs archive')
+        if matches and in_range(start_time(run) or '', args.since, args.until):
+            yield run
+
+
+# Evaluate the stats of every grouping in a single pass over the runs, skipping duplicate runs and superseded
+# attempts. The pass is repeated in the rare case that a later attempt of a run comes after an earlier attempt that
+# was already evaluated, with the latest attempt of every run known from the first pass (see run_dedup.py)
+index = run_index()
+listed_workflow_names = list(workflow_names)
+while True:
+    budget = DurationBudget(memory_budget()) if memory_budget() else None
+    workflow_names = list(listed_workflow_names)
+    workflow_stats = {workflow_name: WorkflowStats(budget) for workflow_name in workflow_names}
+    state = AggregateState.load(STATS_STATE, dedup_policy()) if STATS_STATE else None
+    folded_runs = 0
+    skipped_runs = 0
+    top_runs = {}
+    timeline = ConcurrencyTimeline() if CONCURRENCY_TIMELINE else None
+    chain_index = ChainIndex() if WORKFLOW_CHAINS else None
+    group_by_stats = {fields: {} for fields in group_by}
+    if os.path.isdir(RUNS_FILE):
+        # Only read the partitions of the archive that match the filters
+        partitions, total_partitions = select_partitions(RUNS_FILE, args.since, args.until, args.repository)
+        print(f'  Info: {len(partitions)} of {total_partitions} partitions of {RUNS_FILE} are read')
+        runs = iter_archive_runs(partitions, args.since, args.until)
+    elif not os.path.isfile(RUNS_FILE):
         print(f'Error: {RUNS_FILE} file not found')
-        continue
-
-    # Evaluate the total number of runs
-    total_runs = len(runs_filtered)
-    duration_data = [run['duration'] for run in runs_filtered]
-
-    if total_runs > 0:
-        # Evaluate the average duration
-        average_duration = f'{statistics.mean(duration_data):.2f}'
-        # Evaluate the median duration
-        median_duration = f'{statistics.median(duration_data):.2f}'
-        # Evaluate the percentage of successful or skipped runs
-        success_rate = f'{statistics.mean([1 if run["conclusion"] in ["success", "skipped"] else 0 for run in runs_filtered]) * 100:.2f}'
+        runs = []
     else:
-        average_duration = '0.00'
-        median_duration = '0.00'
-        success_rate = '0.00'
+        # The fields that are evaluated, which are the only columns read from a run cache
+        fields = {'name', 'conclusion', 'duration'}.union(*group_by)
+        if TOP_K:
+            fields |= {'url', 'head_branch', 'run_number', 'run_attempt'}
+        if state is not None:
+            fields |= {'run_started_at', 'created_at', 'updated_at', 'status'} | KEY_FIELDS
+        if BILLABLE_TIMING:
+            fields.update(BILLABLE_FIELDS)
+        if timeline is not None:
+            fields |= INTERVAL_FIELDS
+        if chain_index is not None:
+            fields |= CHAIN_FIELDS
+        if index is not None:
+            fields |= KEY_FIELDS
+        if args.since or args.until:
+            fields |= {'run_started_at', 'created_at'}
+        if args.repository:
+            fields |= {'owner_name', 'repository_name'}
+        runs = iter_runs(RUNS_FILE, fields)
+        if args.since or args.until or args.repository:
+            runs = filter_runs(runs)
+    for run in runs:
+        if index is not None and not index.keep(run):
+            skipped_runs += 1
+            continue
+        if chain_index is not None:
+            # Every workflow of a chain is linked, whether it is evaluated or not
+            chain_index.add(run)
+        if state is not None and state.fold(run):
+            # Every workflow is kept in the state, so that the workflow names file can change between evaluations
+            folded_runs += 1
+        if workflow_names_filter is not None and run['name'] not in workflow_names_filter:
+            continue
+        if run['name'] not in workflow_stats:
+            workflow_names.append(run['name'])
+            workflow_stats[run['name']] = WorkflowStats(budget)
+        if state is None:
+            workflow_stats[run['name']].add(run)
+            if BILLABLE_TIMING:
+                workflow_stats[run['name']].billable.add(run)
+        if TOP_K:
+            if run['name'] not in top_runs:
+                top_runs[run['name']] = TopRuns(TOP_K)
+            top_runs[run['name']].add(run)
+        if timeline is not None:
+            timeline.add(run)
+        for fields, stats in group_by_stats.items():
+            key = tuple(run.get(field) for field in fields)
+            if key not in stats:
+                stats[key] = WorkflowStats(budget)
+            stats[key].add(run)
+    if index is None or not index.superseded:
+        break
+    print('  Info: Later attempts of evaluated workflow runs were found, the runs are evaluated again')
+    index.restart()
+if skipped_runs:
+    print(f'  Info: {skipped_runs} duplicate workflow runs or superseded attempts are skipped')
 
-    # Output the results to a CSV file
-    with open(STATS_FILE, 'a') as f:
-        f.write(f'{workflow_name},{average_duration},{median_duration},{success_rate},{total_runs}\n')
+# Expire the days before the sliding window, and evaluate the stats of every workflow from the state
+if state is not None:
+    if STATS_WINDOW_DAYS:
+        state.expire(STATS_WINDOW_DAYS)
+    state.save(STATS_STATE)
+    print(f'  Info: {folded_runs} new workflow runs are folded into {STATS_STATE}')
+    if workflow_names_filter is None:
+        workflow_names += [name for name in state.workflows if name not in workflow_stats]
+    workflow_stats = {workflow_name: state.aggregate(workflow_name) for workflow_name in workflow_names}
 
+# Compare the last COMPARE_DAYS days of the state with the COMPARE_DAYS days before them
+if state is not None and COMPARE_DAYS and state.latest_run_started_at is not None:
+    if STATS_WINDOW_DAYS and STATS_WINDOW_DAYS < 2 * COMPARE_DAYS:
+        print('  Warning: STATS_WINDOW_DAYS is less than 2 * COMPARE_DAYS, the baseline window is truncated')
+    baseline_window, current_window = recent_windows(state, COMPARE_DAYS)
+    with open(COMPARISON_FILE, 'w', newline='') as f:
+        write_comparison(compare_states(state, state, baseline_window, current_window, comparison_alpha(),
+                                        workflow_names), f)
+    print(f'  Info: {":".join(baseline_window)} is compared with {":".join(current_window)} in {COMPARISON_FILE}')
+
+# Output the results to a CSV file
+with open(STATS_FILE, 'w', newline='') as f:
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(['workflow_name'] + stats_columns())
+    for workflow_name in workflow_names:
+        print(f'  Evaluating: {workflow_name}')
+        writer.writerow([workflow_name] + stats_row(workflow_stats[workflow_name]))
 print(f'  Evaluation completed: Results are written to workflow-stats.csv')
-os.remove(WORKFLOW_NAMES_FILE)
+
+# Output the results of every additional grouping to its own CSV file
+for fields, stats in group_by_stats.items():
+    stats_file = GROUP_BY_STATS_FILE.format('-'.join(fields))
+    print(f'  Evaluating: {", ".join(fields)}')
+    with open(stats_file, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow([header_name(field) for field in fields] + STATS_COLUMNS)
+        for key, key_stats in stats.items():
+            writer.writerow(list(key) + key_stats.row())
+    print(f'  Evaluation completed: Results are written to {stats_file}')
+
+# Output the slowest and most retried runs of every workflow to a CSV file
+if TOP_K:
+    with open(TOP_RUNS_FILE, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['workflow_name'] + TOP_RUNS_COLUMNS)
+        for workflow_name in workflow_names:
+            if workflow_name in top_runs:
+                for row in top_runs[workflow_name].rows():
+                    writer.writerow([workflow_name] + row)
+    print(f'  Evaluation completed: The top {TOP_K} runs of every workflow are written to {TOP_RUNS_FILE}')
+
+# Output the concurrency of every workflow and of all runs to CSV files
+if timeline is not None:
+    timeline.write(concurrency_interval(), workflow_names=workflow_names)
+    print('  Evaluation completed: The concurrency of the runs is written to workflow-concurrency.csv')
+
+# Output the lead time of the workflow chains to a CSV file
+if chain_index is not None:
+    chain_index.write(CHAINS_FILE)
+    print(f'  Evaluation completed: The workflow chains are written to {CHAINS_FILE}')
+
+# Output the estimates of every workflow from a sample of the runs to a CSV file
+if sample_precision() is not None and state is None:
+    with open(ESTIMATES_FILE, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['workflow_name'] + ESTIMATES_COLUMNS)
+        for workflow_name in workflow_names:
+            stats = workflow_stats[workflow_name]
+            writer.writerow([workflow_name] + estimate_row(list(stats.iter_durations()), stats.successes))
+    print(f'  Evaluation completed: Estimates with confidence intervals are written to {ESTIMATES_FILE}')
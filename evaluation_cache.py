@@ -0,0 +1,99 @@
+"""
+evaluation_cache.py - Reuse the stats of the repositories whose runs have not changed since a previous evaluation.
+
+Description:
+    A scheduled collection of an org retrieves the same runs for most repositories as the previous collection, yet
+    `evaluate_workflow_runs.py` is spawned to evaluate every one of them again. When the `EVALUATION_CACHE_DIR`
+    environment variable is set, `workflow_metrics.py` fingerprints what the evaluation of a repository depends on
+    with a SHA-256 digest:
+
+        - The record of every run in the runs file of the repository, in order, as written by `get_workflow_runs.py`.
+          Compressed runs files are digested after decompression, as the gzip header holds the time it was written.
+        - The workflow names of `workflow-names.txt`, if it exists.
+        - The environment variables of `EVALUATION_SETTINGS`, which change the stats files that are written.
+
+    The stats files of every evaluation are kept in `<cache_dir>/<owner>/<repo>/<digest>/`. A repository with the
+    digest of its previous evaluation gets its stats files back from the cache, and is not evaluated again. Only the
+    files of the latest digest of every repository are kept. Set the `FORCE_EVALUATION` environment variable to
+    `true` to evaluate every repository again, which also refreshes the cache.
+
+    Evaluations that fold the runs into a `STATS_STATE` are never cached, as they depend on the state.
+"""
+
+import hashlib
+import os
+import shutil
+
+from workflow_runs_io import iter_record_lines
+
+# Version of the digest, changed when the stats files of the same runs change
+CACHE_VERSION = 1
+
+# Environment variables that change the stats files of the same runs
+EVALUATION_SETTINGS = ['GROUP_BY', 'TOP_K', 'SAMPLE_PRECISION', 'SAMPLE_CONFIDENCE', 'BILLABLE_TIMING', 'DEDUP_POLICY',
+                       'CONCURRENCY_TIMELINE', 'CONCURRENCY_INTERVAL', 'WORKFLOW_CHAINS']
+
+WORKFLOW_NAMES_FILE = 'workflow-names.txt'
+
+
+def evaluation_cache_dir():
+    """Return the cache directory set in the `EVALUATION_CACHE_DIR` environment variable, or None if not caching."""
+    if os.getenv('STATS_STATE'):
+        return None
+    return os.getenv('EVALUATION_CACHE_DIR') or None
+
+
+def force_evaluation():
+    """Return whether every repository is evaluated again, as set in `FORCE_EVALUATION`."""
+    return os.getenv('FORCE_EVALUATION', '').lower() in ['1', 'true', 'yes']
+
+
+def runs_digest(work_dir, runs_file):
+    """Return the digest of the runs file in work_dir, the workflow names file and the evaluation settings."""
+    digest = hashlib.sha256(f'version={CACHE_VERSION}\n'.encode())
+    for setting in EVALUATION_SETTINGS:
+        digest.update(f'{setting}={os.getenv(setting, "")}\n'.encode())
+    workflow_names_path = os.path.join(work_dir, WORKFLOW_NAMES_FILE)
+    if os.path.isfile(workflow_names_path):
+        with open(workflow_names_path, 'rb') as f:
+            digest.update(b'workflow-names\n' + f.read() + b'\n')
+    runs_path = os.path.join(work_dir, runs_file)
+    if os.path.isfile(runs_path):
+        digest.update(b'runs\n')
+        for record in iter_record_lines(runs_path):
+            digest.update(record.encode())
+            digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class EvaluationCache:
+    """The stats files of the latest evaluation of every repository, keyed by the digest of its runs."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def repo_dir(self, owner, repo):
+        return os.path.join(self.directory, owner, repo)
+
+    def restore(self, owner, repo, digest, work_dir):
+        """Copy the cached stats files of a digest into work_dir. Returns whether the digest was cached."""
+        digest_dir = os.path.join(self.repo_dir(owner, repo), digest)
+        if not os.path.isdir(digest_dir):
+            return False
+        for file_name in os.listdir(digest_dir):
+            shutil.copy(os.path.join(digest_dir, file_name), work_dir)
+        return True
+
+    def store(self, owner, repo, digest, stats_files):
+        """Cache the stats files of a digest, replacing the files of the previous digest of the repository."""
+        repo_dir = self.repo_dir(owner, repo)
+        os.makedirs(repo_dir, exist_ok=True)
+        temporary_dir = os.path.join(repo_dir, f'{digest}.tmp')
+        shutil.rmtree(temporary_dir, ignore_errors=True)
+        os.makedirs(temporary_dir)
+        for stats_file in stats_files:
+            shutil.copy(stats_file, temporary_dir)
+        for name in os.listdir(repo_dir):
+            if name != f'{digest}.tmp':
+                shutil.rmtree(os.path.join(repo_dir, name))
+        os.rename(temporary_dir, os.path.join(repo_dir, digest))
@@ -23,6 +23,8 @@ Returns:
     - status
     - updated_at
     - url
+    - actor
+    - id
     - duration
 
 Requirements:
@@ -37,6 +39,19 @@ Description:
     The script uses the GitHub API to retrieve the workflow runs for the specified repository and date range. The
     script requires authentication with `repo` scope with the API.
 
+    If a `workflow-names.txt` file exists, only the runs of the workflows listed in the file are retrieved. The
+    workflow names are resolved to workflow IDs, and the runs of each workflow are retrieved from its own endpoint,
+    concurrently, instead of retrieving the runs of every workflow in the repository. The number of concurrent
+    requests is set with the `FETCH_CONCURRENCY` environment variable.
+
+    The runs are retrieved with a filter on their creation date. The number of runs in the date range is requested
+    first, and a large date range is split into sub-windows of at most 800 runs each, which are retrieved
+    concurrently. Sub-windows that still hold more runs than the API returns for a filtered query are split again,
+    down to windows of one second, which are retrieved with a warning, as the runs beyond the first 1,000 are missed.
+    The runs of every sub-window are merged most recent first, and deduplicated by run id. A run that is re-run
+    while its pages are retrieved is read with two attempts, and only its latest attempt is kept, unless the
+    `DEDUP_POLICY` environment variable is set to `all` (see `run_dedup.py`).
+
     The script outputs a list of workflow runs in JSON format, with the following fields for each run:
 
         - conclusion
@@ -50,11 +65,33 @@ Description:
         - status
         - updated_at
         - url
+        - actor
+        - id
         - duration
 
     To run the script, you need to have Python 3.x and the `jq` command-line tool installed on your system. You also
     need to have a GitHub API token with the `repo` scope.
 
+    If the `SAMPLE_PRECISION` environment variable is set, only a sample of the pages of runs is retrieved, spread
+    over the sub-windows (see `run_sampling.py`). The number of pages is decided by the target precision and the
+    number of runs in the date range. The sample is written to the runs file in the same way.
+
+    If the `BILLABLE_TIMING` environment variable is set, the billable milliseconds of every run on each runner OS
+    are retrieved into the `billable_ms_ubuntu`, `billable_ms_macos` and `billable_ms_windows` fields, from a
+    permanent cache of the completed runs or from the API (see `run_timing.py`).
+
+    If the `WORKFLOW_CHAINS` environment variable is set, the `head_sha` of every run is also retrieved, which links
+    the runs of a chain of workflows triggered by `workflow_run` events (see `workflow_chains.py`).
+
+    If the `ARCHIVE_DIR` environment variable is set, the workflow runs are also written into the partitions of their
+    month in the runs archive of the repository, e.g. `archive/octocat/hello-world/2022-01.ndjson.gz`, replacing the
+    runs that were archived before (see `run_archive.py`).
+
+    If the `PROFILE` environment variable is set, the retrieval is profiled (see `profiling.py`).
+
+    If the `OUTPUT_COMPRESSION` environment variable is set to `gzip` or `zstd`, the workflow runs are written as
+    compressed newline-delimited JSON to `runs.ndjson.gz` or `runs.ndjson.zst` instead of `runs.json`.
+
 Output:
     - A list of workflow runs in JSON format
 
@@ -62,13 +99,28 @@ Example:
     python get_workflow_runs.py octocat hello-world 2022-01-01 2022-01-31
 """
 
-import subprocess
-import json
+import math
+import os
 import sys
 
 from datetime import datetime
 
-RUNS_FILE = 'runs.json'
+from github_api import (count_runs, created_filter, gh_api_lines, map_concurrently, split_window,
+                        workflow_runs_endpoints, MAX_RUNS_PER_QUERY, RUNS_PER_PAGE, RUNS_PER_WINDOW)
+from profiling import start_profiling
+from run_archive import archive_dir, archive_runs
+from run_dedup import ALL, RunIndex, run_index
+from run_sampling import sample_mode, sample_pages, sample_precision, sample_size
+from run_timing import add_billable_time
+from workflow_chains import workflow_chains
+from workflow_stats import billable_timing, run_duration
+from workflow_runs_io import RunsWriter, output_compression, runs_file_name
+
+# Profile the retrieval of the runs if PROFILE is set (see profiling.py)
+start_profiling('get_workflow_runs')
+
+RUNS_FILE = runs_file_name('runs', output_compression())
+WORKFLOW_NAMES_FILE = 'workflow-names.txt'
 
 # Parse the command-line arguments
 if len(sys.argv) != 5:
@@ -88,42 +140,99 @@ except ValueError:
     print('Error: Invalid date format. Please use ISO format (YYYY-MM-DD).')
     sys.exit(1)
     
-# Parse jq query for gh api command
+# Parse jq query for gh api command, with the head_sha that links the runs of a workflow chain if WORKFLOW_CHAINS is set
+chain_fields = ',head_sha' if workflow_chains() else ''
 jq_query = (
     f'[.workflow_runs[] '
     f'| select(.run_started_at >= "{start_date}" and .run_started_at <= "{end_date}") '
-    f'| {{conclusion,created_at,display_title,event,head_branch,name,run_number,run_started_at,run_attempt,status,updated_at,url}}] '
+    f'| {{conclusion,created_at,display_title,event,head_branch,name,run_number,run_started_at,run_attempt,status,updated_at,url,actor:.actor.login,id{chain_fields}}}] '
     f'| select(length > 0)'
 )
 
-# Construct the gh api command
-cmd = f'gh api repos/{repo_owner}/{repo_name}/actions/runs --paginate --jq \'{jq_query}\''
-
-# Send the command and retrieve the output
-output = subprocess.check_output(cmd, shell=True, text=True)
-
-# Parse the output as JSON and return the workflow runs
-workflow_runs = []
-for line in output.strip().split('\n'):
-    try:
-        data = json.loads(line)
-        if isinstance(data, list):
-            workflow_runs.extend(data)
+# Resolve the workflow names to filter by to workflow IDs, so that only the runs of those workflows are retrieved
+workflow_names = None
+if os.path.isfile(WORKFLOW_NAMES_FILE):
+    with open(WORKFLOW_NAMES_FILE, 'r') as f:
+        workflow_names = set(name for name in f.read().splitlines() if name)
+runs_endpoints, missing_names, _ = workflow_runs_endpoints(repo_owner, repo_name, workflow_names)
+if missing_names:
+    print(f'  Warning: Workflows not found in {repo_owner}/{repo_name}: {", ".join(sorted(missing_names))}')
+
+# Split the date range of every endpoint into sub-windows, sized from the number of runs in the date range
+windows = [(endpoint, start_date, end_date) for endpoint in runs_endpoints]
+fetch_windows = []
+while windows:
+    split_windows = []
+    for (endpoint, start, end), total_count in zip(windows, map_concurrently(lambda window: count_runs(*window), windows)):
+        if total_count == 0:
+            continue
+        if total_count <= MAX_RUNS_PER_QUERY or (end - start).total_seconds() < 2:
+            if total_count > MAX_RUNS_PER_QUERY:
+                # The window cannot be split further, and the API only returns its first MAX_RUNS_PER_QUERY runs
+                print(f'  Warning: {total_count} workflow runs of {endpoint} were created from {start.isoformat()} to '
+                      f'{end.isoformat()}, only {MAX_RUNS_PER_QUERY} of them are retrieved')
+            fetch_windows.append((endpoint, start, end, total_count))
         else:
-            workflow_runs.append(data)
-    except json.JSONDecodeError:
-        pass
-
-# Add the duration field to each workflow run, calculated as the difference between the updated_at and run_started_at fields
-for item in workflow_runs:
-    updated_at = datetime.fromisoformat(item['updated_at'].replace('Z', '+00:00'))
-    run_started_at = datetime.fromisoformat(item['run_started_at'].replace('Z', '+00:00'))
-    duration = (updated_at - run_started_at).total_seconds()
-    item['duration'] = duration
-
-# Print the workflow runs as raw.json file
-with open(RUNS_FILE, 'w') as f:
-    json.dump(workflow_runs, f)
+            split_windows += [(endpoint, s, e) for s, e in split_window(start, end, total_count, RUNS_PER_WINDOW)]
+    windows = split_windows
+# Order the sub-windows of every endpoint most recent first, as the runs of a window are ordered
+fetch_windows.sort(key=lambda window: (runs_endpoints.index(window[0]), -window[1].timestamp()))
+if len(fetch_windows) > len(runs_endpoints):
+    print(f'[{repo_owner}/{repo_name}]: Retrieving workflow runs in {len(fetch_windows)} sub-windows')
+
+# Retrieve the workflow runs of every sub-window concurrently
+def fetch_window(window):
+    endpoint, start, end, _ = window
+    return gh_api_lines(f'{endpoint}?per_page={RUNS_PER_PAGE}&{created_filter(start, end)}', jq_query, paginate=True)
+
+# In sampling mode, retrieve a sample of the pages of the sub-windows instead
+def fetch_page(sampled_page):
+    window_index, page = sampled_page
+    endpoint, start, end, _ = fetch_windows[window_index]
+    return gh_api_lines(f'{endpoint}?per_page={RUNS_PER_PAGE}&page={page}&{created_filter(start, end)}', jq_query)
+
+fetch, fetch_items = fetch_window, fetch_windows
+precision = sample_precision()
+if precision is not None:
+    population = sum(window[3] for window in fetch_windows)
+    page_counts = [min(math.ceil(window[3] / RUNS_PER_PAGE), MAX_RUNS_PER_QUERY // RUNS_PER_PAGE) for window in fetch_windows]
+    pages = math.ceil(sample_size(precision, population) / RUNS_PER_PAGE)
+    sampled_pages = sample_pages(page_counts, pages, sample_mode())
+    print(f'[{repo_owner}/{repo_name}]: Sampling {len(sampled_pages)} of {sum(page_counts)} pages of {population} workflow runs')
+    fetch, fetch_items = fetch_page, sampled_pages
+
+# Merge the runs of every sub-window, skipping the runs on the shared boundaries of sub-windows, which are
+# deduplicated even when DEDUP_POLICY is off, and the attempts of a run that was re-run while it was retrieved
+index = run_index() or RunIndex(ALL)
+workflow_runs = []
+for window_runs in map_concurrently(fetch, fetch_items):
+    for run in window_runs:
+        if index.keep(run):
+            workflow_runs.append(run)
+if index.superseded:
+    index.restart()
+    workflow_runs = [run for run in workflow_runs if index.keep(run)]
+if len(runs_endpoints) > 1:
+    # Order the runs of every workflow as the runs of the repository are ordered, most recent first
+    workflow_runs.sort(key=lambda run: run['created_at'], reverse=True)
+
+# Add the billable time of every run on each runner OS, which costs an API call for every run that is not cached
+if billable_timing():
+    timing_calls = add_billable_time(repo_owner, repo_name, workflow_runs)
+    print(f'[{repo_owner}/{repo_name}]: Retrieved the billable time of {timing_calls} workflow runs, '
+          f'{len(workflow_runs) - timing_calls} were cached')
+
+# Add the duration field to each workflow run, calculated as the difference between the updated_at and run_started_at fields,
+# and write the workflow runs to the runs file
+with RunsWriter(RUNS_FILE) as writer:
+    for item in workflow_runs:
+        item['duration'] = run_duration(item)
+        writer.write(item)
+
+# Write the workflow runs into the partitions of the runs archive
+if archive_dir():
+    partition_count = archive_runs(archive_dir(), repo_owner, repo_name, workflow_runs)
+    print(f'[{repo_owner}/{repo_name}]: Archived the workflow runs into {partition_count} partitions of {archive_dir()}')
 
 # Print the number of workflow runs 
 print(f'[{repo_owner}/{repo_name}]: No. of workflow runs: {len(workflow_runs)}')
@@ -0,0 +1,237 @@
+"""
+github_api.py - Query the GitHub API with the GitHub CLI.
+
+Description:
+    This module wraps `gh api`, which handles authentication and pagination, for the workflow metrics scripts. The
+    output of `gh api` is filtered with a `jq` query, and every line of the filtered output is parsed as JSON.
+
+    Requests are independent of each other, so they can be sent concurrently from a thread pool. The number of
+    concurrent requests is set with the `FETCH_CONCURRENCY` environment variable, and defaults to 4.
+
+    Requests are authenticated with a pool of tokens, set in the `GH_TOKENS` environment variable (separated by
+    commas or whitespace) in addition to `GH_TOKEN`. The remaining quota of every token is read from the free
+    `rate_limit` endpoint, and every request is routed to the token with the most remaining quota. The quota of a
+    token is counted down as requests are sent, and read again every `QUOTA_REFRESH_CALLS` calls, since the pages
+    of a paginated request are not known in advance. When a request hits the rate limit, the token is marked as
+    exhausted and the request is retried with another token. When every token is exhausted, requests wait until
+    the earliest quota reset. Without any token in the environment, `gh` uses its own authentication.
+
+    Workflow runs endpoints are filtered by creation date with the `created` query parameter. The API returns at most
+    1,000 runs for a filtered query, so larger date windows are split into sub-windows with `split_window`.
+
+Requirements:
+    - `gh` (GitHub CLI), authenticated with a token with `repo` scope
+"""
+
+import math
+import os
+import re
+import subprocess
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import json_backend
+
+DEFAULT_FETCH_CONCURRENCY = 4
+
+# Maximum number of runs returned by a workflow runs endpoint filtered by the created query parameter
+MAX_RUNS_PER_QUERY = 1000
+
+# Expected number of runs per sub-window, below MAX_RUNS_PER_QUERY to allow for an uneven spread of runs over time
+RUNS_PER_WINDOW = 800
+
+RUNS_PER_PAGE = 100
+
+WORKFLOWS_PER_PAGE = 100
+
+# Number of calls with a token after which its remaining quota is read again
+QUOTA_REFRESH_CALLS = 50
+
+# Remaining quota under which a token is not used, to leave room for the pages of paginated requests in flight
+QUOTA_RESERVE = 10
+
+_token_pool = None
+_token_pool_lock = threading.Lock()
+
+
+def fetch_concurrency():
+    """Return the number of concurrent requests set in the `FETCH_CONCURRENCY` environment variable."""
+    return max(1, int(os.getenv('FETCH_CONCURRENCY') or DEFAULT_FETCH_CONCURRENCY))
+
+
+def environment_tokens():
+    """Return the tokens set in the `GH_TOKENS` and `GH_TOKEN` environment variables, without duplicates."""
+    tokens = re.split(r'[\s,]+', os.getenv('GH_TOKENS', '')) + [os.getenv('GH_TOKEN', '')]
+    return list(dict.fromkeys(token for token in tokens if token))
+
+
+class TokenPool:
+    """Routes requests to the token with the most remaining quota."""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.remaining = {}
+        self.reset = {}
+        self.calls = {}
+        self.lock = threading.Lock()
+        for token in tokens:
+            self.refresh(token)
+
+    def refresh(self, token):
+        """Read the remaining quota of a token from the rate_limit endpoint, which does not use any quota."""
+        env = dict(os.environ, GH_TOKEN=token)
+        output = subprocess.check_output(
+            ['gh', 'api', 'rate_limit', '--jq', '.resources.core | "\\(.remaining) \\(.reset)"'], text=True, env=env)
+        remaining, reset = output.split()
+        with self.lock:
+            self.remaining[token] = int(remaining)
+            self.reset[token] = int(reset)
+            self.calls[token] = 0
+
+    def acquire(self):
+        """Return the token with the most remaining quota, waiting for a quota reset if every token is exhausted."""
+        while True:
+            with self.lock:
+                token = max(self.tokens, key=lambda t: self.remaining[t])
+                if self.remaining[token] > QUOTA_RESERVE:
+                    self.remaining[token] -= 1
+                    self.calls[token] += 1
+                    needs_refresh = self.calls[token] >= QUOTA_REFRESH_CALLS
+                    break
+                wait = max(1, min(self.reset.values()) - int(time.time()) + 1)
+            print(f'  Rate limit exhausted for all {len(self.tokens)} tokens, waiting {wait} seconds for the reset...')
+            time.sleep(wait)
+            for t in self.tokens:
+                self.refresh(t)
+        if needs_refresh:
+            self.refresh(token)
+        return token
+
+    def exhaust(self, token):
+        """Mark a token as exhausted until its quota is read again."""
+        with self.lock:
+            self.remaining[token] = 0
+
+    def wait_for_quota(self, calls):
+        """Wait until the tokens have the quota for the given number of calls, as read from the API.
+
+        The quota is read again first, as other processes may send requests with the same tokens.
+        """
+        while True:
+            for token in self.tokens:
+                self.refresh(token)
+            with self.lock:
+                available = sum(max(0, remaining - QUOTA_RESERVE) for remaining in self.remaining.values())
+                wait = max(1, min(self.reset.values()) - int(time.time()) + 1)
+            if available >= calls:
+                return
+            print(f'  Waiting {wait} seconds for the rate limit reset, as {calls} API calls are needed and {available} are left...')
+            time.sleep(wait)
+
+    def total_remaining(self):
+        with self.lock:
+            return sum(self.remaining.values())
+
+
+def token_pool():
+    """Return the token pool of the tokens in the environment, or None if no token is set."""
+    global _token_pool
+    with _token_pool_lock:
+        if _token_pool is None and environment_tokens():
+            _token_pool = TokenPool(environment_tokens())
+    return _token_pool
+
+
+def gh_api(path, jq=None, paginate=False):
+    """Send a request with `gh api` and return its output."""
+    cmd = ['gh', 'api', path]
+    if paginate:
+        cmd.append('--paginate')
+    if jq:
+        cmd += ['--jq', jq]
+
+    pool = token_pool()
+    if pool is None:
+        return subprocess.check_output(cmd, text=True)
+    while True:
+        token = pool.acquire()
+        result = subprocess.run(cmd, text=True, capture_output=True, env=dict(os.environ, GH_TOKEN=token))
+        if result.returncode == 0:
+            return result.stdout
+        if 'rate limit' in result.stderr.lower():
+            # Retry the request with the token with the most remaining quota
+            pool.exhaust(token)
+            continue
+        raise subprocess.CalledProcessError(result.returncode, cmd, result.stdout, result.stderr)
+
+
+def gh_api_lines(path, jq=None, paginate=False):
+    """Send a request with `gh api` and return every line of its output parsed as JSON. Lists are flattened."""
+    values = []
+    for line in gh_api(path, jq, paginate).strip().split('\n'):
+        try:
+            data = json_backend.loads(line)
+        except ValueError:
+            continue
+        if isinstance(data, list):
+            values.extend(data)
+        else:
+            values.append(data)
+    return values
+
+
+def map_concurrently(function, items):
+    """Call function for every item from a thread pool, and return the results in the order of the items."""
+    items = list(items)
+    if len(items) <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(fetch_concurrency(), len(items))) as executor:
+        return list(executor.map(function, items))
+
+
+def format_timestamp(value):
+    """Format a datetime as an ISO 8601 timestamp for the GitHub API, e.g. `2023-08-05T01:50:57Z`."""
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def created_filter(start, end):
+    """Return the query parameter that filters workflow runs created between start and end (inclusive)."""
+    return f'created={format_timestamp(start)}..{format_timestamp(end)}'
+
+
+def workflow_runs_endpoints(owner, repo, workflow_names=None):
+    """Return the workflow runs endpoints of a repository, the workflow names that no workflow has, and the number of
+    API calls taken to find the endpoints.
+
+    Without workflow names, every run is retrieved from the runs endpoint of the repository. Otherwise the runs of
+    every workflow with one of the names are retrieved from its own endpoint, as several workflow files can have the
+    same name.
+    """
+    if workflow_names is None:
+        return [f'repos/{owner}/{repo}/actions/runs'], set(), 0
+    workflows = gh_api_lines(f'repos/{owner}/{repo}/actions/workflows?per_page={WORKFLOWS_PER_PAGE}',
+                             '.workflows[] | {id, name}', paginate=True)
+    endpoints = [f'repos/{owner}/{repo}/actions/workflows/{workflow["id"]}/runs'
+                 for workflow in workflows if workflow['name'] in workflow_names]
+    missing_names = set(workflow_names) - set(workflow['name'] for workflow in workflows)
+    return endpoints, missing_names, max(1, math.ceil(len(workflows) / WORKFLOWS_PER_PAGE))
+
+
+def count_runs(endpoint, start, end):
+    """Return the number of workflow runs of a runs endpoint created between start and end, with a single request."""
+    output = gh_api(f'{endpoint}?per_page=1&{created_filter(start, end)}', '.total_count')
+    return int(output.strip() or 0)
+
+
+def split_window(start, end, total_count, runs_per_window=MAX_RUNS_PER_QUERY):
+    """Split a date window into equal sub-windows that are expected to hold at most runs_per_window runs each.
+
+    The sub-windows are returned most recent first, in the order the API returns runs. Adjacent sub-windows share
+    their boundary, since the created filter is inclusive, so runs on a boundary must be deduplicated.
+    """
+    count = max(1, math.ceil(total_count / runs_per_window))
+    step = (end - start) / count
+    bounds = [start + step * i for i in range(count)] + [end]
+    return [(bounds[i], bounds[i + 1]) for i in reversed(range(count))]
@@ -0,0 +1,66 @@
+"""
+json_backend.py - Parse and serialise JSON with the fastest available library.
+
+Description:
+    Parsing the workflow runs is the biggest CPU cost of evaluating large runs files. This module uses `orjson` or
+    `msgspec` when one of them is installed, and falls back to the `json` module of the standard library otherwise.
+
+    The backend is selected on first use rather than on import, so that scripts which never parse JSON, or parse
+    very little of it, do not pay the import cost. The `JSON_BACKEND` environment variable selects a backend
+    explicitly: `orjson`, `msgspec` or `json`. By default (`auto`), the first installed backend of `orjson`,
+    `msgspec` and `json` is used.
+
+    Every backend parses JSON into the same Python objects, and serialises them into compact JSON text.
+"""
+
+import json
+import os
+
+BACKENDS = ['orjson', 'msgspec', 'json']
+
+_backend = None
+
+
+def _select_backend():
+    requested = os.getenv('JSON_BACKEND', 'auto').strip().lower() or 'auto'
+    if requested not in BACKENDS + ['auto']:
+        raise ValueError(f'Invalid JSON_BACKEND: {requested}. Valid values are: auto, {", ".join(BACKENDS)}')
+
+    for name in BACKENDS if requested == 'auto' else [requested]:
+        if name == 'orjson':
+            try:
+                import orjson
+            except ImportError:
+                continue
+            return name, orjson.loads, lambda obj: orjson.dumps(obj).decode('utf-8')
+        if name == 'msgspec':
+            try:
+                import msgspec
+            except ImportError:
+                continue
+            return name, msgspec.json.decode, lambda obj: msgspec.json.encode(obj).decode('utf-8')
+        return 'json', json.loads, lambda obj: json.dumps(obj, separators=(',', ':'))
+    raise ImportError(f'The {requested} package is not installed')
+
+
+def backend():
+    """Return the name, parse function and serialise function of the selected backend."""
+    global _backend
+    if _backend is None:
+        _backend = _select_backend()
+    return _backend
+
+
+def loads(text):
+    """Parse a JSON document from a string or bytes."""
+    return backend()[1](text)
+
+
+def dumps(obj):
+    """Serialise an object into a compact JSON string."""
+    return backend()[2](obj)
+
+
+def load(f):
+    """Parse a JSON document from a file."""
+    return loads(f.read())
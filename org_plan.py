@@ -0,0 +1,141 @@
+"""
+org_plan.py - Estimate the cost of collecting the workflow runs of an org, and schedule the largest repositories first.
+
+Description:
+    Before the workflow runs of an org are collected, the number of runs of every repository in the date range is
+    probed with a single `per_page=1` request to every endpoint that `get_workflow_runs.py` retrieves the runs
+    from: the runs endpoint of the repository, or the endpoint of every workflow listed in `workflow-names.txt` if
+    it exists. The number of runs gives an estimate of the API calls needed to retrieve them, as
+    `get_workflow_runs.py` lists the workflows, retrieves 100 runs per page and splits date ranges of more than 1,000
+    runs into sub-windows of about 800 runs. The estimated duration assumes `SECONDS_PER_CALL` seconds per call,
+    with `FETCH_CONCURRENCY` calls in flight, plus the delay between repositories.
+
+    The repositories are then scheduled largest first, so that the biggest repository does not start last and run
+    alone at the end of the job. With `REPO_CONCURRENCY` repositories fetched at a time, the estimated duration of
+    the plan is the time until the last of them is done, with every repository started by the first fetcher to be
+    free, in the order of the plan. The plan can be checked against a budget of API calls and of seconds:
+
+        - `refuse`: If the plan does not fit the budget, no runs are collected.
+        - `trim`: Repositories that do not fit the remaining budget are skipped, largest first.
+"""
+
+import heapq
+import math
+import os
+
+from github_api import (count_runs, fetch_concurrency, gh_api, map_concurrently, token_pool, workflow_runs_endpoints,
+                        MAX_RUNS_PER_QUERY, RUNS_PER_PAGE, RUNS_PER_WINDOW)
+
+SECONDS_PER_CALL = 1.0
+
+WORKFLOW_NAMES_FILE = 'workflow-names.txt'
+
+BUDGET_POLICIES = ['refuse', 'trim']
+
+
+def estimate_api_calls(total_runs):
+    """Return the estimated number of API calls for get_workflow_runs.py to retrieve total_runs runs of an endpoint."""
+    if total_runs == 0:
+        # An endpoint without runs is only probed
+        return 1
+    calls = 1 + math.ceil(total_runs / RUNS_PER_PAGE)
+    if total_runs > MAX_RUNS_PER_QUERY:
+        # Every sub-window is probed before it is retrieved, and its last page is usually partial
+        windows = math.ceil(total_runs / RUNS_PER_WINDOW)
+        calls += 2 * windows
+    return calls
+
+
+def estimate_seconds(api_calls, delay=0):
+    """Return the estimated duration in seconds of api_calls calls, followed by a delay."""
+    return api_calls * SECONDS_PER_CALL / fetch_concurrency() + delay
+
+
+def schedule_seconds(plans, concurrency=1):
+    """Return the estimated seconds until every plan is done, with concurrency plans run at a time in order."""
+    fetchers = [0.0] * min(max(1, concurrency), max(1, len(plans)))
+    for plan in plans:
+        heapq.heapreplace(fetchers, fetchers[0] + plan['seconds'])
+    return max(fetchers)
+
+
+def plan_repos(repos, start_date, end_date, delay=0):
+    """Probe the number of runs of every (owner, repository) pair, and return the plans scheduled largest first."""
+    workflow_names = None
+    if os.path.isfile(WORKFLOW_NAMES_FILE):
+        with open(WORKFLOW_NAMES_FILE, 'r') as f:
+            workflow_names = set(name for name in f.read().splitlines() if name)
+
+    def plan_repo(owner_repo):
+        owner, repo = owner_repo
+        # The same endpoints as get_workflow_runs.py, which lists the workflows of the repository again
+        endpoints, _, api_calls = workflow_runs_endpoints(owner, repo, workflow_names)
+        endpoint_runs = [count_runs(endpoint, start_date, end_date) for endpoint in endpoints]
+        total_runs = sum(endpoint_runs)
+        api_calls += sum(estimate_api_calls(runs) for runs in endpoint_runs)
+        return {
+            'owner_name': owner,
+            'repository_name': repo,
+            'total_runs': total_runs,
+            'api_calls': api_calls,
+            'seconds': estimate_seconds(api_calls, delay),
+        }
+
+    plans = map_concurrently(plan_repo, repos)
+    # Longest processing time first
+    return sorted(plans, key=lambda plan: plan['api_calls'], reverse=True)
+
+
+def remaining_rate_limit():
+    """Return the number of remaining core API calls of every token, which is not counted against the rate limit."""
+    pool = token_pool()
+    if pool is not None:
+        return pool.total_remaining()
+    return int(gh_api('rate_limit', '.resources.core.remaining').strip())
+
+
+def apply_budget(plans, api_budget=None, time_budget=None, policy='refuse', concurrency=1):
+    """Return the plans that fit the budget of API calls and seconds, in the same order, with concurrency plans run
+    at a time.
+
+    Raises a ValueError if the plans do not fit the budget and the policy is `refuse`.
+    """
+    if policy not in BUDGET_POLICIES:
+        raise ValueError(f'Invalid BUDGET_POLICY: {policy}. Valid values are: {", ".join(BUDGET_POLICIES)}')
+
+    total_calls = sum(plan['api_calls'] for plan in plans)
+    total_seconds = schedule_seconds(plans, concurrency)
+    over_calls = api_budget is not None and total_calls > api_budget
+    over_seconds = time_budget is not None and total_seconds > time_budget
+    if not over_calls and not over_seconds:
+        return plans
+    if policy == 'refuse':
+        raise ValueError(f'The estimated {total_calls} API calls and {total_seconds:.0f} seconds do not fit the budget '
+                         f'of {api_budget} API calls and {time_budget} seconds')
+
+    kept = []
+    calls = 0
+    # The seconds of every fetcher, as in schedule_seconds
+    fetchers = [0.0] * max(1, concurrency)
+    for plan in plans:
+        if api_budget is not None and calls + plan['api_calls'] > api_budget:
+            continue
+        if time_budget is not None and fetchers[0] + plan['seconds'] > time_budget:
+            continue
+        kept.append(plan)
+        calls += plan['api_calls']
+        heapq.heapreplace(fetchers, fetchers[0] + plan['seconds'])
+    return kept
+
+
+def print_plan(plans, rate_limit=None, concurrency=1):
+    """Print the plan of every repository, and the totals."""
+    print('owner_name,repository_name,total_runs,api_calls,seconds')
+    for plan in plans:
+        print(f'{plan["owner_name"]},{plan["repository_name"]},{plan["total_runs"]},{plan["api_calls"]},{plan["seconds"]:.0f}')
+    total_calls = sum(plan['api_calls'] for plan in plans)
+    total_seconds = schedule_seconds(plans, concurrency)
+    print(f'Estimated: {len(plans)} repositories, {sum(plan["total_runs"] for plan in plans)} runs, '
+          f'{total_calls} API calls, {total_seconds:.0f} seconds')
+    if rate_limit is not None:
+        print(f'Remaining rate limit: {rate_limit} API calls')
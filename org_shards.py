@@ -0,0 +1,136 @@
+"""
+org_shards.py - Partition the repositories of an org into shards, and merge the output files of every shard.
+
+Usage:
+    python org_shards.py merge <shard_count>
+
+Description:
+    When the `SHARD_COUNT` and `SHARD_INDEX` environment variables are set, `workflow_metrics.py` only collects the
+    workflow runs of the repositories in its own shard, so that an org can be split across the jobs of a matrix. A
+    repository is assigned to a shard by hashing its name, which is deterministic across runners and spreads the
+    repositories evenly over the shards.
+
+    Every shard writes its own output files, named after the org output files with a `-shard-<index>` suffix:
+
+        - `org-runs-shard-<index>.json`
+        - `org-workflow-stats-shard-<index>.csv`
+        - `org-workflow-stats-by-<fields>-shard-<index>.csv` for every additional grouping in `GROUP_BY`
+        - `org-workflow-top-runs-shard-<index>.csv` if `TOP_K` is set
+        - `org-workflow-stats-estimates-shard-<index>.csv` if `SAMPLE_PRECISION` is set
+        - `org-workflow-concurrency*-shard-<index>.csv` if `CONCURRENCY_TIMELINE` is set
+        - `org-workflow-chains-shard-<index>.csv` if `WORKFLOW_CHAINS` is set
+
+    The stats rows of a shard are already aggregated per repository and workflow, and every repository belongs to
+    exactly one shard, so merging the stats files only concatenates their rows and never rescans the workflow runs.
+    The runs files are merged record by record, without parsing the records.
+
+    The `merge` command combines the shard files in the current directory into `org-runs.json`,
+    `org-workflow-stats.csv`, `org-workflow-stats-by-<fields>.csv`, `org-workflow-top-runs.csv`,
+    `org-workflow-stats-estimates.csv`, `org-workflow-concurrency*.csv` and `org-workflow-chains.csv`. It fails if a
+    shard is missing. Compressed shard runs files, e.g. `org-runs-shard-<index>.ndjson.gz`, are merged into a runs file
+    with the compression set in `OUTPUT_COMPRESSION`.
+
+Output:
+    - The merged org output files
+
+Example:
+    python org_shards.py merge 4
+"""
+
+import glob
+import hashlib
+import os
+import re
+import sys
+
+from workflow_runs_io import RUNS_SUFFIXES, RunsWriter, iter_record_lines, output_compression, runs_file_name
+
+ORG_RUNS_BASE = 'org-runs'
+ORG_STATS_FILE = 'org-workflow-stats.csv'
+SHARD_SUFFIX = '-shard-{}'
+
+
+def shard_of(repo_name, shard_count):
+    """Return the index of the shard the repository belongs to."""
+    digest = hashlib.sha256(repo_name.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
+def shard_file(file_name, shard_index):
+    """Return the name of a shard output file, e.g. `org-runs-shard-0.ndjson.gz` for `org-runs.ndjson.gz`."""
+    base, dot, ext = file_name.partition('.')
+    return f'{base}{SHARD_SUFFIX.format(shard_index)}{dot}{ext}'
+
+
+def find_shard_runs_file(shard_index):
+    """Return the runs file of a shard, whatever its compression, or None if it does not exist."""
+    for compression in RUNS_SUFFIXES:
+        candidate = shard_file(runs_file_name(ORG_RUNS_BASE, compression), shard_index)
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def merge_runs(shard_files, output_file):
+    """Merge runs files written by RunsWriter into a single runs file, record by record."""
+    with RunsWriter(output_file) as writer:
+        for shard in shard_files:
+            for record in iter_record_lines(shard):
+                writer.write_raw(record)
+    return writer.total
+
+
+def merge_stats(shard_files, output_file):
+    """Merge CSV stats files by concatenating their rows under the header of the first file."""
+    total = 0
+    with open(output_file, 'w') as f2:
+        for i, shard in enumerate(shard_files):
+            with open(shard, 'r') as f1:
+                header = f1.readline()
+                if i == 0:
+                    f2.write(header)
+                for line in f1:
+                    f2.write(line)
+                    total += 1
+    return total
+
+
+def merge_shards(shard_count):
+    """Merge the output files of every shard in the current directory into the org output files."""
+    runs_files = [find_shard_runs_file(i) for i in range(shard_count)]
+    stats_files = [shard_file(ORG_STATS_FILE, i) for i in range(shard_count)]
+    missing = [shard_file(runs_file_name(ORG_RUNS_BASE), i) for i, file in enumerate(runs_files) if file is None]
+    missing += [file for file in stats_files if not os.path.exists(file)]
+    if missing:
+        raise FileNotFoundError(f'Missing shard files: {", ".join(missing)}')
+
+    org_runs_file = runs_file_name(ORG_RUNS_BASE, output_compression())
+    total_runs = merge_runs(runs_files, org_runs_file)
+    print(f'  Merged {total_runs} workflow runs from {shard_count} shards into {org_runs_file}')
+    total_rows = merge_stats(stats_files, ORG_STATS_FILE)
+    print(f'  Merged {total_rows} stats rows from {shard_count} shards into {ORG_STATS_FILE}')
+
+    # Merge the stats files of the additional groupings, the top runs, the estimates, the concurrency and the chains,
+    # which only exist for shards with evaluated runs
+    pattern = re.compile(r'^(org-workflow-stats-by-.+|org-workflow-top-runs|org-workflow-stats-estimates|org-workflow-concurrency.*|org-workflow-chains)' + re.escape(SHARD_SUFFIX.format('')) + r'(\d+)\.csv$')
+    groupings = {}
+    shard_files = glob.glob('org-workflow-stats-by-*' + SHARD_SUFFIX.format('*') + '.csv')
+    shard_files += glob.glob('org-workflow-top-runs' + SHARD_SUFFIX.format('*') + '.csv')
+    shard_files += glob.glob('org-workflow-stats-estimates' + SHARD_SUFFIX.format('*') + '.csv')
+    shard_files += glob.glob('org-workflow-concurrency*' + SHARD_SUFFIX.format('*') + '.csv')
+    shard_files += glob.glob('org-workflow-chains' + SHARD_SUFFIX.format('*') + '.csv')
+    for file in sorted(shard_files):
+        match = pattern.match(file)
+        if match and int(match.group(2)) < shard_count:
+            groupings.setdefault(match.group(1), []).append((int(match.group(2)), file))
+    for base, files in groupings.items():
+        output_file = f'{base}.csv'
+        merge_stats([file for _, file in sorted(files)], output_file)
+        print(f'  Merged {len(files)} shards into {output_file}')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'merge':
+        print('Usage: python org_shards.py merge <shard_count>')
+        sys.exit(1)
+    merge_shards(int(sys.argv[2]))
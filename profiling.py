@@ -0,0 +1,153 @@
+"""
+profiling.py - Profile the stages of the workflow metrics scripts, including the child processes they spawn.
+
+Description:
+    `workflow_metrics.py` runs `get_workflow_runs.py`, `evaluate_workflow_runs.py` and `workflow_runs_db.py` as child
+    processes, so wrapping it with `python -m cProfile` only profiles the parent, which mostly waits. Instead, every
+    script calls `start_profiling` with the name of its stage, and the `PROFILE` environment variable, which the child
+    processes inherit, turns on the profiling of every stage:
+
+        - `PROFILE=1` profiles every function call of every thread with `cProfile`, and traces the memory
+          allocations with `tracemalloc`. Every process writes `<stage>-<pid>.pstats`, which can be read with
+          `python -m pstats` or a viewer such as `snakeviz`, `<stage>-<pid>.txt` with the functions of the most
+          cumulative time, and `<stage>-<pid>.allocations.txt` with the peak traced memory and the allocation sites
+          of the most memory at exit.
+        - `PROFILE=sample` samples the stack of every thread every `PROFILE_INTERVAL` seconds (0.01 by default) from
+          a background thread instead, which adds little overhead to long collections of whole orgs. Every process
+          writes `<stage>-<pid>.folded`, with the number of samples of every stack, in the folded format of
+          `flamegraph.pl` and `speedscope`. The stacks are prefixed with the name of their thread, e.g. the
+          `fetch_stage` threads of `workflow_metrics.py`.
+
+    The profiles are written at exit to the directory set in the `PROFILE_DIR` environment variable (`profile` by
+    default), which is made absolute for the child processes, as they run in their own working directories.
+"""
+
+import atexit
+import collections
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+
+DEFAULT_PROFILE_DIR = 'profile'
+DEFAULT_INTERVAL = 0.01
+
+# Number of functions and allocation sites listed in the text summaries
+SUMMARY_LINES = 30
+
+
+def profile_mode():
+    """Return the profiling mode set in the `PROFILE` environment variable: `deterministic`, `sample` or None."""
+    value = os.getenv('PROFILE', '').lower()
+    if value in ['sample', 'sampling']:
+        return 'sample'
+    if value in ['1', 'true', 'yes']:
+        return 'deterministic'
+    return None
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of every other thread, sampled at a fixed interval."""
+
+    def __init__(self, interval):
+        super().__init__(name='profiling-sampler', daemon=True)
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        self.stopped.set()
+        self.join()
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def _profile_threads(profilers):
+    """Profile the threads started from now on, each with its own profiler."""
+    if sys.version_info >= (3, 12):
+        # The profiler is built on sys.monitoring, and already sees every thread
+        return
+
+    def start_thread_profiler(frame, event, arg):
+        # Called on the first event of a new thread, and replaced by the profiler of the thread
+        profiler = cProfile.Profile()
+        profilers.append(profiler)
+        profiler.enable()
+
+    threading.setprofile(start_thread_profiler)
+
+
+def _write_allocations(path):
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, cProfile.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    ])
+    current, peak = tracemalloc.get_traced_memory()
+    with open(path, 'w') as f:
+        f.write(f'Peak traced memory: {peak / 1024 / 1024:.1f} MiB, at exit: {current / 1024 / 1024:.1f} MiB\n\n')
+        f.write(f'Top {SUMMARY_LINES} allocation sites at exit:\n')
+        for statistic in snapshot.statistics('lineno')[:SUMMARY_LINES]:
+            f.write(f'{statistic}\n')
+
+
+def start_profiling(stage):
+    """Profile the rest of the current process as the given stage, if `PROFILE` is set. Returns the profile mode."""
+    mode = profile_mode()
+    if mode is None:
+        return None
+    profile_dir = os.path.abspath(os.getenv('PROFILE_DIR') or DEFAULT_PROFILE_DIR)
+    os.environ['PROFILE_DIR'] = profile_dir
+    os.makedirs(profile_dir, exist_ok=True)
+    base_path = os.path.join(profile_dir, f'{stage}-{os.getpid()}')
+
+    if mode == 'sample':
+        sampler = StackSampler(float(os.getenv('PROFILE_INTERVAL') or DEFAULT_INTERVAL))
+        sampler.start()
+        atexit.register(sampler.write, f'{base_path}.folded')
+        return mode
+
+    tracemalloc.start()
+    profiler = cProfile.Profile()
+    thread_profilers = []
+    _profile_threads(thread_profilers)
+
+    def write_profile():
+        profiler.disable()
+        threading.setprofile(None)
+        # The allocations are written first, so that they do not include the stats of the profilers
+        _write_allocations(f'{base_path}.allocations.txt')
+        tracemalloc.stop()
+        stats = pstats.Stats(profiler)
+        for thread_profiler in thread_profilers:
+            # The threads have finished, as they are joined before the exit handlers run
+            thread_profiler.create_stats()
+            if thread_profiler.stats:
+                stats.add(thread_profiler)
+        stats.dump_stats(f'{base_path}.pstats')
+        with open(f'{base_path}.txt', 'w') as f:
+            stats.stream = f
+            stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+
+    atexit.register(write_profile)
+    profiler.enable()
+    return mode
@@ -0,0 +1,225 @@
+"""
+run_archive.py - Keep workflow runs in an archive partitioned by repository and month, and read only the partitions
+of a date range and a set of repositories.
+
+Usage:
+    python run_archive.py list <archive_dir> [--since <date>] [--until <date>] [--repository <owner/repo>]
+
+Requirements:
+    - Python 3.x
+
+Description:
+    `runs.json` and `org-runs.json` hold every run of a collection in one file, so any question about a narrower
+    period or a few repositories reads every run. When the `ARCHIVE_DIR` environment variable is set,
+    `get_workflow_runs.py` also writes the runs it retrieves into an archive, with one partition per repository and
+    month of `run_started_at`, or of `created_at` for the runs that have not started:
+
+        archive/<owner>/<repo>/2023-07.ndjson.gz
+        archive/<owner>/<repo>/2023-08.ndjson.gz
+        archive/<owner>/<repo>/manifest.json
+
+    The manifest of a repository holds the file, the number of runs and the first and last start time of every
+    partition. The start time of a run is its `run_started_at`, or its `created_at` if it has not started, and the date
+    range of a query is compared with the same start time. Runs that are retrieved again replace the runs with the same
+    id and attempt in their partition, so overlapping collections can be archived, and every partition is replaced
+    atomically.
+
+    `select_partitions` prunes the archive without opening the partitions: the repositories that do not match the
+    repository filter are skipped by their directories, and the partitions that do not overlap the date range are
+    skipped by their manifest entries. `iter_archive_runs` then reads the selected partitions, yielding the runs in
+    the date range, with the `owner_name` and `repository_name` of their partition. A query of one month of a yearly
+    archive reads one twelfth of it.
+
+    `evaluate_workflow_runs.py` evaluates an archive when its runs file argument is an archive directory, with the
+    `--since`, `--until` and `--repository` options.
+
+    Dates are compared as prefixes of the ISO 8601 timestamps, so `--until 2023-07-31` includes every run of that day.
+    Repository filters are `owner/repo` or `repo`, and can hold wildcards, e.g. `myorg/web-*`. The runs of a single
+    org, which do not hold their owner, are matched by the `repo` part of an `owner/repo` filter.
+
+Output:
+    - The `list` command prints the selected partitions, with their number of runs.
+
+Example:
+    python run_archive.py list archive --since 2023-07-01 --until 2023-09-30 --repository myorg/web-*
+"""
+
+import argparse
+import fnmatch
+import json
+import os
+import sys
+
+from workflow_runs_io import RunsWriter, iter_runs
+
+MANIFEST_FILE = 'manifest.json'
+MANIFEST_VERSION = 1
+
+# Suffix of the partition files
+PARTITION_SUFFIX = '.ndjson.gz'
+
+
+def archive_dir():
+    """Return the archive directory set in the `ARCHIVE_DIR` environment variable, or None."""
+    return os.getenv('ARCHIVE_DIR') or None
+
+
+def start_time(run):
+    """Return the start time of a run: its `run_started_at`, or its `created_at` if it has not started, or None."""
+    return run.get('run_started_at') or run.get('created_at')
+
+
+def partition_key(run):
+    """Return the month of the partition of a run, e.g. `2023-07`, or None if the run has no start time."""
+    started_at = start_time(run)
+    return started_at[:7] if started_at else None
+
+
+def in_range(value, since=None, until=None):
+    """Return whether a timestamp is in the date range, comparing the bounds as prefixes."""
+    return (since is None or value >= since) and (until is None or value[:len(until)] <= until)
+
+
+def load_manifest(repo_dir):
+    path = os.path.join(repo_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'version': MANIFEST_VERSION, 'partitions': {}}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(repo_dir, manifest):
+    path = os.path.join(repo_dir, MANIFEST_FILE)
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(f'{path}.tmp', path)
+
+
+def run_key(run):
+    return run.get('id'), run.get('run_attempt')
+
+
+def archive_runs(directory, owner, repo, runs):
+    """Write runs of a repository into the partitions of their months, replacing the runs already archived with the
+    same id and attempt. Returns the number of partitions written."""
+    repo_dir = os.path.join(directory, owner, repo)
+    os.makedirs(repo_dir, exist_ok=True)
+    months = {}
+    for run in runs:
+        month = partition_key(run)
+        if month is not None:
+            months.setdefault(month, []).append(run)
+
+    manifest = load_manifest(repo_dir)
+    for month, month_runs in sorted(months.items()):
+        path = os.path.join(repo_dir, month + PARTITION_SUFFIX)
+        merged = {}
+        if os.path.exists(path):
+            for run in iter_runs(path):
+                merged[run_key(run) if run.get('id') is not None else len(merged)] = run
+        for run in month_runs:
+            merged[run_key(run) if run.get('id') is not None else len(merged)] = run
+        # Most recent first, as in the runs files
+        partition_runs = sorted(merged.values(), key=lambda run: start_time(run) or '', reverse=True)
+        temporary_path = os.path.join(repo_dir, f'{month}.tmp{PARTITION_SUFFIX}')
+        with RunsWriter(temporary_path) as writer:
+            for run in partition_runs:
+                writer.write(run)
+        os.replace(temporary_path, path)
+        started_at = [start_time(run) for run in partition_runs if start_time(run)]
+        manifest['partitions'][month] = {
+            'file': month + PARTITION_SUFFIX,
+            'runs': len(partition_runs),
+            'min_run_started_at': min(started_at, default=None),
+            'max_run_started_at': max(started_at, default=None),
+        }
+    save_manifest(repo_dir, manifest)
+    return len(months)
+
+
+def matches_repository(owner, repo, repositories):
+    """Return whether a repository matches any repository filter, `owner/repo` or `repo`, with wildcards.
+
+    The runs of a single org do not hold their owner, so an `owner/repo` filter matches a repository without an owner
+    by its `repo` part. Raises a ValueError for a run without a repository.
+    """
+    if not repositories:
+        return True
+    if repo is None:
+        raise ValueError('the runs do not hold their repository_name')
+    for pattern in repositories:
+        if '/' not in pattern:
+            name = repo
+        elif owner is None:
+            name, pattern = repo, pattern.split('/', 1)[1]
+        else:
+            name = f'{owner}/{repo}'
+        if fnmatch.fnmatchcase(name, pattern):
+            return True
+    return False
+
+
+def overlaps(entry, since=None, until=None):
+    """Return whether a partition of a manifest may hold runs in the date range."""
+    if entry['min_run_started_at'] is None:
+        # The start times of the runs are checked when read
+        return True
+    return ((since is None or entry['max_run_started_at'] >= since)
+            and (until is None or entry['min_run_started_at'][:len(until)] <= until))
+
+
+def select_partitions(directory, since=None, until=None, repositories=None):
+    """Return the partitions that may hold runs in the date range of the repositories, as (owner, repo, path,
+    manifest entry), and the total number of partitions of the repositories."""
+    selected = []
+    total = 0
+    for owner in sorted(os.listdir(directory)):
+        owner_dir = os.path.join(directory, owner)
+        if not os.path.isdir(owner_dir):
+            continue
+        for repo in sorted(os.listdir(owner_dir)):
+            repo_dir = os.path.join(owner_dir, repo)
+            if not os.path.isdir(repo_dir):
+                continue
+            if not matches_repository(owner, repo, repositories):
+                continue
+            partitions = load_manifest(repo_dir)['partitions']
+            total += len(partitions)
+            for month, entry in sorted(partitions.items(), reverse=True):
+                if overlaps(entry, since, until):
+                    selected.append((owner, repo, os.path.join(repo_dir, entry['file']), entry))
+    return selected, total
+
+
+def iter_archive_runs(partitions, since=None, until=None):
+    """Yield the runs in the date range of the selected partitions, with the owner and repository of their
+    partition."""
+    for owner, repo, path, entry in partitions:
+        # The runs of a partition that is within the range are yielded without comparing their start times
+        within = entry['min_run_started_at'] is not None and all(
+            in_range(entry[bound], since, until) for bound in ['min_run_started_at', 'max_run_started_at'])
+        for run in iter_runs(path):
+            if not within and not in_range(start_time(run) or '', since, until):
+                continue
+            run.setdefault('owner_name', owner)
+            run.setdefault('repository_name', repo)
+            yield run
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='List the partitions of a workflow runs archive.')
+    parser.add_argument('command', choices=['list'])
+    parser.add_argument('archive_dir')
+    parser.add_argument('--since', help='First day of the runs, e.g. 2023-07-01')
+    parser.add_argument('--until', help='Last day of the runs, e.g. 2023-07-31')
+    parser.add_argument('--repository', action='append', help='Repository filter, e.g. myorg/web-*')
+    args = parser.parse_args(argv)
+
+    partitions, total = select_partitions(args.archive_dir, args.since, args.until, args.repository)
+    for owner, repo, path, entry in partitions:
+        print(f'{path}: {entry["runs"]} runs from {entry["min_run_started_at"]} to {entry["max_run_started_at"]}')
+    print(f'{len(partitions)} of {total} partitions, {sum(entry["runs"] for *_, entry in partitions)} runs')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,314 @@
+"""
+run_cache.py - Convert a runs file into a binary columnar run cache, which is memory-mapped when it is evaluated.
+
+Usage:
+    python run_cache.py build <runs_file> <cache_file>
+
+Requirements:
+    - Python 3.x
+
+Description:
+    Evaluating a large runs file, e.g. `org-runs.json`, is dominated by parsing its JSON. When the same runs are
+    evaluated many times, e.g. with different `workflow-names.txt` filters or `GROUP_BY` groupings, the runs can be
+    converted once into a run cache file (e.g. `org-runs.runcache`), which `evaluate_workflow_runs.py` and every other
+    reader of `workflow_runs_io.iter_runs` read directly.
+
+    The run cache stores every field of the runs in its own column:
+
+        - Numbers (`id`, `run_number`, `run_attempt`, `duration` and the billable time) as fixed-width 64-bit
+          columns.
+        - Fields with few distinct values (e.g. `name`, `conclusion`, `event`, `head_branch`) as 32-bit codes into a
+          dictionary of their distinct strings.
+        - Fields with many distinct values (e.g. `url`, `display_title` and the timestamps) as the offsets of their
+          UTF-8 strings in a blob.
+
+    The file is memory-mapped and its columns are read in place, as views of the mapped file, without copying or
+    parsing them, so opening a cache of millions of runs only reads its small header, and only the columns that are
+    evaluated are paged in from the page cache. Missing values are kept as `null`. Fields that are not listed in
+    `COLUMNS` are not stored.
+
+    The cache is written in a single streaming pass over the runs file: every column is appended to its own
+    temporary file, and the columns are then concatenated after the header.
+
+Output:
+    - The run cache file
+
+Example:
+    python run_cache.py build org-runs.json org-runs.runcache
+"""
+
+import array
+import json
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+
+CACHE_SUFFIX = '.runcache'
+MAGIC = b'WFRCACHE'
+VERSION = 3
+
+# Kinds of the columns: 64-bit integers, 64-bit floats, dictionary-encoded strings and plain strings
+INT, FLOAT, DICT, TEXT = 'int', 'float', 'dict', 'text'
+
+COLUMNS = [
+    ('id', INT),
+    ('run_number', INT),
+    ('run_attempt', INT),
+    ('duration', FLOAT),
+    ('billable_ms_ubuntu', INT),
+    ('billable_ms_macos', INT),
+    ('billable_ms_windows', INT),
+    ('owner_name', DICT),
+    ('repository_name', DICT),
+    ('name', DICT),
+    ('conclusion', DICT),
+    ('status', DICT),
+    ('event', DICT),
+    ('head_branch', DICT),
+    ('head_sha', TEXT),
+    ('actor', DICT),
+    ('display_title', TEXT),
+    ('url', TEXT),
+    ('created_at', TEXT),
+    ('run_started_at', TEXT),
+    ('updated_at', TEXT),
+]
+
+# Values that stand for a missing value in the numeric columns, and the dictionary code of a missing string
+NULL_INT = -2 ** 63
+NULL_CODE = 2 ** 32 - 1
+# Offset of a missing string in a text column, which is told apart from an empty string
+NULL_OFFSET = 2 ** 64 - 1
+
+# Number of values of a column buffered before they are appended to its temporary file
+BUFFER_SIZE = 65536
+
+
+def is_run_cache(path):
+    return path.endswith(CACHE_SUFFIX)
+
+
+class _TextWriter:
+    """Appends strings to an offsets file and a blob file."""
+
+    def __init__(self, directory, name):
+        self.offsets_file = open(os.path.join(directory, f'{name}.offsets'), 'wb')
+        self.blob_file = open(os.path.join(directory, f'{name}.blob'), 'wb')
+        self.offsets = array.array('Q')
+        self.size = 0
+
+    def append(self, value):
+        if value is None:
+            self.offsets.append(NULL_OFFSET)
+        else:
+            data = value.encode('utf-8')
+            self.blob_file.write(data)
+            self.size += len(data)
+            self.offsets.append(self.size)
+        if len(self.offsets) >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.offsets.tofile(self.offsets_file)
+        self.offsets = array.array('Q')
+
+    def close(self):
+        self.flush()
+        self.offsets_file.close()
+        self.blob_file.close()
+
+
+def build_cache(runs_file, cache_file):
+    """Convert a runs file into a run cache file. Returns the number of runs."""
+    from workflow_runs_io import iter_runs
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(cache_file))) as directory:
+        buffers = {}
+        files = {}
+        texts = {}
+        dictionaries = {}
+        for name, kind in COLUMNS:
+            if kind == TEXT:
+                texts[name] = _TextWriter(directory, name)
+                continue
+            buffers[name] = array.array({INT: 'q', FLOAT: 'd', DICT: 'I'}[kind])
+            files[name] = open(os.path.join(directory, f'{name}.values'), 'wb')
+            if kind == DICT:
+                dictionaries[name] = {}
+
+        rows = 0
+        for run in iter_runs(runs_file):
+            rows += 1
+            for name, kind in COLUMNS:
+                value = run.get(name)
+                if kind == TEXT:
+                    texts[name].append(None if value is None else str(value))
+                    continue
+                if kind == INT:
+                    value = NULL_INT if value is None else int(value)
+                elif kind == FLOAT:
+                    value = float('nan') if value is None else float(value)
+                else:
+                    codes = dictionaries[name]
+                    if value is None:
+                        value = NULL_CODE
+                    else:
+                        value = codes.setdefault(str(value), len(codes))
+                buffer = buffers[name]
+                buffer.append(value)
+                if len(buffer) >= BUFFER_SIZE:
+                    buffer.tofile(files[name])
+                    del buffer[:]
+        for name, buffer in buffers.items():
+            buffer.tofile(files[name])
+            files[name].close()
+        for writer in texts.values():
+            writer.close()
+
+        # The strings of every dictionary are stored as a text column
+        for name, codes in dictionaries.items():
+            writer = _TextWriter(directory, f'{name}.dictionary')
+            for value in codes:
+                writer.append(value)
+            writer.close()
+
+        # Lay out the sections of every column after the header, aligned to 8 bytes
+        sections = []
+        columns = []
+        for name, kind in COLUMNS:
+            column = {'name': name, 'kind': kind}
+            if kind == TEXT:
+                column['offsets'] = f'{name}.offsets'
+                column['blob'] = f'{name}.blob'
+            else:
+                column['values'] = f'{name}.values'
+                if kind == DICT:
+                    column['size'] = len(dictionaries[name])
+                    column['dictionary_offsets'] = f'{name}.dictionary.offsets'
+                    column['dictionary_blob'] = f'{name}.dictionary.blob'
+            sections += [value for key, value in column.items() if key not in ('name', 'kind', 'size')]
+            columns.append(column)
+
+        header = {'version': VERSION, 'rows': rows, 'columns': columns}
+        # The header holds the position of every section, which does not change the length of the header when it is
+        # filled in, as the positions are written with a fixed width
+        positions = {section: 0 for section in sections}
+        header_size = len(_encode_header(header, positions))
+        position = _align(len(MAGIC) + 8 + header_size)
+        for section in sections:
+            positions[section] = position
+            position = _align(position + os.path.getsize(os.path.join(directory, section)))
+
+        with open(cache_file, 'wb') as f:
+            encoded_header = _encode_header(header, positions)
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(encoded_header)))
+            f.write(encoded_header)
+            for section in sections:
+                f.write(b'\0' * (positions[section] - f.tell()))
+                with open(os.path.join(directory, section), 'rb') as f2:
+                    shutil.copyfileobj(f2, f)
+    return rows
+
+
+def _align(position):
+    return (position + 7) // 8 * 8
+
+
+def _encode_header(header, positions):
+    """Encode the header, with the position of every section as a fixed-width number."""
+    columns = []
+    for column in header['columns']:
+        encoded = {}
+        for key, value in column.items():
+            encoded[key] = f'{positions[value]:020d}' if key not in ('name', 'kind', 'size') else value
+        columns.append(encoded)
+    return json.dumps(dict(header, columns=columns)).encode('utf-8')
+
+
+class RunCache:
+    """A memory-mapped run cache, whose columns are read as views of the mapped file."""
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'{path} is not a run cache file')
+        header_size = struct.unpack_from('<Q', self.map, len(MAGIC))[0]
+        start = len(MAGIC) + 8
+        header = json.loads(self.map[start:start + header_size])
+        if header['version'] != VERSION:
+            raise ValueError(f'Unsupported run cache version: {header["version"]}')
+        self.rows = header['rows']
+        self.columns = {column['name']: column for column in header['columns']}
+        self.view = memoryview(self.map)
+        self.dictionaries = {}
+
+    def _section(self, column, key, item_size, count, format_char):
+        position = int(column[key])
+        return self.view[position:position + item_size * count].cast(format_char)
+
+    def _iter_text(self, offsets, blob):
+        """Yield the strings of a text section, from the end offset of every string in the blob."""
+        view = self.view
+        start = 0
+        for end in offsets:
+            if end == NULL_OFFSET:
+                yield None
+                continue
+            yield str(view[blob + start:blob + end], 'utf-8')
+            start = end
+
+    def column(self, name):
+        """Yield the values of a column, read from the mapped file as they are needed."""
+        column = self.columns[name]
+        kind = column['kind']
+        if kind == INT:
+            return (None if value == NULL_INT else value for value in self._section(column, 'values', 8, self.rows, 'q'))
+        if kind == FLOAT:
+            return (None if value != value else value for value in self._section(column, 'values', 8, self.rows, 'd'))
+        if kind == DICT:
+            if name not in self.dictionaries:
+                offsets = self._section(column, 'dictionary_offsets', 8, column['size'], 'Q')
+                self.dictionaries[name] = list(self._iter_text(offsets, int(column['dictionary_blob']))) + [None]
+            # The code of a missing value is past the end of the dictionary, so it is mapped to its last item
+            dictionary = self.dictionaries[name]
+            missing = len(dictionary) - 1
+            return (dictionary[missing if code == NULL_CODE else code]
+                    for code in self._section(column, 'values', 4, self.rows, 'I'))
+        return self._iter_text(self._section(column, 'offsets', 8, self.rows, 'Q'), int(column['blob']))
+
+    def iter_runs(self, fields=None):
+        """Yield every run, with only the given fields if set."""
+        names = [name for name, _ in COLUMNS if fields is None or name in fields]
+        for values in zip(*[self.column(name) for name in names]):
+            yield dict(zip(names, values))
+
+    def close(self):
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # Views of the mapped file are still referenced, and the file is unmapped when they are released
+            pass
+        self.file.close()
+
+
+def iter_cached_runs(path, fields=None):
+    """Yield every run in a run cache file, with only the given fields if set."""
+    cache = RunCache(path)
+    try:
+        yield from cache.iter_runs(fields)
+    finally:
+        cache.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4 or sys.argv[1] != 'build':
+        print('Usage: python run_cache.py build <runs_file> <cache_file>')
+        sys.exit(1)
+    total = build_cache(sys.argv[2], sys.argv[3])
+    print(f'  Cached {total} workflow runs from {sys.argv[2]} in {sys.argv[3]}')
@@ -0,0 +1,227 @@
+"""
+run_concurrency.py - Evaluate how many workflow runs were executing at once, per workflow and over all runs.
+
+Usage:
+    python run_concurrency.py <runs_file> [--output-prefix <prefix>] [--interval <seconds>]
+
+Requirements:
+    - Python 3.x
+
+Description:
+    Right-sizing the runners of a repository or an org needs the number of runs that were executing at the same time,
+    which the stats of `workflow-stats.csv` do not tell. Every run executes from its `run_started_at` to its
+    `updated_at`, and the concurrency at any time is the number of these intervals that hold it.
+
+    `ConcurrencyTimeline` keeps the start and the end of every run as two events, packed into 64-bit integers in an
+    `array` (16 bytes per run), and sorts them to sweep them in order of time: the concurrency goes up by one at a
+    start, and down by one at an end. Ends are ordered before the starts at the same second, so that a run that starts
+    when another ends does not overlap it. The sweep takes O(N log N) time for N runs, and only holds the sorted
+    events and one row per interval of the time series, never an array per second:
+
+        - The peak concurrency, and the time it was first reached.
+        - The average concurrency, and the busy time when at least one run was executing, from the first start to the
+          last end.
+        - The number of seconds spent at each concurrency level.
+        - A time series of the maximum and the average concurrency of every interval of `CONCURRENCY_INTERVAL` seconds
+          (3600 by default), aligned to the epoch.
+
+    The timeline of all runs is swept from the timelines of every workflow, merged in order of time, so the events are
+    only sorted once. A run takes at least the second it started in, and runs without `run_started_at` or
+    `updated_at` are ignored.
+
+    `evaluate_workflow_runs.py` evaluates the concurrency of the runs file when the `CONCURRENCY_TIMELINE`
+    environment variable is set. This script evaluates the concurrency of any runs file, e.g. `org-runs.json` for the
+    concurrency over every repository of an org.
+
+Output:
+    - `workflow-concurrency.csv` with the following columns, with a row for every workflow, and a row named `*` for
+      all runs:
+        - workflow_name, runs, peak_concurrency, peak_at, average_concurrency, busy_seconds
+    - `workflow-concurrency-levels.csv` with the seconds spent at every concurrency level, with the columns:
+        - workflow_name, concurrency, seconds
+    - `workflow-concurrency-timeline.csv` with the time series, with the columns:
+        - workflow_name, interval_start, max_concurrency, average_concurrency
+
+Example:
+    python run_concurrency.py org-runs.json --output-prefix org-all-
+"""
+
+import argparse
+import array
+import csv
+import heapq
+import os
+import sys
+
+from datetime import datetime, timezone
+
+from workflow_runs_io import iter_runs
+from workflow_stats import parse_timestamp
+
+DEFAULT_INTERVAL = 3600
+
+# Name of the rows of all runs
+ALL_RUNS = '*'
+
+# Run fields of the intervals of the runs
+INTERVAL_FIELDS = {'name', 'run_started_at', 'updated_at'}
+
+CONCURRENCY_FILE = 'workflow-concurrency.csv'
+LEVELS_FILE = 'workflow-concurrency-levels.csv'
+TIMELINE_FILE = 'workflow-concurrency-timeline.csv'
+
+CONCURRENCY_COLUMNS = ['runs', 'peak_concurrency', 'peak_at', 'average_concurrency', 'busy_seconds']
+LEVELS_COLUMNS = ['concurrency', 'seconds']
+TIMELINE_COLUMNS = ['interval_start', 'max_concurrency', 'average_concurrency']
+
+
+def concurrency_timeline():
+    """Return whether the concurrency of the runs is evaluated, as set in `CONCURRENCY_TIMELINE`."""
+    return os.getenv('CONCURRENCY_TIMELINE', '').lower() in ['1', 'true', 'yes']
+
+
+def concurrency_interval():
+    """Return the seconds of every interval of the time series, as set in `CONCURRENCY_INTERVAL`."""
+    return int(os.getenv('CONCURRENCY_INTERVAL') or DEFAULT_INTERVAL)
+
+
+def format_time(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class Sweep:
+    """The concurrency of a stream of events, swept in order of time."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.peak = 0
+        self.peak_at = None
+        self.first_start = None
+        self.last_end = None
+        self.level_seconds = {}
+        self.series = []
+
+    def run(self, events):
+        interval = self.interval
+        level_seconds = self.level_seconds
+        series = self.series
+        level = 0
+        time = None
+        interval_start = interval_max = interval_area = 0
+        for event in events:
+            event_time = event >> 1
+            if time is None:
+                self.first_start = time = event_time
+                interval_start = event_time - event_time % interval
+            elif event_time > time:
+                # The level after every event at the previous time is held until this event
+                level_seconds[level] = level_seconds.get(level, 0) + event_time - time
+                # Close every interval that ends before the event, with the level held until its end
+                while event_time >= interval_start + interval:
+                    interval_area += level * (interval_start + interval - time)
+                    series.append((interval_start, max(interval_max, level), interval_area / interval))
+                    time = interval_start = interval_start + interval
+                    interval_max = interval_area = 0
+                if event_time > time:
+                    interval_max = max(interval_max, level)
+                interval_area += level * (event_time - time)
+                time = event_time
+            if event & 1:
+                level += 1
+                if level > self.peak:
+                    self.peak = level
+                    self.peak_at = event_time
+            else:
+                level -= 1
+        if time is not None:
+            self.last_end = time
+            series.append((interval_start, interval_max, interval_area / interval))
+        return self
+
+    def summary_row(self, runs):
+        """Return the concurrency columns of the sweep, formatted as in `workflow-concurrency.csv`."""
+        if self.first_start is None:
+            return [runs, 0, '', '0.00', 0]
+        span = self.last_end - self.first_start
+        area = sum(level * seconds for level, seconds in self.level_seconds.items())
+        return [runs, self.peak, format_time(self.peak_at), f'{area / span if span else 0:.2f}',
+                span - self.level_seconds.get(0, 0)]
+
+    def level_rows(self):
+        return [[level, self.level_seconds[level]] for level in sorted(self.level_seconds)]
+
+    def timeline_rows(self):
+        return [[format_time(start), maximum, f'{average:.2f}'] for start, maximum, average in self.series]
+
+
+class ConcurrencyTimeline:
+    """The start and end events of the runs of every workflow, as packed integers: the time in seconds times two,
+    plus one for a start."""
+
+    def __init__(self):
+        self.events = {}
+
+    def add(self, run):
+        started_at, updated_at = run.get('run_started_at'), run.get('updated_at')
+        if not started_at or not updated_at:
+            return
+        start = int(parse_timestamp(started_at).timestamp())
+        # A run takes at least the second it started in, as the timestamps are in whole seconds
+        end = max(start + 1, int(parse_timestamp(updated_at).timestamp()))
+        events = self.events.get(run['name'])
+        if events is None:
+            events = self.events[run['name']] = array.array('q')
+        events.append(start << 1 | 1)
+        events.append(end << 1)
+
+    def sweeps(self, interval):
+        """Return the sweep of every workflow, and of all runs, by workflow name."""
+        for name, events in self.events.items():
+            # Sorted in place of the unsorted events, so that only one workflow is held as a list at a time
+            self.events[name] = array.array('q', sorted(events))
+        sweeps = {name: Sweep(interval).run(events) for name, events in self.events.items()}
+        sweeps[ALL_RUNS] = Sweep(interval).run(heapq.merge(*self.events.values()))
+        return sweeps
+
+    def runs(self, name):
+        if name == ALL_RUNS:
+            return sum(len(events) for events in self.events.values()) // 2
+        return len(self.events.get(name, ())) // 2
+
+    def write(self, interval, prefix='', workflow_names=None):
+        """Write the concurrency, levels and timeline files of every workflow and of all runs."""
+        sweeps = self.sweeps(interval)
+        names = list(workflow_names or self.events) + [ALL_RUNS]
+        for name in names:
+            if name not in sweeps:
+                # A workflow without runs that have both timestamps
+                sweeps[name] = Sweep(interval)
+        for file_name, columns, rows in [
+                (CONCURRENCY_FILE, CONCURRENCY_COLUMNS, lambda name: [sweeps[name].summary_row(self.runs(name))]),
+                (LEVELS_FILE, LEVELS_COLUMNS, lambda name: sweeps[name].level_rows()),
+                (TIMELINE_FILE, TIMELINE_COLUMNS, lambda name: sweeps[name].timeline_rows())]:
+            with open(f'{prefix}{file_name}', 'w', newline='') as f:
+                writer = csv.writer(f, lineterminator='\n')
+                writer.writerow(['workflow_name'] + columns)
+                for name in names:
+                    writer.writerows([name] + row for row in rows(name))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Evaluate the concurrency of the workflow runs of a runs file.')
+    parser.add_argument('runs_file')
+    parser.add_argument('--output-prefix', default='', help='Prefix of the output files, e.g. org-all-')
+    parser.add_argument('--interval', type=int, default=concurrency_interval(),
+                        help='Seconds of every interval of the time series')
+    args = parser.parse_args(argv)
+
+    timeline = ConcurrencyTimeline()
+    for run in iter_runs(args.runs_file, INTERVAL_FIELDS):
+        timeline.add(run)
+    timeline.write(args.interval, args.output_prefix)
+    print(f'  Info: The concurrency of {timeline.runs(ALL_RUNS)} workflow runs is written to '
+          f'{args.output_prefix}{CONCURRENCY_FILE}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,160 @@
+"""
+run_dedup.py - Deduplicate workflow runs by repository and run id, keeping the latest attempt or every attempt.
+
+Description:
+    The same run can be read more than once: a run that is re-run while its pages are retrieved moves to the first
+    page with its next `run_attempt`, overlapping runs files are merged, and an org runs file can be merged twice.
+    Duplicates inflate `total_runs`, and superseded attempts distort the success rate, so runs are deduplicated as
+    they are read, with the policy set in the `DEDUP_POLICY` environment variable:
+
+        - `latest` (default): Only the latest attempt of every run is kept, once.
+        - `all`: Every attempt of every run is kept, once.
+        - `off`: Runs are not deduplicated.
+
+    `RunIndex` keeps the runs it has seen in a compact open-addressing hash table: the (repository, run id) of a run,
+    and its attempt with the `all` policy, are packed into one 64-bit integer key in an `array`, next to one byte
+    with the latest attempt of the run and whether it was kept. This takes 9 bytes per slot, with the table at most
+    three quarters full, or about 150 MB for 10 million runs, where a dict of tuples would take over 1 GB. Every run
+    is looked up in O(1) time. The rare keys that do not fit in 64 bits are kept in a dict.
+
+    With the `latest` policy, runs are deduplicated in a single pass: a run is kept unless a later or the same
+    attempt of the run was kept before it. If a later attempt of a run that was kept comes after it, the index is
+    marked as `superseded`, as the earlier attempt was already counted. The index then holds the latest attempt of
+    every run, so the runs are read again after `restart`, keeping only their latest attempts. Runs are ordered most
+    recent first, so this second pass is rarely needed.
+
+    Runs without an `id` field are always kept.
+"""
+
+import array
+import os
+
+LATEST, ALL, OFF = 'latest', 'all', 'off'
+POLICIES = [LATEST, ALL, OFF]
+
+# Run fields that identify a run
+KEY_FIELDS = {'owner_name', 'repository_name', 'id', 'run_attempt'}
+
+# Bits of the packed key: the repository index, the run id and the attempt
+REPOSITORY_BITS = 17
+ID_BITS = 40
+ATTEMPT_BITS = 6
+
+# Flag of the value of a slot, set when the latest attempt of the run was kept
+KEPT = 0x80
+
+# The table of 1M slots takes 9 MB, and grows by doubling
+INITIAL_CAPACITY = 1 << 20
+MAX_LOAD = 0.75
+
+# Multiplier of the Fibonacci hashing of the keys
+_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+_MASK_64 = (1 << 64) - 1
+
+
+def dedup_policy():
+    """Return the deduplication policy set in the `DEDUP_POLICY` environment variable."""
+    policy = (os.getenv('DEDUP_POLICY') or LATEST).lower()
+    if policy not in POLICIES:
+        raise ValueError(f'Invalid DEDUP_POLICY: {policy}. Valid policies are: {", ".join(POLICIES)}')
+    return policy
+
+
+def run_index():
+    """Return a RunIndex with the policy set in `DEDUP_POLICY`, or None if runs are not deduplicated."""
+    policy = dedup_policy()
+    return None if policy == OFF else RunIndex(policy)
+
+
+class RunIndex:
+    """The runs that were seen, keyed by repository and run id, with the latest attempt of every run."""
+
+    def __init__(self, policy=LATEST, capacity=INITIAL_CAPACITY):
+        self.policy = policy
+        # Every attempt of a run has its own key with the `all` policy
+        self.attempt_keys = policy == ALL
+        self.keys = array.array('Q', bytes(8 * capacity))
+        self.values = array.array('B', bytes(capacity))
+        self.mask = capacity - 1
+        self.size = 0
+        self.repositories = {}
+        self.overflow = {}
+        self.superseded = False
+
+    def __len__(self):
+        return self.size + len(self.overflow)
+
+    def _overflow_keep(self, key, attempt):
+        """Keep a run whose key does not fit in 64 bits, with the same rules as `keep`."""
+        value = self.overflow.get(key, 0)
+        latest_attempt = value & ~KEPT
+        if attempt < latest_attempt or (attempt == latest_attempt and value & KEPT):
+            return False
+        if value & KEPT:
+            self.superseded = True
+        self.overflow[key] = attempt | KEPT
+        return True
+
+    def _grow(self):
+        old_keys, old_values = self.keys, self.values
+        capacity = 2 * len(old_keys)
+        keys = array.array('Q', bytes(8 * capacity))
+        values = array.array('B', bytes(capacity))
+        mask = capacity - 1
+        for key, value in zip(old_keys, old_values):
+            if key:
+                slot = ((key * _HASH_MULTIPLIER) & _MASK_64) >> 32 & mask
+                while keys[slot]:
+                    slot = (slot + 1) & mask
+                keys[slot] = key
+                values[slot] = value
+        self.keys, self.values, self.mask = keys, values, mask
+
+    def keep(self, run):
+        """Return whether a run is kept, and add it to the index. O(1) per run."""
+        run_id = run.get('id')
+        if run_id is None:
+            return True
+        repository = (run.get('owner_name'), run.get('repository_name'))
+        repository_index = self.repositories.get(repository)
+        if repository_index is None:
+            repository_index = self.repositories[repository] = len(self.repositories)
+        attempt = run.get('run_attempt') or 1
+        if attempt >= KEPT:
+            attempt = KEPT - 1
+        key_attempt = attempt if self.attempt_keys else 0
+        if repository_index >> REPOSITORY_BITS or run_id >> ID_BITS or key_attempt >> ATTEMPT_BITS:
+            return self._overflow_keep((repository_index, run_id, key_attempt), attempt)
+        # The packed key is never 0, which marks an empty slot
+        key = ((repository_index << ID_BITS | run_id) << ATTEMPT_BITS | key_attempt) + 1
+
+        keys = self.keys
+        mask = self.mask
+        slot = ((key * _HASH_MULTIPLIER) & _MASK_64) >> 32 & mask
+        while True:
+            slot_key = keys[slot]
+            if slot_key == key:
+                value = self.values[slot]
+                latest_attempt = value & ~KEPT
+                if attempt < latest_attempt or (attempt == latest_attempt and value & KEPT):
+                    return False
+                if value & KEPT:
+                    # An earlier attempt of the run was kept before this one
+                    self.superseded = True
+                self.values[slot] = attempt | KEPT
+                return True
+            if not slot_key:
+                break
+            slot = (slot + 1) & mask
+        keys[slot] = key
+        self.values[slot] = attempt | KEPT
+        self.size += 1
+        if self.size > MAX_LOAD * len(keys):
+            self._grow()
+        return True
+
+    def restart(self):
+        """Forget which runs were kept, but not their latest attempts, to read the runs again."""
+        self.values = array.array('B', bytes(self.values).translate(bytes(i & ~KEPT for i in range(256))))
+        self.overflow = {key: value & ~KEPT for key, value in self.overflow.items()}
+        self.superseded = False
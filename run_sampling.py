@@ -0,0 +1,136 @@
+"""
+run_sampling.py - Sample the pages of workflow runs of large repositories, and estimate the stats with confidence intervals.
+
+Description:
+    Retrieving every page of runs is the largest API cost of a repository with hundreds of thousands of runs. When the
+    `SAMPLE_PRECISION` environment variable is set, `get_workflow_runs.py` only retrieves a sample of the pages, and
+    `evaluate_workflow_runs.py` reports the stats as estimates with confidence intervals.
+
+    `SAMPLE_PRECISION` is the target half-width of the confidence interval of the success rate, as a fraction, e.g.
+    `0.02` for +/- 2 percentage points. The number of runs to sample is the sample size that reaches the target for
+    the least favourable success rate of 50%, corrected for the size of the population:
+
+        n0 = z^2 * 0.25 / precision^2
+        n = n0 / (1 + (n0 - 1) / N)
+
+    where z is the quantile of the normal distribution for the confidence level in `SAMPLE_CONFIDENCE` (default
+    0.95), and N is the number of runs in the date range. The runs are sampled a page at a time:
+
+        - `stratified` (default): The pages are spread over the sub-windows of the date range in proportion to their
+          number of pages, so that every period of the date range is represented.
+        - `random`: The pages are drawn at random from all pages of the date range.
+
+    The pages are drawn with the seed in `SAMPLE_SEED`, if set, so that a sample can be reproduced.
+
+    The confidence intervals of the estimates are:
+
+        - average_duration: The normal interval mean +/- z * s / sqrt(n).
+        - median_duration: The distribution-free interval between the order statistics of rank
+          n/2 -/+ z * sqrt(n) / 2.
+        - success_rate: The normal interval p +/- z * sqrt(p * (1 - p) / n).
+
+    The number of runs of every workflow in the date range is not known from a sample, so the intervals leave out
+    the finite population correction, which makes them slightly wider than needed. The runs of a page are
+    consecutive, so the intervals, which assume that runs are sampled independently, are approximate when runs of
+    the same period are alike.
+"""
+
+import bisect
+import itertools
+import math
+import os
+import random
+import statistics
+
+DEFAULT_CONFIDENCE = 0.95
+SAMPLE_MODES = ['stratified', 'random']
+
+ESTIMATES_COLUMNS = [
+    'sample_size',
+    'average_duration', 'average_duration_low', 'average_duration_high',
+    'median_duration', 'median_duration_low', 'median_duration_high',
+    'success_rate', 'success_rate_low', 'success_rate_high',
+]
+
+
+def sample_precision():
+    """Return the target precision set in the `SAMPLE_PRECISION` environment variable, or None if not sampling."""
+    value = os.getenv('SAMPLE_PRECISION')
+    if not value:
+        return None
+    precision = float(value)
+    if not 0 < precision < 1:
+        raise ValueError(f'Invalid SAMPLE_PRECISION: {value}. It must be a fraction between 0 and 1, e.g. 0.02')
+    return precision
+
+
+def sample_mode():
+    mode = os.getenv('SAMPLE_MODE', 'stratified').strip().lower() or 'stratified'
+    if mode not in SAMPLE_MODES:
+        raise ValueError(f'Invalid SAMPLE_MODE: {mode}. Valid values are: {", ".join(SAMPLE_MODES)}')
+    return mode
+
+
+def z_score(confidence=None):
+    """Return the two-sided quantile of the normal distribution for the confidence level."""
+    if confidence is None:
+        confidence = float(os.getenv('SAMPLE_CONFIDENCE') or DEFAULT_CONFIDENCE)
+    return statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def sample_size(precision, population, confidence=None):
+    """Return the number of runs to sample for the target precision of the success rate."""
+    n0 = z_score(confidence) ** 2 * 0.25 / precision ** 2
+    return min(population, math.ceil(n0 / (1 + (n0 - 1) / population))) if population else 0
+
+
+def sample_pages(page_counts, pages, mode='stratified', rng=None):
+    """Draw pages from strata with page_counts pages each. Returns the sorted (stratum index, page) pairs, from 1."""
+    rng = rng or random.Random(os.getenv('SAMPLE_SEED'))
+    total_pages = sum(page_counts)
+    if pages >= total_pages:
+        return [(i, page) for i, count in enumerate(page_counts) for page in range(1, count + 1)]
+    if mode == 'random':
+        offsets = list(itertools.accumulate(page_counts, initial=0))[:-1]
+        sample = []
+        for index in rng.sample(range(total_pages), pages):
+            # The last stratum that starts at or before the page, which skips the strata without pages
+            stratum = bisect.bisect_right(offsets, index) - 1
+            sample.append((stratum, index - offsets[stratum] + 1))
+        return sorted(sample)
+
+    # Allocate the pages to the strata in proportion to their size, with the largest remainders rounded up
+    shares = [count * pages / total_pages for count in page_counts]
+    allocation = [math.floor(share) for share in shares]
+    by_remainder = sorted(range(len(shares)), key=lambda i: shares[i] - allocation[i], reverse=True)
+    for i in by_remainder[:pages - sum(allocation)]:
+        allocation[i] += 1
+    return sorted((i, page) for i, count in enumerate(allocation)
+                  for page in rng.sample(range(1, page_counts[i] + 1), count))
+
+
+def estimate_row(durations, successes, confidence=None):
+    """Return the estimates of a sample of durations and successes, formatted as the columns of ESTIMATES_COLUMNS."""
+    n = len(durations)
+    if n == 0:
+        return [0] + ['0.00'] * (len(ESTIMATES_COLUMNS) - 1)
+    z = z_score(confidence)
+
+    mean = statistics.mean(durations)
+    mean_error = z * statistics.stdev(durations) / math.sqrt(n) if n > 1 else 0.0
+
+    ordered = sorted(durations)
+    median = statistics.median(ordered)
+    half_width = z * math.sqrt(n) / 2
+    median_low = ordered[max(0, math.floor(n / 2 - half_width))]
+    median_high = ordered[min(n - 1, math.ceil(n / 2 + half_width) - 1)]
+
+    rate = successes / n
+    rate_error = z * math.sqrt(rate * (1 - rate) / n)
+
+    return [
+        n,
+        f'{mean:.2f}', f'{max(0.0, mean - mean_error):.2f}', f'{mean + mean_error:.2f}',
+        f'{median:.2f}', f'{median_low:.2f}', f'{median_high:.2f}',
+        f'{rate * 100:.2f}', f'{max(0.0, rate - rate_error) * 100:.2f}', f'{min(1.0, rate + rate_error) * 100:.2f}',
+    ]
@@ -0,0 +1,97 @@
+"""
+run_timing.py - Retrieve the billable time of workflow runs, with a permanent cache of the completed runs.
+
+Description:
+    The duration of a run is wall-clock time, while the runner minutes of every job of a run are billed, so a run
+    with 20 parallel matrix jobs costs far more than its duration. When the `BILLABLE_TIMING` environment variable is
+    set, `get_workflow_runs.py` retrieves the billable milliseconds of every run on each runner OS from the
+    `/actions/runs/{id}/timing` endpoint, and adds them to the `billable_ms_ubuntu`, `billable_ms_macos` and
+    `billable_ms_windows` fields of the run.
+
+    The endpoint takes one API call per run, so the calls are sent concurrently with `map_concurrently`, and routed
+    to the token with the most remaining quota (see `github_api.py`). The timing of a completed run does not change,
+    so it is kept in a permanent cache, and only the runs that are new since the previous collection cost API calls.
+    The cache is keyed by the run id and attempt, as a re-run of a run changes its timing.
+
+    The cache of every repository is a newline-delimited JSON file, `<owner>/<repo>.ndjson`, in the directory set in
+    the `TIMING_CACHE_DIR` environment variable (`timing-cache` by default), which is kept between collections, e.g.
+    with `actions/cache`. The timing of every run is appended to the cache as soon as it is retrieved, so that the
+    calls of an interrupted collection are not lost. Runs that are not completed are not cached.
+"""
+
+import os
+import threading
+
+import json_backend
+from github_api import gh_api_lines, map_concurrently
+from workflow_stats import BILLABLE_FIELDS, BILLABLE_OSES
+
+DEFAULT_CACHE_DIR = 'timing-cache'
+
+# Query of the billable milliseconds of a run on every runner OS, which is 0 on the OSes the run did not use
+TIMING_JQ = '{' + ', '.join(
+    f'{field}: (.billable.{os_name}.total_ms // 0)' for field, os_name in zip(BILLABLE_FIELDS, BILLABLE_OSES)) + '}'
+
+
+def timing_cache_dir():
+    """Return the directory of the timing caches, as set in the `TIMING_CACHE_DIR` environment variable."""
+    return os.getenv('TIMING_CACHE_DIR') or DEFAULT_CACHE_DIR
+
+
+class TimingCache:
+    """The billable time of the completed runs of a repository, keyed by run id and attempt."""
+
+    def __init__(self, path):
+        self.path = path
+        self.timings = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json_backend.loads(line)
+                    except ValueError:
+                        # A line cut short by an interrupted collection
+                        continue
+                    self.timings[(entry['id'], entry['run_attempt'])] = {field: entry[field] for field in BILLABLE_FIELDS}
+
+    def get(self, run):
+        return self.timings.get((run['id'], run.get('run_attempt')))
+
+    def add(self, run, timing):
+        """Append the timing of a completed run to the cache file."""
+        if run.get('status') != 'completed':
+            return
+        entry = dict(id=run['id'], run_attempt=run.get('run_attempt'), **timing)
+        with self.lock:
+            self.timings[(entry['id'], entry['run_attempt'])] = timing
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            with open(self.path, 'a') as f:
+                f.write(json_backend.dumps(entry) + '\n')
+
+
+def fetch_timing(repo_owner, repo_name, run):
+    """Return the billable milliseconds of a run on every runner OS, as the billable fields of the run."""
+    timing = gh_api_lines(f'repos/{repo_owner}/{repo_name}/actions/runs/{run["id"]}/timing', TIMING_JQ)
+    return timing[0] if timing else dict.fromkeys(BILLABLE_FIELDS, 0)
+
+
+def add_billable_time(repo_owner, repo_name, runs, cache_dir=None):
+    """Add the billable fields to every run, from the timing cache or the API. Returns the number of API calls."""
+    cache = TimingCache(os.path.join(cache_dir or timing_cache_dir(), repo_owner, f'{repo_name}.ndjson'))
+    missing_runs = []
+    for run in runs:
+        timing = cache.get(run)
+        if timing is None:
+            missing_runs.append(run)
+        else:
+            run.update(timing)
+
+    def fetch(run):
+        timing = fetch_timing(repo_owner, repo_name, run)
+        cache.add(run, timing)
+        return timing
+
+    for run, timing in zip(missing_runs, map_concurrently(fetch, missing_runs)):
+        run.update(timing)
+    return len(missing_runs)
@@ -0,0 +1,108 @@
+"""
+This file contains unit tests for the `duration_spill.py` module.
+
+Usage:
+    python -m unittest test_duration_spill.py
+
+Requirements:
+    - Python 3.x
+    - `duration_spill.py` module to test
+
+Description:
+    This script contains unit tests for the `duration_spill.py` module. The tests verify that the radix selection
+    returns the durations of every rank, that the exact mean of streamed durations is the mean of `statistics.mean`,
+    and that the stats of groups with spilled durations, in one shared spill file, are identical to the stats
+    evaluated in memory.
+
+Output:
+    - Test results for the `duration_spill.py` module
+
+Example:
+    python -m unittest test_duration_spill.TestDurationSpill.test_spilled_stats_are_identical
+"""
+
+import unittest
+import os
+import random
+import statistics
+import subprocess
+
+from duration_spill import DurationBudget, exact_mean, select
+from workflow_stats import WorkflowStats
+
+
+class TestDurationSpill(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(3)
+        # Whole and fractional durations, with duplicates, zero and a negative duration from a clock skew
+        self.durations = [generator.randint(0, 5000) for _ in range(3000)]
+        self.durations += [generator.random() * 100 for _ in range(1000)] + [0.0, -1.0, 1e9]
+        generator.shuffle(self.durations)
+
+    def tearDown(self):
+        for file in ['runs.json', 'workflow-stats.csv', 'spill-stats.csv']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_select(self):
+        ordered = sorted(self.durations)
+        for rank in [0, 1, len(ordered) // 2, len(ordered) - 1]:
+            for max_in_memory in [1, 100, len(ordered)]:
+                self.assertEqual(select(lambda: iter(self.durations), len(ordered), rank, max_in_memory), ordered[rank])
+
+    def test_spilled_stats_are_identical(self):
+        for durations in [self.durations, self.durations[:-1]]:
+            budget = DurationBudget(50)
+            spilled_stats = [WorkflowStats(budget), WorkflowStats(budget)]
+            stats = [WorkflowStats(), WorkflowStats()]
+            for i, duration in enumerate(durations):
+                run = {'duration': duration, 'conclusion': 'success' if i % 3 else 'failure'}
+                spilled_stats[i % 7 == 0].add(run)
+                stats[i % 7 == 0].add(run)
+
+            for spilled, in_memory in zip(spilled_stats, stats):
+                self.assertIsNotNone(spilled.spilled)
+                self.assertEqual(spilled.total_runs, in_memory.total_runs)
+                self.assertEqual(spilled.mean(), statistics.mean(in_memory.durations))
+                self.assertEqual(spilled.median(), statistics.median(in_memory.durations))
+                self.assertEqual(spilled.row(), in_memory.row())
+            self.assertLessEqual(budget.in_memory, 50)
+
+    def test_groups_share_one_spill_file(self):
+        budget = DurationBudget(100)
+        spilled_stats = [WorkflowStats(budget) for _ in range(2000)]
+        stats = [WorkflowStats() for _ in range(2000)]
+        for i, duration in enumerate(self.durations * 3):
+            run = {'duration': duration, 'conclusion': 'success'}
+            spilled_stats[i * 7 % 2000].add(run)
+            stats[i * 7 % 2000].add(run)
+
+        spill_files = {id(group.spilled.spill_file) for group in spilled_stats if group.spilled}
+        self.assertEqual(spill_files, {id(budget.spill_file)})
+        self.assertLessEqual(budget.in_memory, 100)
+        self.assertEqual(sum(len(group.durations) for group in spilled_stats), budget.in_memory)
+        for spilled, in_memory in zip(spilled_stats, stats):
+            self.assertEqual(spilled.row(), in_memory.row())
+
+    def test_exact_mean(self):
+        values = [1e16, 1.0, -1e16, 0.1, 3] * 7
+        self.assertEqual(exact_mean(iter(values)), statistics.mean(values))
+        self.assertEqual(exact_mean(iter(self.durations)), statistics.mean(self.durations))
+
+    def test_evaluate_workflow_runs_with_memory_budget(self):
+        with open('runs.json', 'w') as f:
+            f.write('[' + ',\n'.join(
+                f'{{"name": "workflow_{i % 3}", "conclusion": "success", "duration": {duration}}}'
+                for i, duration in enumerate(self.durations)) + ']')
+
+        subprocess.run(['python', 'evaluate_workflow_runs.py'], check=True)
+        os.rename('workflow-stats.csv', 'spill-stats.csv')
+        env = dict(os.environ, EVALUATION_MEMORY_MB='0.001')
+        subprocess.run(['python', 'evaluate_workflow_runs.py'], env=env, check=True)
+
+        with open('workflow-stats.csv', 'r') as f1, open('spill-stats.csv', 'r') as f2:
+            self.assertEqual(f1.read(), f2.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
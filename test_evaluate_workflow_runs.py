@@ -71,10 +71,62 @@ class TestEvaluateWorkflowRuns(unittest.TestCase):
         self.assertIn('workflow_3,25.12,22.00,20.93,43\n', actual_csv_contents)
 
 
+    def test_evaluate_workflow_runs_group_by(self):
+        # Run the evaluate-workflow-runs.py script with additional groupings
+        env = dict(os.environ, GROUP_BY='event;name,run_attempt')
+        subprocess.run(['python', 'evaluate_workflow_runs.py'], env=env)
+
+        # Check the contents of the workflow-stats.csv file are not affected by the groupings
+        with open('workflow-stats.csv', 'r') as f:
+            actual_csv_contents = f.read()
+        self.assertIn('workflow_3,25.12,22.00,20.93,43\n', actual_csv_contents)
+
+        # Check the contents of the CSV file of each grouping
+        with open('workflow-stats-by-event.csv', 'r') as f:
+            actual_csv_contents = f.read()
+        print(actual_csv_contents)
+        self.assertTrue(actual_csv_contents.startswith('event,average_duration,median_duration,success_rate,total_runs\n'))
+        self.assertIn('schedule,12.33,12.00,100.00,3\n', actual_csv_contents)
+        self.assertIn('workflow_dispatch,24.69,20.00,22.22,45\n', actual_csv_contents)
+
+        with open('workflow-stats-by-name-run_attempt.csv', 'r') as f:
+            actual_csv_contents = f.read()
+        print(actual_csv_contents)
+        self.assertTrue(actual_csv_contents.startswith('workflow_name,run_attempt,average_duration,median_duration,success_rate,total_runs\n'))
+        self.assertIn('workflow_3,1,25.46,22.00,21.95,41\n', actual_csv_contents)
+        self.assertIn('workflow_3,2,18.00,18.00,0.00,2\n', actual_csv_contents)
+
+        os.remove('workflow-stats-by-event.csv')
+        os.remove('workflow-stats-by-name-run_attempt.csv')
+
+
+    def test_evaluate_workflow_runs_top_k(self):
+        # Run the evaluate-workflow-runs.py script with the top 2 runs of every workflow
+        env = dict(os.environ, TOP_K='2')
+        subprocess.run(['python', 'evaluate_workflow_runs.py'], env=env)
+
+        with open('workflow-top-runs.csv', 'r') as f:
+            actual_csv_contents = f.read()
+        print(actual_csv_contents)
+        os.remove('workflow-top-runs.csv')
+
+        self.assertTrue(actual_csv_contents.startswith('workflow_name,ranking,rank,url,head_branch,run_number,run_attempt,duration\n'))
+        self.assertIn('workflow_1,slowest,1,https://repo-url/actions/runs/5745695002,main,107,1,13\n', actual_csv_contents)
+        self.assertIn('workflow_1,slowest,2,https://repo-url/actions/runs/5768112009,main,109,1,12\n', actual_csv_contents)
+        self.assertIn('workflow_3,slowest,1,https://repo-url/actions/runs/5741224684,main,31,1,156\n', actual_csv_contents)
+        # Only runs with more than one attempt are retried, and ties are ranked in order of appearance
+        self.assertIn('workflow_3,most_retried,1,https://repo-url/actions/runs/5738698092,main,9,2,20\n', actual_csv_contents)
+        self.assertIn('workflow_3,most_retried,2,https://repo-url/actions/runs/5738681879,main,8,2,16\n', actual_csv_contents)
+        self.assertNotIn('workflow_1,most_retried', actual_csv_contents)
+        self.assertEqual(len(actual_csv_contents.splitlines()), 9)
+
+
     def tearDown(self):
         # Remove the test files
         os.remove('runs.json')
         os.remove('workflow-stats.csv')
+        if os.path.exists('workflow-names.txt'):
+            os.remove('workflow-names.txt')
 
 
     def setUp(self):
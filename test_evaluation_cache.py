@@ -0,0 +1,106 @@
+"""
+This file contains unit tests for the `evaluation_cache.py` module.
+
+Usage:
+    python -m unittest test_evaluation_cache.py
+
+Requirements:
+    - Python 3.x
+    - `evaluation_cache.py` module to test
+
+Description:
+    This script contains unit tests for the `evaluation_cache.py` module. The tests verify that the digest of the same
+    runs is stable across compressed rewrites, that it changes with the runs, the workflow names and the evaluation
+    settings, and that the cached stats files of a repository are restored and replaced.
+
+Output:
+    - Test results for the `evaluation_cache.py` module
+
+Example:
+    python -m unittest test_evaluation_cache.TestEvaluationCache.test_digest_changes
+"""
+
+import unittest
+import os
+import shutil
+import time
+
+from unittest.mock import patch
+
+from evaluation_cache import EVALUATION_SETTINGS, EvaluationCache, runs_digest
+from workflow_runs_io import RunsWriter
+
+WORK_DIR = 'test-evaluation-work'
+CACHE_DIR = 'test-evaluation-cache'
+RUNS_FILE = 'runs.ndjson.gz'
+
+
+def make_run(run_id, conclusion='success'):
+    return {'id': run_id, 'name': 'workflow_1', 'conclusion': conclusion, 'duration': 10.0}
+
+
+class TestEvaluationCache(unittest.TestCase):
+    def setUp(self):
+        os.makedirs(WORK_DIR)
+        # The evaluation settings of the environment are restored after every test
+        environ = patch.dict(os.environ)
+        environ.start()
+        self.addCleanup(environ.stop)
+        for setting in EVALUATION_SETTINGS:
+            os.environ.pop(setting, None)
+
+    def tearDown(self):
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    def write_runs(self, runs):
+        with RunsWriter(os.path.join(WORK_DIR, RUNS_FILE)) as writer:
+            for run in runs:
+                writer.write(run)
+
+    def write_file(self, name, content):
+        with open(os.path.join(WORK_DIR, name), 'w') as f:
+            f.write(content)
+
+    def test_digest_is_stable(self):
+        self.write_runs([make_run(1), make_run(2)])
+        digest = runs_digest(WORK_DIR, RUNS_FILE)
+        # The gzip header of the rewritten file holds another time
+        time.sleep(1)
+        self.write_runs([make_run(1), make_run(2)])
+        self.assertEqual(runs_digest(WORK_DIR, RUNS_FILE), digest)
+
+    def test_digest_changes(self):
+        self.write_runs([make_run(1), make_run(2)])
+        digests = {runs_digest(WORK_DIR, RUNS_FILE)}
+
+        self.write_runs([make_run(1), make_run(2, 'failure')])
+        digests.add(runs_digest(WORK_DIR, RUNS_FILE))
+        self.write_file('workflow-names.txt', 'workflow_1\n')
+        digests.add(runs_digest(WORK_DIR, RUNS_FILE))
+        with patch.dict(os.environ, {'TOP_K': '5'}):
+            digests.add(runs_digest(WORK_DIR, RUNS_FILE))
+        self.assertEqual(len(digests), 4)
+
+    def test_restore_and_replace(self):
+        cache = EvaluationCache(CACHE_DIR)
+        self.assertFalse(cache.restore('myorg', 'web', 'digest-1', WORK_DIR))
+        self.write_file('workflow-stats.csv', 'stats 1')
+        self.write_file('workflow-top-runs.csv', 'top runs 1')
+        cache.store('myorg', 'web', 'digest-1', [os.path.join(WORK_DIR, 'workflow-stats.csv'),
+                                                 os.path.join(WORK_DIR, 'workflow-top-runs.csv')])
+        self.write_file('workflow-stats.csv', 'stats 2')
+        cache.store('myorg', 'web', 'digest-2', [os.path.join(WORK_DIR, 'workflow-stats.csv')])
+        self.assertEqual(os.listdir(os.path.join(CACHE_DIR, 'myorg', 'web')), ['digest-2'])
+
+        shutil.rmtree(WORK_DIR)
+        os.makedirs(WORK_DIR)
+        self.assertFalse(cache.restore('myorg', 'web', 'digest-1', WORK_DIR))
+        self.assertTrue(cache.restore('myorg', 'web', 'digest-2', WORK_DIR))
+        self.assertEqual(os.listdir(WORK_DIR), ['workflow-stats.csv'])
+        with open(os.path.join(WORK_DIR, 'workflow-stats.csv'), 'r') as f:
+            self.assertEqual(f.read(), 'stats 2')
+
+
+if __name__ == '__main__':
+    unittest.main()
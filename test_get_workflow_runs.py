@@ -61,6 +61,9 @@ class TestGetWorkflowRuns(unittest.TestCase):
         # Check that the workflow runs are not empty
         self.assertGreater(len(workflow_runs), 0)
 
+        # Check that no run is retrieved twice from overlapping sub-windows
+        self.assertEqual(len(workflow_runs), len(set((run["id"], run["run_attempt"]) for run in workflow_runs)))
+
         # Check that each workflow run has the expected fields
         for run in workflow_runs:
             self.assertIn("conclusion", run)
@@ -75,6 +78,8 @@ class TestGetWorkflowRuns(unittest.TestCase):
             self.assertIn("status", run)
             self.assertIn("updated_at", run)
             self.assertIn("url", run)
+            self.assertIn("actor", run)
+            self.assertIn("id", run)
             self.assertIn("duration", run)
 
         # Print the workflow runs
@@ -85,6 +90,30 @@ class TestGetWorkflowRuns(unittest.TestCase):
         # Clean up the temporary file
         os.remove("runs.json")
 
+    def test_get_workflow_runs_with_workflow_names_file(self):
+        # Retrieve the runs of every workflow, and pick the workflow with the most runs
+        subprocess.run(["python", "get_workflow_runs.py", self.repo_owner, self.repo_name, self.start_date, self.end_date])
+        with open("runs.json", "r") as f:
+            all_runs = json.load(f)
+        workflow_names = [run["name"] for run in all_runs]
+        selected_name = max(set(workflow_names), key=workflow_names.count)
+
+        # Retrieve the runs of the selected workflow only
+        with open("workflow-names.txt", "w") as f:
+            f.write(f"{selected_name}\n")
+        subprocess.run(["python", "get_workflow_runs.py", self.repo_owner, self.repo_name, self.start_date, self.end_date])
+        with open("runs.json", "r") as f:
+            workflow_runs = json.load(f)
+
+        # Check that only the runs of the selected workflow are retrieved, and none of them are missed
+        self.assertEqual(len(workflow_runs), workflow_names.count(selected_name))
+        for run in workflow_runs:
+            self.assertEqual(run["name"], selected_name)
+
+        # Clean up the temporary files
+        os.remove("runs.json")
+        os.remove("workflow-names.txt")
+
     def test_get_workflow_runs_with_invalid_dates(self):
         # Run the script to retrieve workflow runs with invalid dates
         subprocess.run(["python", "get_workflow_runs.py", self.repo_owner, self.repo_name, self.invalid_start_date, self.invalid_end_date])
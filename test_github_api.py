@@ -0,0 +1,95 @@
+"""
+This file contains unit tests for the `github_api.py` module.
+
+Usage:
+    python -m unittest test_github_api.py
+
+Requirements:
+    - Python 3.x
+    - `github_api.py` module to test
+
+Description:
+    This script contains unit tests for the helpers of the `github_api.py` module that do not send requests to the
+    GitHub API. The tests verify the date filter of workflow runs endpoints, the splitting of date windows, and the
+    routing of requests in a token pool.
+
+Output:
+    - Test results for the `github_api.py` module
+
+Example:
+    python -m unittest test_github_api.TestGitHubApi.test_split_window
+"""
+
+import unittest
+import os
+
+from datetime import datetime
+
+from github_api import created_filter, environment_tokens, split_window, TokenPool, QUOTA_RESERVE
+
+
+class FixedQuotaTokenPool(TokenPool):
+    """A token pool with fixed quotas, which does not read them from the GitHub API."""
+
+    def __init__(self, quotas):
+        self.quotas = quotas
+        super().__init__(list(quotas))
+
+    def refresh(self, token):
+        with self.lock:
+            self.remaining[token] = self.quotas[token]
+            self.reset[token] = 0
+            self.calls[token] = 0
+
+
+class TestGitHubApi(unittest.TestCase):
+    def test_created_filter(self):
+        self.assertEqual(created_filter(datetime(2023, 7, 1), datetime(2023, 7, 31, 12, 30)),
+                         'created=2023-07-01T00:00:00Z..2023-07-31T12:30:00Z')
+
+    def test_split_window(self):
+        start = datetime(2023, 7, 1)
+        end = datetime(2023, 7, 5)
+        windows = split_window(start, end, 3200, 800)
+
+        # The sub-windows cover the window most recent first, and share their boundaries
+        self.assertEqual(len(windows), 4)
+        self.assertEqual(windows[0], (datetime(2023, 7, 4), end))
+        self.assertEqual(windows[-1], (start, datetime(2023, 7, 2)))
+        for newer, older in zip(windows, windows[1:]):
+            self.assertEqual(newer[0], older[1])
+
+    def test_split_window_below_limit(self):
+        start = datetime(2023, 7, 1)
+        end = datetime(2023, 7, 5)
+        self.assertEqual(split_window(start, end, 10, 800), [(start, end)])
+
+    def test_environment_tokens(self):
+        os.environ['GH_TOKENS'] = 'token_1, token_2\ntoken_3'
+        os.environ['GH_TOKEN'] = 'token_1'
+        try:
+            self.assertEqual(environment_tokens(), ['token_1', 'token_2', 'token_3'])
+        finally:
+            del os.environ['GH_TOKENS']
+            del os.environ['GH_TOKEN']
+
+    def test_token_pool_routes_to_most_remaining_quota(self):
+        pool = FixedQuotaTokenPool({'token_1': 100, 'token_2': 103})
+
+        # Requests alternate between the tokens once their remaining quota is even
+        tokens = [pool.acquire() for _ in range(7)]
+        self.assertEqual(tokens[:3], ['token_2', 'token_2', 'token_2'])
+        self.assertEqual(sorted(tokens[3:5]), ['token_1', 'token_2'])
+        self.assertEqual(pool.total_remaining(), 196)
+
+    def test_token_pool_skips_exhausted_token(self):
+        pool = FixedQuotaTokenPool({'token_1': 5000, 'token_2': 100})
+        pool.exhaust('token_1')
+
+        self.assertEqual(pool.acquire(), 'token_2')
+        self.assertEqual(pool.remaining['token_2'], 99)
+        self.assertGreater(pool.remaining['token_2'], QUOTA_RESERVE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+This file contains unit tests for the `json_backend.py` module.
+
+Usage:
+    python -m unittest test_json_backend.py
+
+Requirements:
+    - Python 3.x
+    - `json_backend.py` module to test
+
+Description:
+    This script contains unit tests for the `json_backend.py` module. The tests verify that every installed backend
+    parses and serialises workflow runs in the same way, and that an invalid `JSON_BACKEND` is rejected.
+
+Output:
+    - Test results for the `json_backend.py` module
+
+Example:
+    python -m unittest test_json_backend.TestJsonBackend.test_backends_are_equivalent
+"""
+
+import unittest
+import importlib
+import json
+import os
+
+import json_backend
+
+RUN = {
+    "conclusion": "success",
+    "display_title": "Fix été \"quotes\"",
+    "name": "workflow_1",
+    "run_attempt": 1,
+    "head_branch": None,
+    "duration": 12.5
+}
+
+
+class TestJsonBackend(unittest.TestCase):
+    def select(self, name):
+        os.environ['JSON_BACKEND'] = name
+        json_backend._backend = None
+        return json_backend.backend()[0]
+
+    def test_backends_are_equivalent(self):
+        for name in json_backend.BACKENDS:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                continue
+            self.assertEqual(self.select(name), name)
+            text = json_backend.dumps(RUN)
+            self.assertEqual(json.loads(text), RUN)
+            self.assertEqual(json_backend.loads(json.dumps(RUN)), RUN)
+            self.assertEqual(json_backend.loads(json.dumps(RUN).encode('utf-8')), RUN)
+
+    def test_auto_backend_falls_back_to_json(self):
+        self.assertIn(self.select('auto'), json_backend.BACKENDS)
+
+    def test_invalid_backend(self):
+        os.environ['JSON_BACKEND'] = 'yaml'
+        json_backend._backend = None
+        with self.assertRaises(ValueError):
+            json_backend.backend()
+
+    def tearDown(self):
+        os.environ.pop('JSON_BACKEND', None)
+        json_backend._backend = None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+This file contains unit tests for the `org_plan.py` module.
+
+Usage:
+    python -m unittest test_org_plan.py
+
+Requirements:
+    - Python 3.x
+    - `org_plan.py` module to test
+
+Description:
+    This script contains unit tests for the helpers of the `org_plan.py` module that do not send requests to the
+    GitHub API. The tests verify the estimated API calls of a repository, the estimated duration of plans fetched
+    concurrently, and that plans are fitted to a budget.
+
+Output:
+    - Test results for the `org_plan.py` module
+
+Example:
+    python -m unittest test_org_plan.TestOrgPlan.test_apply_budget_trim
+"""
+
+import unittest
+
+from org_plan import apply_budget, estimate_api_calls, schedule_seconds
+
+
+def make_plan(repo, api_calls, seconds):
+    return {'owner_name': 'org', 'repository_name': repo, 'total_runs': api_calls * 100, 'api_calls': api_calls, 'seconds': seconds}
+
+
+class TestOrgPlan(unittest.TestCase):
+    def setUp(self):
+        # Plans are scheduled largest first
+        self.plans = [make_plan('repo_1', 50, 500), make_plan('repo_2', 30, 300), make_plan('repo_3', 10, 100)]
+
+    def test_estimate_api_calls(self):
+        # Only the probe for an endpoint without runs
+        self.assertEqual(estimate_api_calls(0), 1)
+        self.assertEqual(estimate_api_calls(250), 4)
+        # A probe and a partial page for every sub-window of a large repository
+        self.assertEqual(estimate_api_calls(4000), 1 + 40 + 2 * 5)
+
+    def test_apply_budget_within_budget(self):
+        self.assertEqual(apply_budget(self.plans, api_budget=90, time_budget=900), self.plans)
+
+    def test_apply_budget_refuse(self):
+        with self.assertRaises(ValueError):
+            apply_budget(self.plans, api_budget=80, policy='refuse')
+
+    def test_apply_budget_trim(self):
+        kept = apply_budget(self.plans, api_budget=70, policy='trim')
+        self.assertEqual([plan['repository_name'] for plan in kept], ['repo_1', 'repo_3'])
+
+        kept = apply_budget(self.plans, time_budget=450, policy='trim')
+        self.assertEqual([plan['repository_name'] for plan in kept], ['repo_2', 'repo_3'])
+
+    def test_schedule_seconds(self):
+        self.assertEqual(schedule_seconds(self.plans), 900)
+        # repo_3 starts when repo_2 is done, while repo_1 is still fetched
+        self.assertEqual(schedule_seconds(self.plans, concurrency=2), 500)
+        self.assertEqual(schedule_seconds(self.plans, concurrency=5), 500)
+        self.assertEqual(schedule_seconds([], concurrency=2), 0)
+
+    def test_apply_budget_concurrency(self):
+        with self.assertRaises(ValueError):
+            apply_budget(self.plans, time_budget=550, policy='refuse')
+        self.assertEqual(apply_budget(self.plans, time_budget=550, policy='refuse', concurrency=2), self.plans)
+
+        kept = apply_budget(self.plans, time_budget=350, policy='trim', concurrency=2)
+        self.assertEqual([plan['repository_name'] for plan in kept], ['repo_2', 'repo_3'])
+
+    def test_apply_budget_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            apply_budget(self.plans, api_budget=10, policy='ignore')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+This file contains unit tests for the `org_shards.py` script.
+
+Usage:
+    python -m unittest test_org_shards.py
+
+Requirements:
+    - Python 3.x
+    - `org_shards.py` script to test
+
+Description:
+    This script contains unit tests for the `org_shards.py` script. The tests verify that repositories are assigned
+    to shards deterministically and evenly, and that the output files of every shard are merged into valid org
+    output files.
+
+Output:
+    - Test results for the `org_shards.py` script
+
+Example:
+    python -m unittest test_org_shards.TestOrgShards.test_merge_shards
+"""
+
+import unittest
+import json
+import subprocess
+import os
+
+from org_shards import shard_of, shard_file
+
+
+class TestOrgShards(unittest.TestCase):
+    def test_shard_of_is_deterministic_and_balanced(self):
+        repo_names = [f'repo-{i}' for i in range(1000)]
+        shards = [shard_of(repo, 4) for repo in repo_names]
+
+        # The shard of a repository must not change between runs or runners
+        self.assertEqual(shards, [shard_of(repo, 4) for repo in repo_names])
+        for i in range(4):
+            self.assertGreater(shards.count(i), 200)
+            self.assertLess(shards.count(i), 300)
+
+    def test_shard_file(self):
+        self.assertEqual(shard_file('org-runs.json', 2), 'org-runs-shard-2.json')
+        self.assertEqual(shard_file('org-workflow-stats-by-event.csv', 0), 'org-workflow-stats-by-event-shard-0.csv')
+
+    def test_merge_shards(self):
+        shard_runs = [
+            [{'name': 'workflow_1', 'repository_name': 'repo_1'}, {'name': 'workflow_2', 'repository_name': 'repo_1'}],
+            [],
+            [{'name': 'workflow_1', 'repository_name': 'repo_2'}],
+        ]
+        for i, runs in enumerate(shard_runs):
+            # Write the shard files in the same layout as workflow_metrics.py
+            with open(f'org-runs-shard-{i}.json', 'w') as f:
+                f.write('[')
+                for j, record in enumerate(runs):
+                    f.write(',\n' if j else '\n')
+                    json.dump(record, f)
+                f.write('\n]\n')
+            with open(f'org-workflow-stats-shard-{i}.csv', 'w') as f:
+                f.write('repository_name,workflow_name,average_duration,median_duration,success_rate,total_runs\n')
+                for record in runs:
+                    f.write(f'{record["repository_name"]},{record["name"]},1.00,1.00,100.00,1\n')
+        with open('org-workflow-stats-by-event-shard-2.csv', 'w') as f:
+            f.write('repository_name,event,average_duration,median_duration,success_rate,total_runs\n')
+            f.write('repo_2,push,1.00,1.00,100.00,1\n')
+
+        subprocess.run(['python', 'org_shards.py', 'merge', '3'], check=True)
+
+        with open('org-runs.json', 'r') as f:
+            runs = json.load(f)
+        self.assertEqual(runs, shard_runs[0] + shard_runs[2])
+
+        with open('org-workflow-stats.csv', 'r') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[0].startswith('repository_name,workflow_name'))
+        self.assertEqual(lines[3], 'repo_2,workflow_1,1.00,1.00,100.00,1')
+
+        with open('org-workflow-stats-by-event.csv', 'r') as f:
+            self.assertEqual(f.read().splitlines()[1], 'repo_2,push,1.00,1.00,100.00,1')
+
+    def test_merge_shards_with_missing_shard(self):
+        result = subprocess.run(['python', 'org_shards.py', 'merge', '2'], capture_output=True, text=True)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('Missing shard files', result.stderr)
+        self.assertFalse(os.path.exists('org-runs.json'))
+
+    def tearDown(self):
+        for file in os.listdir('.'):
+            if file.startswith('org-') and (file.endswith('.json') or file.endswith('.csv')):
+                os.remove(file)
+
+
+if __name__ == '__main__':
+    unittest.main()
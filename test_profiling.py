@@ -0,0 +1,98 @@
+"""
+This file contains unit tests for the `profiling.py` module.
+
+Usage:
+    python -m unittest test_profiling.py
+
+Requirements:
+    - Python 3.x
+    - `profiling.py` module to test
+
+Description:
+    This script contains unit tests for the `profiling.py` module. The tests verify that a profiled stage writes its
+    pstats, summary and allocations files, that the functions of its threads are profiled, and that the sampling mode
+    writes folded stacks.
+
+Output:
+    - Test results for the `profiling.py` module
+
+Example:
+    python -m unittest test_profiling.TestProfiling.test_profile_threads
+"""
+
+import unittest
+import glob
+import json
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+
+PROFILE_DIR = 'test-profile'
+
+THREADED_SCRIPT = '''
+import threading
+from profiling import start_profiling
+start_profiling('threaded')
+
+def count_in_thread():
+    return sum(range(100000))
+
+thread = threading.Thread(target=count_in_thread)
+thread.start()
+thread.join()
+'''
+
+
+class TestProfiling(unittest.TestCase):
+    def setUp(self):
+        with open('runs.json', 'w') as f:
+            json.dump([{'name': 'workflow_1', 'conclusion': 'success', 'duration': 10}], f)
+
+    def tearDown(self):
+        shutil.rmtree(PROFILE_DIR, ignore_errors=True)
+        for file in ['runs.json', 'workflow-stats.csv']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def run_profiled(self, args, **env):
+        subprocess.run(args, env=dict(os.environ, PROFILE_DIR=PROFILE_DIR, **env), check=True,
+                       stdout=subprocess.DEVNULL)
+
+    def test_profile_stage(self):
+        self.run_profiled(['python', 'evaluate_workflow_runs.py'], PROFILE='1')
+
+        pstats_files = glob.glob(os.path.join(PROFILE_DIR, 'evaluate_workflow_runs-*.pstats'))
+        self.assertEqual(len(pstats_files), 1)
+        functions = pstats.Stats(pstats_files[0]).stats
+        self.assertIn('row', [name for (file_name, _, name) in functions if file_name.endswith('workflow_stats.py')])
+
+        base_path = pstats_files[0][:-len('.pstats')]
+        with open(f'{base_path}.txt', 'r') as f:
+            self.assertIn('Ordered by: cumulative time', f.read())
+        with open(f'{base_path}.allocations.txt', 'r') as f:
+            self.assertTrue(f.read().startswith('Peak traced memory: '))
+
+    def test_profile_threads(self):
+        self.run_profiled([sys.executable, '-c', THREADED_SCRIPT], PROFILE='1')
+
+        functions = pstats.Stats(glob.glob(os.path.join(PROFILE_DIR, 'threaded-*.pstats'))[0]).stats
+        self.assertIn('count_in_thread', [name for (_, _, name) in functions])
+
+    def test_sample_stage(self):
+        self.run_profiled(['python', 'evaluate_workflow_runs.py'], PROFILE='sample', PROFILE_INTERVAL='0.001')
+
+        folded_files = glob.glob(os.path.join(PROFILE_DIR, 'evaluate_workflow_runs-*.folded'))
+        self.assertEqual(len(folded_files), 1)
+        with open(folded_files[0], 'r') as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('MainThread;'))
+            self.assertGreater(int(count), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
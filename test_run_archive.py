@@ -0,0 +1,143 @@
+"""
+This file contains unit tests for the `run_archive.py` module.
+
+Usage:
+    python -m unittest test_run_archive.py
+
+Requirements:
+    - Python 3.x
+    - `run_archive.py` module to test
+
+Description:
+    This script contains unit tests for the `run_archive.py` module. The tests verify that runs are written into the
+    partitions of their repository and month with a manifest, that archiving runs again replaces them, that only the
+    partitions of a date range and of the matching repositories are selected, that runs without a start time are
+    read by their creation time, that repository filters match the runs of a single org without their owner, and
+    that `evaluate_workflow_runs.py` evaluates the runs of an archive and of the runs files of orgs with the same
+    filters, and refuses to filter the runs of a single repository by repository.
+
+Output:
+    - Test results for the `run_archive.py` module
+
+Example:
+    python -m unittest test_run_archive.TestRunArchive.test_select_partitions
+"""
+
+import unittest
+import json
+import os
+import shutil
+import subprocess
+
+from run_archive import archive_runs, iter_archive_runs, load_manifest, matches_repository, select_partitions
+
+ARCHIVE_DIR = 'test-archive'
+
+
+def make_run(run_id, month, day, run_attempt=1, conclusion='success', duration=10):
+    return {'id': run_id, 'run_attempt': run_attempt, 'name': 'workflow_1', 'conclusion': conclusion,
+            'duration': float(duration), 'run_started_at': f'2023-{month:02d}-{day:02d}T10:00:00Z'}
+
+
+class TestRunArchive(unittest.TestCase):
+    def setUp(self):
+        # Three months of runs of two repositories
+        self.runs = {
+            repo: [make_run(1000 * index + month * 100 + day, month, day, duration=index * 10 + day)
+                   for month in [7, 8, 9] for day in [1, 15, 31 if month != 9 else 30]]
+            for index, repo in enumerate(['web-app', 'api'], 1)
+        }
+        for repo, runs in self.runs.items():
+            archive_runs(ARCHIVE_DIR, 'myorg', repo, runs)
+
+    def tearDown(self):
+        shutil.rmtree(ARCHIVE_DIR, ignore_errors=True)
+        for file in ['workflow-stats.csv', 'runs.json', 'org-runs.json']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_partitions_and_manifest(self):
+        repo_dir = os.path.join(ARCHIVE_DIR, 'myorg', 'api')
+        self.assertEqual(sorted(os.listdir(repo_dir)),
+                         ['2023-07.ndjson.gz', '2023-08.ndjson.gz', '2023-09.ndjson.gz', 'manifest.json'])
+        self.assertEqual(load_manifest(repo_dir)['partitions']['2023-08'], {
+            'file': '2023-08.ndjson.gz',
+            'runs': 3,
+            'min_run_started_at': '2023-08-01T10:00:00Z',
+            'max_run_started_at': '2023-08-31T10:00:00Z',
+        })
+
+    def test_archive_again_replaces_runs(self):
+        archive_runs(ARCHIVE_DIR, 'myorg', 'api', [make_run(2815, 8, 15, conclusion='failure'),
+                                                   make_run(2815, 8, 15, run_attempt=2), make_run(2816, 8, 16)])
+        partitions, _ = select_partitions(ARCHIVE_DIR, '2023-08', '2023-08', ['api'])
+        runs = list(iter_archive_runs(partitions))
+        self.assertEqual([(run['id'], run['run_attempt']) for run in runs],
+                         [(2831, 1), (2816, 1), (2815, 1), (2815, 2), (2801, 1)])
+        self.assertEqual(runs[2]['conclusion'], 'failure')
+        self.assertEqual(load_manifest(os.path.join(ARCHIVE_DIR, 'myorg', 'api'))['partitions']['2023-08']['runs'], 5)
+
+    def test_select_partitions(self):
+        partitions, total = select_partitions(ARCHIVE_DIR)
+        self.assertEqual((len(partitions), total), (6, 6))
+
+        partitions, total = select_partitions(ARCHIVE_DIR, '2023-08-10', '2023-09-01', ['myorg/web-*'])
+        self.assertEqual([os.path.basename(path) for _, repo, path, _ in partitions],
+                         ['2023-09.ndjson.gz', '2023-08.ndjson.gz'])
+        self.assertEqual(total, 3)
+        runs = list(iter_archive_runs(partitions, '2023-08-10', '2023-09-01'))
+        self.assertEqual([run['id'] for run in runs], [1901, 1831, 1815])
+        self.assertEqual({(run['owner_name'], run['repository_name']) for run in runs}, {('myorg', 'web-app')})
+
+        # A partition within the range is read in full
+        partitions, _ = select_partitions(ARCHIVE_DIR, '2023-07', '2023-07-31', ['api'])
+        self.assertEqual(len(list(iter_archive_runs(partitions, '2023-07', '2023-07-31'))), 3)
+
+    def test_runs_without_start_time_are_read_in_range(self):
+        queued = {'id': 2899, 'run_attempt': 1, 'name': 'workflow_1', 'conclusion': None, 'duration': 0.0,
+                  'run_started_at': None, 'created_at': '2023-08-20T10:00:00Z'}
+        archive_runs(ARCHIVE_DIR, 'myorg', 'api', [queued])
+        partitions, _ = select_partitions(ARCHIVE_DIR, '2023-08-10', '2023-08-25', ['api'])
+        self.assertEqual([run['id'] for run in iter_archive_runs(partitions, '2023-08-10', '2023-08-25')], [2899, 2815])
+        self.assertEqual(load_manifest(os.path.join(ARCHIVE_DIR, 'myorg', 'api'))['partitions']['2023-08']
+                         ['max_run_started_at'], '2023-08-31T10:00:00Z')
+
+    def test_evaluate_workflow_runs_archive(self):
+        subprocess.run(['python', 'evaluate_workflow_runs.py', ARCHIVE_DIR, '--since', '2023-08-01', '--until',
+                        '2023-08-31', '--repository', 'web-app'], check=True)
+        with open('workflow-stats.csv', 'r') as f:
+            self.assertEqual(f.read().splitlines()[1], 'workflow_1,25.67,25.00,100.00,3')
+
+
+    def test_matches_repository(self):
+        self.assertTrue(matches_repository('myorg', 'web-app', ['myorg/web-*']))
+        self.assertFalse(matches_repository('other', 'web-app', ['myorg/web-*']))
+        self.assertTrue(matches_repository('other', 'web-app', ['api', 'web-app']))
+        # The runs of a single org are matched by the repo part of the filter
+        self.assertTrue(matches_repository(None, 'web-app', ['myorg/web-*']))
+        self.assertFalse(matches_repository(None, 'api', ['myorg/web-*']))
+        self.assertTrue(matches_repository(None, None, None))
+        with self.assertRaises(ValueError):
+            matches_repository(None, None, ['web-app'])
+
+    def test_evaluate_workflow_runs_org_runs_file(self):
+        # The org runs file of a single org, which does not hold the owner of the runs
+        with open('org-runs.json', 'w') as f:
+            json.dump([dict(run, repository_name=repo) for repo, runs in self.runs.items() for run in runs], f)
+        subprocess.run(['python', 'evaluate_workflow_runs.py', 'org-runs.json', '--since', '2023-08-01', '--until',
+                        '2023-08-31', '--repository', 'myorg/web-*'], check=True)
+        with open('workflow-stats.csv', 'r') as f:
+            self.assertEqual(f.read().splitlines()[1], 'workflow_1,25.67,25.00,100.00,3')
+
+    def test_evaluate_workflow_runs_runs_file(self):
+        # The runs of a single repository do not hold their repository
+        with open('runs.json', 'w') as f:
+            json.dump(self.runs['api'], f)
+        result = subprocess.run(['python', 'evaluate_workflow_runs.py', 'runs.json', '--repository', 'api'],
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('Error: --repository cannot filter runs.json', result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
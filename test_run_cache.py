@@ -0,0 +1,97 @@
+"""
+This file contains unit tests for the `run_cache.py` module.
+
+Usage:
+    python -m unittest test_run_cache.py
+
+Requirements:
+    - Python 3.x
+    - `run_cache.py` module to test
+
+Description:
+    This script contains unit tests for the `run_cache.py` module. The tests verify that the runs read from a run
+    cache are the runs of the runs file it was built from, including missing values and non-ASCII strings, and that
+    `evaluate_workflow_runs.py` evaluates a run cache in the same way as its runs file.
+
+Output:
+    - Test results for the `run_cache.py` module
+
+Example:
+    python -m unittest test_run_cache.TestRunCache.test_build_and_read_cache
+"""
+
+import unittest
+import json
+import os
+import subprocess
+
+from run_cache import build_cache
+from workflow_runs_io import iter_runs
+
+
+def make_run(i, name, conclusion, duration, head_branch='main'):
+    return {
+        "conclusion": conclusion,
+        "created_at": "2023-08-01T10:00:00Z",
+        "display_title": f"Fix été {i}",
+        "event": "push",
+        "head_branch": head_branch,
+        "name": name,
+        "run_attempt": 1 + i % 2,
+        "run_number": i,
+        "run_started_at": "2023-08-01T10:00:00Z",
+        "status": "completed",
+        "updated_at": "2023-08-01T10:01:00Z",
+        "url": f"https://repo-url/actions/runs/{i}",
+        "actor": "octocat",
+        "id": 1000 + i,
+        "duration": float(duration)
+    }
+
+
+class TestRunCache(unittest.TestCase):
+    def setUp(self):
+        self.runs = [
+            make_run(1, 'workflow_1', 'success', 12),
+            make_run(2, 'workflow_1', 'success', 13, head_branch=None),
+            make_run(3, 'workflow_2', None, 21, head_branch=''),
+            make_run(4, 'workflow_2', 'success', 10),
+            make_run(5, 'workflow_3', 'failure', 30),
+        ]
+        with open('runs.json', 'w') as f:
+            json.dump(self.runs, f)
+
+    def tearDown(self):
+        for file in ['runs.json', 'runs.runcache', 'workflow-stats.csv', 'workflow-stats-by-head_branch.csv',
+                     'cache-stats.csv', 'cache-stats-by-head_branch.csv']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_build_and_read_cache(self):
+        self.assertEqual(build_cache('runs.json', 'runs.runcache'), 5)
+
+        self.assertEqual(list(iter_runs('runs.runcache')), [
+            dict(run, owner_name=None, repository_name=None, billable_ms_ubuntu=None, billable_ms_macos=None,
+                 billable_ms_windows=None, head_sha=None) for run in self.runs
+        ])
+        self.assertEqual(list(iter_runs('runs.runcache', {'name', 'head_branch'})), [
+            {'name': run['name'], 'head_branch': run['head_branch']} for run in self.runs
+        ])
+
+    def test_evaluate_workflow_runs_with_cache(self):
+        build_cache('runs.json', 'runs.runcache')
+        env = dict(os.environ, GROUP_BY='head_branch')
+
+        subprocess.run(['python', 'evaluate_workflow_runs.py', 'runs.runcache'], env=env, check=True)
+        os.rename('workflow-stats.csv', 'cache-stats.csv')
+        os.rename('workflow-stats-by-head_branch.csv', 'cache-stats-by-head_branch.csv')
+        subprocess.run(['python', 'evaluate_workflow_runs.py', 'runs.json'], env=env, check=True)
+
+        for expected_file, actual_file in [('workflow-stats.csv', 'cache-stats.csv'),
+                                           ('workflow-stats-by-head_branch.csv', 'cache-stats-by-head_branch.csv')]:
+            with open(expected_file, 'r') as f1, open(actual_file, 'r') as f2:
+                self.assertEqual(f2.read(), f1.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+This file contains unit tests for the `run_concurrency.py` module.
+
+Usage:
+    python -m unittest test_run_concurrency.py
+
+Requirements:
+    - Python 3.x
+    - `run_concurrency.py` module to test
+
+Description:
+    This script contains unit tests for the `run_concurrency.py` module. The tests verify that the sweep over the
+    events of the runs gives the same peak, seconds per concurrency level and time series as counting the runs of every
+    second, that runs which start when others end do not overlap them, and that `evaluate_workflow_runs.py` writes the
+    concurrency files.
+
+Output:
+    - Test results for the `run_concurrency.py` module
+
+Example:
+    python -m unittest test_run_concurrency.TestRunConcurrency.test_sweep_matches_every_second
+"""
+
+import unittest
+import csv
+import json
+import os
+import random
+import subprocess
+
+from run_concurrency import ALL_RUNS, ConcurrencyTimeline, format_time
+from workflow_stats import parse_timestamp
+
+START = 1689984000
+
+
+def make_run(name, start, end):
+    return {'name': name, 'conclusion': 'success', 'duration': float(end - start),
+            'run_started_at': format_time(start), 'updated_at': format_time(end)}
+
+
+def seconds(timestamp):
+    return int(parse_timestamp(timestamp).timestamp())
+
+
+def read_rows(file):
+    with open(file, 'r') as f:
+        return list(csv.DictReader(f))
+
+
+class TestRunConcurrency(unittest.TestCase):
+    def tearDown(self):
+        for file in ['runs.json', 'workflow-stats.csv', 'workflow-concurrency.csv', 'workflow-concurrency-levels.csv',
+                     'workflow-concurrency-timeline.csv']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_sweep_matches_every_second(self):
+        generator = random.Random(3)
+        runs = []
+        for _ in range(300):
+            start = START + generator.randint(0, 5000)
+            runs.append(make_run(f'workflow_{generator.randint(1, 3)}', start, start + generator.randint(1, 600)))
+        # Runs that start and end on the boundaries of the intervals
+        for _ in range(100):
+            start = START + generator.randint(0, 50) * 100
+            runs.append(make_run(f'workflow_{generator.randint(1, 3)}', start, start + generator.randint(1, 6) * 100))
+        timeline = ConcurrencyTimeline()
+        for run in runs:
+            timeline.add(run)
+        sweeps = timeline.sweeps(100)
+
+        for name, sweep in sweeps.items():
+            intervals = [(seconds(run['run_started_at']), seconds(run['updated_at']))
+                         for run in runs if name in [ALL_RUNS, run['name']]]
+            first, last = min(start for start, _ in intervals), max(end for _, end in intervals)
+            levels = [0] * (last - first)
+            for start, end in intervals:
+                for second in range(start, end):
+                    levels[second - first] += 1
+
+            self.assertEqual(sweep.peak, max(levels))
+            self.assertEqual(sweep.peak_at, first + levels.index(max(levels)))
+            self.assertEqual(sweep.level_seconds, {level: levels.count(level) for level in set(levels)})
+            self.assertEqual(sweep.series[0][0], first - first % 100)
+            for interval_start, maximum, average in sweep.series:
+                interval_levels = levels[max(0, interval_start - first):interval_start + 100 - first]
+                self.assertEqual(maximum, max(interval_levels, default=0))
+                self.assertAlmostEqual(average, sum(interval_levels) / 100)
+
+    def test_touching_runs_do_not_overlap(self):
+        timeline = ConcurrencyTimeline()
+        for start in range(START, START + 300, 60):
+            timeline.add(make_run('workflow_1', start, start + 60))
+        sweep = timeline.sweeps(3600)['workflow_1']
+        self.assertEqual(sweep.peak, 1)
+        self.assertEqual(sweep.level_seconds, {1: 300})
+        self.assertEqual(sweep.summary_row(5)[1:], [1, format_time(START), '1.00', 300])
+
+    def test_run_ending_on_interval_boundary(self):
+        timeline = ConcurrencyTimeline()
+        timeline.add(make_run('workflow_1', START + 1800, START + 3600))
+        timeline.add(make_run('workflow_1', START + 3 * 3600 + 600, START + 3 * 3600 + 700))
+        sweep = timeline.sweeps(3600)['workflow_1']
+        self.assertEqual(sweep.timeline_rows(), [[format_time(START), 1, '0.50'],
+                                                 [format_time(START + 3600), 0, '0.00'],
+                                                 [format_time(START + 2 * 3600), 0, '0.00'],
+                                                 [format_time(START + 3 * 3600), 1, '0.03']])
+
+    def test_evaluate_workflow_runs_concurrency(self):
+        runs = [make_run('workflow_1', START, START + 600), make_run('workflow_1', START + 300, START + 900),
+                make_run('workflow_2', START + 400, START + 500), {'name': 'workflow_2', 'conclusion': 'failure',
+                                                                   'duration': 0.0}]
+        with open('runs.json', 'w') as f:
+            json.dump(runs, f)
+        subprocess.run(['python', 'evaluate_workflow_runs.py'],
+                       env=dict(os.environ, CONCURRENCY_TIMELINE='true', CONCURRENCY_INTERVAL='600'), check=True)
+
+        rows = {row['workflow_name']: row for row in read_rows('workflow-concurrency.csv')}
+        self.assertEqual(list(rows), ['workflow_1', 'workflow_2', ALL_RUNS])
+        self.assertEqual([rows[name]['peak_concurrency'] for name in rows], ['2', '1', '3'])
+        self.assertEqual(rows[ALL_RUNS]['peak_at'], format_time(START + 400))
+        self.assertEqual(rows['workflow_2']['runs'], '1')
+        levels = [(row['concurrency'], row['seconds']) for row in read_rows('workflow-concurrency-levels.csv')
+                  if row['workflow_name'] == ALL_RUNS]
+        self.assertEqual(levels, [('1', '600'), ('2', '200'), ('3', '100')])
+        timeline = [row for row in read_rows('workflow-concurrency-timeline.csv') if row['workflow_name'] == ALL_RUNS]
+        self.assertEqual([row['max_concurrency'] for row in timeline], ['3', '1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""
+This file contains unit tests for the `run_dedup.py` module.
+
+Usage:
+    python -m unittest test_run_dedup.py
+
+Requirements:
+    - Python 3.x
+    - `run_dedup.py` module to test
+
+Description:
+    This script contains unit tests for the `run_dedup.py` module. The tests verify that duplicate runs are skipped,
+    that only the latest attempt of every run is kept whatever the order of its attempts, that every attempt is kept
+    once with the `all` policy, and that `evaluate_workflow_runs.py` counts every run once.
+
+Output:
+    - Test results for the `run_dedup.py` module
+
+Example:
+    python -m unittest test_run_dedup.TestRunDedup.test_latest_attempt_after_earlier_attempt
+"""
+
+import unittest
+import json
+import os
+import subprocess
+
+from run_dedup import ALL, LATEST, RunIndex
+
+
+def make_run(run_id, run_attempt=1, repository_name='repo', conclusion='success', duration=10):
+    return {'id': run_id, 'run_attempt': run_attempt, 'repository_name': repository_name, 'name': 'workflow_1',
+            'conclusion': conclusion, 'duration': duration}
+
+
+def dedup(runs, policy=LATEST, capacity=16):
+    """Return the runs kept by a RunIndex, reading them again if an attempt was superseded."""
+    index = RunIndex(policy, capacity)
+    kept_runs = [run for run in runs if index.keep(run)]
+    if index.superseded:
+        index.restart()
+        kept_runs = [run for run in runs if index.keep(run)]
+        assert not index.superseded
+    return kept_runs
+
+
+class TestRunDedup(unittest.TestCase):
+    def tearDown(self):
+        for file in ['runs.json', 'workflow-stats.csv']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_duplicate_runs(self):
+        runs = [make_run(1), make_run(2), make_run(1), make_run(1, repository_name='other-repo'), {'name': 'no id'}]
+        self.assertEqual(dedup(runs), [runs[0], runs[1], runs[3], runs[4]])
+
+    def test_latest_attempt_before_earlier_attempt(self):
+        index = RunIndex(LATEST)
+        self.assertTrue(index.keep(make_run(1, 2)))
+        self.assertFalse(index.keep(make_run(1, 1)))
+        self.assertFalse(index.keep(make_run(1, 2)))
+        self.assertFalse(index.superseded)
+
+    def test_latest_attempt_after_earlier_attempt(self):
+        runs = [make_run(1, 1), make_run(2, 1), make_run(1, 3), make_run(1, 2), make_run(1, 3)]
+        self.assertEqual(dedup(runs), [runs[1], runs[2]])
+
+    def test_all_attempts(self):
+        runs = [make_run(1, 1), make_run(1, 2), make_run(1, 1), make_run(2, 1)]
+        self.assertEqual(dedup(runs, ALL), [runs[0], runs[1], runs[3]])
+
+    def test_index_grows(self):
+        runs = [make_run(run_id, 1 + run_id % 3, f'repo-{run_id % 7}') for run_id in range(20000)]
+        index = RunIndex(LATEST, 16)
+        self.assertTrue(all(index.keep(run) for run in runs))
+        self.assertFalse(any(index.keep(run) for run in runs))
+        self.assertEqual(len(index), 20000)
+
+    def test_keys_that_do_not_fit_in_64_bits(self):
+        runs = [make_run(2 ** 50, 1), make_run(2 ** 50, 2), make_run(2 ** 50 + 1), make_run(2 ** 50, 2)]
+        self.assertEqual(dedup(runs), [runs[1], runs[2]])
+
+    def test_evaluate_workflow_runs_dedup(self):
+        runs = [
+            make_run(1, 1, conclusion='failure', duration=30),
+            make_run(2, 1, duration=10),
+            make_run(1, 2, duration=20),
+            make_run(2, 1, duration=10),
+        ]
+        with open('runs.json', 'w') as f:
+            json.dump(runs, f)
+
+        for policy, expected_row in [('latest', 'workflow_1,15.00,15.00,100.00,2'),
+                                     ('all', 'workflow_1,20.00,20.00,66.67,3'),
+                                     ('off', 'workflow_1,17.50,15.00,75.00,4')]:
+            subprocess.run(['python', 'evaluate_workflow_runs.py'], env=dict(os.environ, DEDUP_POLICY=policy),
+                           check=True)
+            with open('workflow-stats.csv', 'r') as f:
+                self.assertEqual(f.read().splitlines()[1], expected_row)
+
+
+if __name__ == '__main__':
+    unittest.main()
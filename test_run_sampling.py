@@ -0,0 +1,67 @@
+"""
+This file contains unit tests for the `run_sampling.py` module.
+
+Usage:
+    python -m unittest test_run_sampling.py
+
+Requirements:
+    - Python 3.x
+    - `run_sampling.py` module to test
+
+Description:
+    This script contains unit tests for the `run_sampling.py` module. The tests verify the sample size for a target
+    precision, that sampled pages are spread over the strata and exist, and the confidence intervals of the
+    estimates.
+
+Output:
+    - Test results for the `run_sampling.py` module
+
+Example:
+    python -m unittest test_run_sampling.TestRunSampling.test_sample_pages_stratified
+"""
+
+import unittest
+import random
+
+from run_sampling import estimate_row, sample_pages, sample_size
+
+
+class TestRunSampling(unittest.TestCase):
+    def test_sample_size(self):
+        # 384 runs for +/- 5 percentage points at 95% confidence, fewer for a small population
+        self.assertEqual(sample_size(0.05, 1000000), 384)
+        self.assertEqual(sample_size(0.05, 1000), 278)
+        self.assertEqual(sample_size(0.05, 100), 80)
+        self.assertEqual(sample_size(0.05, 0), 0)
+
+    def test_sample_pages_stratified(self):
+        pages = sample_pages([10, 10, 5, 0], 5, 'stratified', random.Random(1))
+        strata = [stratum for stratum, _ in pages]
+        self.assertEqual(strata, [0, 0, 1, 1, 2])
+        self.assertEqual(len(set(pages)), 5)
+        self.assertTrue(all(1 <= page <= 10 for _, page in pages))
+
+    def test_sample_pages_random(self):
+        page_counts = [3, 0, 2, 4]
+        pages = sample_pages(page_counts, 6, 'random', random.Random(2))
+        self.assertEqual(len(set(pages)), 6)
+        self.assertTrue(all(1 <= page <= page_counts[stratum] for stratum, page in pages))
+
+    def test_sample_pages_all(self):
+        self.assertEqual(sample_pages([2, 1], 5), [(0, 1), (0, 2), (1, 1)])
+
+    def test_estimate_row(self):
+        durations = list(range(1, 101))
+        row = estimate_row(durations, 80, confidence=0.95)
+
+        self.assertEqual(row[0], 100)
+        self.assertEqual(row[1:4], ['50.50', '44.81', '56.19'])
+        self.assertEqual(row[4:7], ['50.50', '41.00', '60.00'])
+        self.assertEqual(row[7:10], ['80.00', '72.16', '87.84'])
+
+    def test_estimate_row_empty(self):
+        self.assertEqual(estimate_row([], 0), [0] + ['0.00'] * 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
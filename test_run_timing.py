@@ -0,0 +1,94 @@
+"""
+This file contains unit tests for the `run_timing.py` module.
+
+Usage:
+    python -m unittest test_run_timing.py
+
+Requirements:
+    - Python 3.x
+    - `run_timing.py` module to test
+
+Description:
+    This script contains unit tests for the `run_timing.py` module. The tests verify that the timing of completed
+    runs is kept in the permanent cache, keyed by run id and attempt, that cached runs cost no API calls, and that
+    `evaluate_workflow_runs.py` sums the billable time of the runs per workflow.
+
+Output:
+    - Test results for the `run_timing.py` module
+
+Example:
+    python -m unittest test_run_timing.TestRunTiming.test_cached_runs_cost_no_api_calls
+"""
+
+import unittest
+import json
+import os
+import shutil
+import subprocess
+
+from run_timing import TimingCache, add_billable_time
+
+CACHE_DIR = 'test-timing-cache'
+
+
+def make_timing(ubuntu=0, macos=0, windows=0):
+    return {'billable_ms_ubuntu': ubuntu, 'billable_ms_macos': macos, 'billable_ms_windows': windows}
+
+
+class TestRunTiming(unittest.TestCase):
+    def tearDown(self):
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        for file in ['runs.json', 'workflow-stats.csv']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_cache_keeps_completed_runs(self):
+        path = os.path.join(CACHE_DIR, 'octocat', 'hello-world.ndjson')
+        cache = TimingCache(path)
+        cache.add({'id': 1, 'run_attempt': 1, 'status': 'completed'}, make_timing(ubuntu=60000))
+        cache.add({'id': 2, 'run_attempt': 1, 'status': 'in_progress'}, make_timing(ubuntu=1000))
+        # A line cut short by an interrupted collection is skipped
+        with open(path, 'a') as f:
+            f.write('{"id": 3, "run_att')
+
+        cache = TimingCache(path)
+        self.assertEqual(cache.get({'id': 1, 'run_attempt': 1}), make_timing(ubuntu=60000))
+        self.assertIsNone(cache.get({'id': 2, 'run_attempt': 1}))
+        # A re-run changes the timing of the run
+        self.assertIsNone(cache.get({'id': 1, 'run_attempt': 2}))
+
+    def test_cached_runs_cost_no_api_calls(self):
+        cache = TimingCache(os.path.join(CACHE_DIR, 'octocat', 'hello-world.ndjson'))
+        cache.add({'id': 1, 'run_attempt': 1, 'status': 'completed'}, make_timing(ubuntu=60000, macos=120000))
+        cache.add({'id': 2, 'run_attempt': 2, 'status': 'completed'}, make_timing(windows=30000))
+
+        runs = [{'id': 1, 'run_attempt': 1}, {'id': 2, 'run_attempt': 2}]
+        self.assertEqual(add_billable_time('octocat', 'hello-world', runs, CACHE_DIR), 0)
+        self.assertEqual(runs, [
+            dict(id=1, run_attempt=1, **make_timing(ubuntu=60000, macos=120000)),
+            dict(id=2, run_attempt=2, **make_timing(windows=30000)),
+        ])
+
+    def test_evaluate_workflow_runs_billable_time(self):
+        runs = [
+            dict(name='workflow_1', conclusion='success', duration=10, **make_timing(ubuntu=60000, macos=120000)),
+            dict(name='workflow_1', conclusion='failure', duration=20, **make_timing(ubuntu=30000)),
+            dict(name='workflow_2', conclusion='success', duration=30, **make_timing(windows=90000)),
+        ]
+        with open('runs.json', 'w') as f:
+            json.dump(runs, f)
+
+        env = dict(os.environ, BILLABLE_TIMING='true')
+        subprocess.run(['python', 'evaluate_workflow_runs.py'], env=env, check=True)
+
+        with open('workflow-stats.csv', 'r') as f:
+            self.assertEqual(f.read(), (
+                'workflow_name,average_duration,median_duration,success_rate,total_runs,'
+                'billable_ms_ubuntu,billable_ms_macos,billable_ms_windows,billable_ms\n'
+                'workflow_1,15.00,15.00,50.00,2,90000,120000,0,210000\n'
+                'workflow_2,30.00,30.00,100.00,1,0,0,90000,90000\n'
+            ))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+"""
+This file contains unit tests for the `webhook_server.py` script.
+
+Usage:
+    python -m unittest test_webhook_server.py
+
+Requirements:
+    - Python 3.x
+    - `webhook_server.py` script to test
+
+Description:
+    This script contains unit tests for the `webhook_server.py` script. The tests start the server on a free port,
+    post recorded `workflow_run` payloads to it, and verify that the signatures, payloads and repositories are
+    checked, that redelivered events are only counted once and reruns are deduplicated with the `DEDUP_POLICY`, also after a
+    restart, and that the served stats match the stats of `evaluate_workflow_runs.py`.
+
+Output:
+    - Test results for the `webhook_server.py` script
+
+Example:
+    python -m unittest test_webhook_server.TestWebhookServer.test_stats_match_evaluate_workflow_runs
+"""
+
+import unittest
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import subprocess
+import threading
+import urllib.error
+import urllib.request
+
+from http.server import ThreadingHTTPServer
+
+from webhook_server import WebhookStats, make_handler
+
+SECRET = 'test-secret'
+
+
+def make_payload(run_id, name, conclusion, duration, action='completed', run_attempt=1):
+    return {
+        "action": action,
+        "repository": {"name": "repo_1", "owner": {"login": "org_1"}},
+        "workflow_run": {
+            "id": run_id,
+            "name": name,
+            "conclusion": conclusion,
+            "created_at": "2023-08-01T10:00:00Z",
+            "display_title": name,
+            "event": "push",
+            "head_branch": "main",
+            "run_number": run_id,
+            "run_started_at": "2023-08-01T10:00:00Z",
+            "run_attempt": run_attempt,
+            "status": "completed",
+            "updated_at": f"2023-08-01T10:00:{duration:02d}Z",
+            "url": f"https://repo-url/actions/runs/{run_id}",
+            "actor": {"login": "octocat"}
+        }
+    }
+
+
+class TestWebhookServer(unittest.TestCase):
+    def setUp(self):
+        self.stats = WebhookStats()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(self.stats, SECRET))
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for file in ['runs.json', 'workflow-stats.csv', 'webhook-stats.csv', 'webhook-stats-state.json']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def post(self, payload, secret=SECRET, event='workflow_run'):
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'X-GitHub-Event': event, 'Content-Type': 'application/json'}
+        if secret:
+            headers['X-Hub-Signature-256'] = 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+        request = urllib.request.Request(self.url + '/', data=body, headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def get_stats(self):
+        with urllib.request.urlopen(self.url + '/stats') as response:
+            return response.read().decode('utf-8')
+
+    def test_invalid_signature_is_rejected(self):
+        self.assertEqual(self.post(make_payload(1, 'workflow_1', 'success', 10), secret='wrong-secret'), 401)
+        self.assertEqual(self.post(make_payload(1, 'workflow_1', 'success', 10), secret=None), 401)
+        self.assertEqual(self.get_stats(), 'workflow_name,average_duration,median_duration,success_rate,total_runs\n')
+
+    def test_only_completed_runs_are_counted_once(self):
+        self.assertEqual(self.post(make_payload(1, 'workflow_1', 'success', 10, action='in_progress')), 200)
+        self.assertEqual(self.post(make_payload(1, 'workflow_1', 'success', 10)), 202)
+        # A redelivered event, and an event of another type
+        self.assertEqual(self.post(make_payload(1, 'workflow_1', 'success', 10)), 200)
+        self.assertEqual(self.post(make_payload(2, 'workflow_1', 'success', 10), event='workflow_job'), 200)
+        # A rerun is a new attempt of the same run, which replaces the attempt that was counted
+        self.assertEqual(self.post(make_payload(1, 'workflow_1', 'failure', 20, run_attempt=2)), 202)
+        self.assertEqual(self.post(make_payload(1, 'workflow_1', 'success', 10)), 200)
+
+        self.assertEqual(self.get_stats(), (
+            'workflow_name,average_duration,median_duration,success_rate,total_runs\n'
+            'workflow_1,20.00,20.00,0.00,1\n'
+        ))
+
+    def test_every_attempt_is_counted_with_dedup_policy_all(self):
+        os.environ['DEDUP_POLICY'] = 'all'
+        try:
+            stats = WebhookStats()
+        finally:
+            del os.environ['DEDUP_POLICY']
+        for payload in [make_payload(1, 'workflow_1', 'success', 10),
+                        make_payload(1, 'workflow_1', 'failure', 20, run_attempt=2),
+                        make_payload(1, 'workflow_1', 'failure', 20, run_attempt=2)]:
+            stats.handle_event('workflow_run', payload)
+        self.assertEqual(stats.csv(), (
+            'workflow_name,average_duration,median_duration,success_rate,total_runs\n'
+            'workflow_1,15.00,15.00,50.00,2\n'
+        ))
+
+    def test_invalid_payload_is_rejected(self):
+        payload = make_payload(1, 'workflow_1', 'success', 10)
+        del payload['workflow_run']['updated_at']
+        self.assertEqual(self.post(payload), 400)
+        self.assertEqual(self.post({'action': 'completed', 'repository': {'name': 'repo_1'}}), 400)
+        self.assertEqual(self.post(dict(payload, workflow_run='run')), 400)
+        self.assertEqual(self.post(['completed']), 400)
+        self.assertEqual(self.get_stats(), 'workflow_name,average_duration,median_duration,success_rate,total_runs\n')
+
+    def test_invalid_content_length_is_rejected(self):
+        for length in ['abc', '-1']:
+            connection = http.client.HTTPConnection('127.0.0.1', self.server.server_address[1])
+            connection.putrequest('POST', '/')
+            connection.putheader('X-GitHub-Event', 'workflow_run')
+            connection.putheader('Content-Length', length)
+            connection.endheaders()
+            self.assertEqual(connection.getresponse().status, 400)
+            connection.close()
+
+    def test_repository_filter(self):
+        filters = [('org_1/repo_1', 202), ('org_2/repo_1', 200), ('org_1/repo_*', 202), ('repo_1', 202), ('repo_2', 200)]
+        for run_id, (repository, expected_status) in enumerate(filters, 1):
+            self.stats.repository = repository
+            self.assertEqual(self.post(make_payload(run_id, 'workflow_1', 'success', 10)), expected_status)
+        payload = make_payload(1, 'workflow_1', 'success', 10)
+        del payload['repository']
+        self.assertEqual(self.post(payload), 400)
+
+    def test_state_is_kept_across_restarts(self):
+        self.post(make_payload(1, 'workflow_1', 'success', 10))
+        self.post(make_payload(2, 'workflow_1', 'failure', 30))
+        self.stats.flush('webhook-stats.csv', 'webhook-stats-state.json')
+
+        stats = WebhookStats()
+        stats.load('webhook-stats-state.json')
+        # A redelivered event is still counted once after a restart, and a rerun still replaces the counted attempt
+        self.assertFalse(stats.handle_event('workflow_run', make_payload(2, 'workflow_1', 'failure', 30)))
+        self.assertTrue(stats.handle_event('workflow_run', make_payload(3, 'workflow_1', 'success', 20)))
+        self.assertTrue(stats.handle_event('workflow_run', make_payload(2, 'workflow_1', 'success', 40, run_attempt=2)))
+        self.assertEqual(stats.csv(), (
+            'workflow_name,average_duration,median_duration,success_rate,total_runs\n'
+            'workflow_1,23.33,20.00,100.00,3\n'
+        ))
+
+    def test_recent_runs_expire(self):
+        stats = WebhookStats()
+        for day in range(1, 10):
+            payload = make_payload(day, 'workflow_1', 'success', 10)
+            payload['workflow_run']['created_at'] = f'2023-07-{day:02d}T10:00:00Z'
+            stats.handle_event('workflow_run', payload)
+        payload = make_payload(100, 'workflow_1', 'success', 10)
+        payload['workflow_run']['created_at'] = '2023-08-07T10:00:00Z'
+        stats.handle_event('workflow_run', payload)
+        stats.state()
+        self.assertEqual(sorted(run_id for run_id, _ in stats.recent_runs), [8, 9, 100])
+
+    def test_stats_match_evaluate_workflow_runs(self):
+        payloads = [
+            make_payload(1, 'workflow_1', 'success', 12),
+            make_payload(2, 'workflow_1', 'success', 13),
+            make_payload(3, 'workflow_2', 'failure', 21),
+            make_payload(4, 'workflow_2', 'success', 10),
+            make_payload(5, 'workflow_3', 'skipped', 4),
+            make_payload(6, 'workflow_3', 'cancelled', 17),
+            make_payload(2, 'workflow_1', 'failure', 15, run_attempt=2),
+        ]
+        for payload in payloads:
+            self.post(payload)
+        self.stats.flush('webhook-stats.csv')
+
+        runs = []
+        for payload in payloads:
+            run = dict(payload['workflow_run'], actor='octocat')
+            run['duration'] = int(run['updated_at'][-3:-1])
+            runs.append(run)
+        with open('runs.json', 'w') as f:
+            json.dump(runs, f)
+        subprocess.run(['python', 'evaluate_workflow_runs.py'], check=True)
+
+        with open('workflow-stats.csv', 'r') as f:
+            expected_csv_contents = f.read()
+        with open('webhook-stats.csv', 'r') as f:
+            self.assertEqual(f.read(), expected_csv_contents)
+        self.assertEqual(self.get_stats(), expected_csv_contents)
+
+
+if __name__ == '__main__':
+    unittest.main()
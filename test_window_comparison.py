@@ -0,0 +1,148 @@
+"""
+This file contains unit tests for the `window_comparison.py` module.
+
+Usage:
+    python -m unittest test_window_comparison.py
+
+Requirements:
+    - Python 3.x
+    - `window_comparison.py` module to test
+
+Description:
+    This script contains unit tests for the `window_comparison.py` module. The tests verify the 95th percentile of an
+    aggregate, that the Mann-Whitney U statistic calculated from the duration counts matches the statistic of the
+    ranked runs, that slower durations and lower success rates are flagged as regressions while identical windows are
+    not, and that `evaluate_workflow_runs.py` writes the comparison of the last two windows of its state.
+
+Output:
+    - Test results for the `window_comparison.py` module
+
+Example:
+    python -m unittest test_window_comparison.TestWindowComparison.test_slower_durations_are_a_regression
+"""
+
+import unittest
+import json
+import math
+import os
+import random
+import subprocess
+
+from window_comparison import COMPARISON_COLUMNS, compare_states, mann_whitney_test, recent_windows
+from workflow_aggregates import Aggregate, AggregateState
+
+
+def make_run(conclusion, duration, day, minute=0, name='workflow_1'):
+    return {
+        "conclusion": conclusion,
+        "name": name,
+        "run_started_at": f"2023-08-{day:02d}T10:{minute:02d}:00Z",
+        "duration": float(duration)
+    }
+
+
+def make_aggregate(durations, failures=0):
+    aggregate = Aggregate()
+    for i, duration in enumerate(durations):
+        aggregate.add({'conclusion': 'failure' if i < failures else 'success', 'duration': float(duration)})
+    return aggregate
+
+
+class TestWindowComparison(unittest.TestCase):
+    def setUp(self):
+        self.generator = random.Random(11)
+
+    def tearDown(self):
+        for file in ['runs.json', 'workflow-stats.csv', 'workflow-stats-comparison.csv', 'state.json']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def compare(self, baseline_runs, current_runs):
+        state = AggregateState()
+        state.fold_runs(baseline_runs + current_runs)
+        [row] = compare_states(state, state, ('2023-08-01', '2023-08-07'), ('2023-08-08', '2023-08-14'))
+        return dict(zip(['workflow_name'] + COMPARISON_COLUMNS, row))
+
+    def window_runs(self, first_day, durations, conclusions=('success',)):
+        return [make_run(self.generator.choice(conclusions), self.generator.randint(*durations), day, minute)
+                for day in range(first_day, first_day + 7) for minute in range(0, 60, 2)]
+
+    def test_quantile(self):
+        for size in [1, 2, 19, 20, 21, 100]:
+            durations = [self.generator.randint(1, 30) for _ in range(size)]
+            aggregate = make_aggregate(durations)
+            for q in [0.05, 0.5, 0.95, 1]:
+                self.assertEqual(aggregate.quantile(q), sorted(durations)[math.ceil(q * size) - 1])
+
+    def test_mann_whitney_matches_ranked_runs(self):
+        baseline_durations = [self.generator.randint(1, 10) for _ in range(40)]
+        current_durations = [self.generator.randint(5, 14) for _ in range(30)]
+        # Rank the runs one by one, with tied durations sharing the average of their ranks
+        ranked = sorted(baseline_durations + current_durations)
+        ranks = {duration: (ranked.index(duration) + 1 + len(ranked) - ranked[::-1].index(duration)) / 2
+                 for duration in ranked}
+        u = sum(ranks[duration] for duration in current_durations) - 30 * 31 / 2
+        mean = 40 * 30 / 2
+        tie_sum = sum(ranked.count(duration) ** 3 - ranked.count(duration) for duration in set(ranked))
+        variance = 40 * 30 / 12 * (71 - tie_sum / (70 * 69))
+
+        z, p_value = mann_whitney_test(make_aggregate(baseline_durations), make_aggregate(current_durations))
+        self.assertAlmostEqual(z, (u - mean - 0.5) / math.sqrt(variance))
+        self.assertLess(p_value, 0.05)
+
+    def test_identical_windows_are_not_a_regression(self):
+        runs = self.window_runs(1, (10, 100), ('success', 'failure'))
+        # The same runs, a week later
+        next_week_runs = [make_run(run['conclusion'], run['duration'], int(run['run_started_at'][8:10]) + 7)
+                          for run in runs]
+        row = self.compare(runs, next_week_runs)
+        self.assertEqual(row['median_duration_delta'], '0.00')
+        self.assertEqual(row['p95_duration_delta'], '0.00')
+        self.assertEqual(row['success_rate_delta'], '0.00')
+        self.assertEqual(row['duration_p_value'], '1.0000')
+        self.assertEqual(row['regression'], '')
+
+    def test_slower_durations_are_a_regression(self):
+        row = self.compare(self.window_runs(1, (10, 100)), self.window_runs(8, (30, 120)))
+        self.assertEqual(row['baseline_runs'], 210)
+        self.assertGreater(float(row['median_duration_delta']), 0)
+        self.assertGreater(float(row['p95_duration_delta']), 0)
+        self.assertEqual(row['regression'], 'duration')
+
+        # Faster durations are not a regression
+        row = self.compare(self.window_runs(1, (30, 120)), self.window_runs(8, (10, 100)))
+        self.assertEqual(row['regression'], '')
+
+    def test_lower_success_rate_is_a_regression(self):
+        row = self.compare(self.window_runs(1, (10, 100)),
+                           self.window_runs(8, (10, 100), ('success', 'success', 'failure')))
+        self.assertLess(float(row['success_rate_delta']), 0)
+        self.assertLess(float(row['success_rate_p_value']), 0.05)
+        self.assertEqual(row['regression'], 'success_rate')
+
+    def test_empty_window_has_no_stats(self):
+        row = self.compare(self.window_runs(1, (10, 100)), [])
+        self.assertEqual(row['current_runs'], 0)
+        self.assertEqual(row['regression'], '')
+        self.assertEqual(row['median_duration_delta'], '')
+
+    def test_evaluate_workflow_runs_compares_last_windows(self):
+        runs = self.window_runs(1, (10, 100)) + self.window_runs(8, (30, 120))
+        with open('runs.json', 'w') as f:
+            json.dump(runs, f)
+        subprocess.run(['python', 'evaluate_workflow_runs.py'],
+                       env=dict(os.environ, STATS_STATE='state.json', STATS_WINDOW_DAYS='14', COMPARE_DAYS='7'),
+                       check=True)
+
+        state = AggregateState.load('state.json')
+        self.assertEqual(recent_windows(state, 7), (('2023-08-01', '2023-08-07'), ('2023-08-08', '2023-08-14')))
+        with open('workflow-stats-comparison.csv', 'r') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0].split(','), ['workflow_name'] + COMPARISON_COLUMNS)
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith('workflow_1,210,210,'))
+        self.assertTrue(lines[1].endswith(',duration'))
+
+
+if __name__ == '__main__':
+    unittest.main()
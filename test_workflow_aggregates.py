@@ -0,0 +1,179 @@
+"""
+This file contains unit tests for the `workflow_aggregates.py` module.
+
+Usage:
+    python -m unittest test_workflow_aggregates.py
+
+Requirements:
+    - Python 3.x
+    - `workflow_aggregates.py` module to test
+
+Description:
+    This script contains unit tests for the `workflow_aggregates.py` module. The tests verify that the stats of a
+    state are the same as the stats of `WorkflowStats` over the same runs, that completed runs are folded
+    incrementally without being counted twice, that a re-run replaces the attempt it supersedes, with the `latest`
+    deduplication policy only, that expired days are subtracted, and that two states are merged.
+
+Output:
+    - Test results for the `workflow_aggregates.py` module
+
+Example:
+    python -m unittest test_workflow_aggregates.TestWorkflowAggregates.test_fold_in_batches_matches_full_evaluation
+"""
+
+import unittest
+import json
+import os
+import random
+import subprocess
+
+from workflow_aggregates import AggregateState
+from workflow_stats import WorkflowStats
+
+
+def make_run(name, conclusion, duration, day, minute=0):
+    return {
+        "conclusion": conclusion,
+        "name": name,
+        "run_started_at": f"2023-08-{day:02d}T10:{minute:02d}:00Z",
+        "duration": float(duration)
+    }
+
+
+class TestWorkflowAggregates(unittest.TestCase):
+    def setUp(self):
+        generator = random.Random(7)
+        self.runs = [
+            make_run(f'workflow_{generator.randint(1, 3)}', generator.choice(['success', 'failure', 'skipped']),
+                     generator.randint(1, 120), day, minute)
+            for day in range(1, 21) for minute in range(0, 60, 5)
+        ]
+
+    def tearDown(self):
+        for file in ['runs.json', 'workflow-stats.csv', 'state.json', 'merged-state.json']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def expected_rows(self, runs):
+        stats = {}
+        for run in runs:
+            stats.setdefault(run['name'], WorkflowStats()).add(run)
+        return {name: workflow_stats.row() for name, workflow_stats in stats.items()}
+
+    def state_rows(self, state):
+        return {name: state.aggregate(name).row() for name in state.workflows}
+
+    def test_fold_in_batches_matches_full_evaluation(self):
+        state = AggregateState()
+        for day in range(1, 21, 5):
+            batch = [run for run in self.runs if day <= int(run['run_started_at'][8:10]) < day + 5]
+            # Every batch overlaps the previous one, and is folded into a reloaded state
+            overlap = [run for run in self.runs if int(run['run_started_at'][8:10]) == day - 1]
+            state.save('state.json')
+            state = AggregateState.load('state.json')
+            self.assertEqual(state.fold_runs(overlap + batch), len(batch))
+
+        self.assertEqual(self.state_rows(state), self.expected_rows(self.runs))
+
+    def test_run_in_progress_is_folded_once_completed(self):
+        state = AggregateState()
+        state.fold(dict(make_run('workflow_1', 'success', 60, 1), updated_at='2023-08-01T10:01:00Z',
+                        status='completed'))
+        in_progress = dict(make_run('workflow_1', None, 5, 1, 30), updated_at='2023-08-01T10:30:05Z',
+                           status='in_progress')
+        self.assertFalse(state.fold(in_progress))
+        state.save('state.json')
+
+        state = AggregateState.load('state.json')
+        completed = dict(in_progress, conclusion='success', duration=600.0, updated_at='2023-08-01T10:40:00Z',
+                         status='completed')
+        self.assertTrue(state.fold(completed))
+        state.save('state.json')
+        state = AggregateState.load('state.json')
+        self.assertFalse(state.fold(completed))
+        self.assertEqual(state.aggregate('workflow_1').row(), ['330.00', '330.00', '100.00', 2])
+
+    def test_rerun_replaces_folded_attempt(self):
+        first_attempt = dict(make_run('workflow_1', 'failure', 60, 1), id=7, run_attempt=1,
+                             created_at='2023-08-01T10:00:00Z', updated_at='2023-08-01T10:01:00Z')
+        second_attempt = dict(make_run('workflow_1', 'success', 90, 2), id=7, run_attempt=2,
+                              created_at='2023-08-01T10:00:00Z', updated_at='2023-08-02T10:01:30Z')
+        other_run = dict(make_run('workflow_1', 'success', 30, 1, 5), id=8, run_attempt=1,
+                         created_at='2023-08-01T10:05:00Z', updated_at='2023-08-01T10:05:30Z')
+        for policy, expected_row in [('latest', ['60.00', '60.00', '100.00', 2]),
+                                     ('all', ['60.00', '60.00', '66.67', 3])]:
+            state = AggregateState(policy)
+            state.fold_runs([first_attempt, other_run])
+            state.save('state.json')
+            # The re-run is folded in a later evaluation, into the reloaded state
+            state = AggregateState.load('state.json', policy)
+            self.assertEqual(state.fold_runs([second_attempt, first_attempt]), 1)
+            state.save('state.json')
+            state = AggregateState.load('state.json', policy)
+            self.assertEqual(state.aggregate('workflow_1').row(), expected_row)
+            self.assertEqual(sorted(state.workflows['workflow_1']), ['2023-08-01', '2023-08-02'])
+
+    def test_evaluate_workflow_runs_with_state_and_rerun(self):
+        env = dict(os.environ, STATS_STATE='state.json')
+        first_attempt = dict(make_run('workflow_1', 'failure', 60, 1), id=7, run_attempt=1,
+                             created_at='2023-08-01T10:00:00Z', updated_at='2023-08-01T10:01:00Z')
+        second_attempt = dict(first_attempt, conclusion='success', duration=90.0, run_attempt=2,
+                              updated_at='2023-08-01T12:01:30Z')
+        for runs in [[first_attempt], [second_attempt]]:
+            with open('runs.json', 'w') as f:
+                json.dump(runs, f)
+            subprocess.run(['python', 'evaluate_workflow_runs.py'], env=env, check=True)
+
+        with open('workflow-stats.csv', 'r') as f:
+            self.assertEqual(f.read().splitlines()[1], 'workflow_1,90.00,90.00,100.00,1')
+
+    def test_expire_subtracts_days_before_window(self):
+        state = AggregateState()
+        state.fold_runs(self.runs)
+        state.expire(7)
+
+        window_runs = [run for run in self.runs if run['run_started_at'] >= '2023-08-14']
+        self.assertEqual(self.state_rows(state), self.expected_rows(window_runs))
+
+    def test_billable_time_is_folded_and_expired(self):
+        for i, run in enumerate(self.runs):
+            run['billable_ms_ubuntu'] = 1000 * i
+        state = AggregateState()
+        state.fold_runs(self.runs)
+        state.save('state.json')
+        state = AggregateState.load('state.json')
+        state.expire(7)
+
+        window_runs = [run for run in self.runs if run['run_started_at'] >= '2023-08-14']
+        for name in state.workflows:
+            billable_ms = sum(run['billable_ms_ubuntu'] for run in window_runs if run['name'] == name)
+            self.assertEqual(state.aggregate(name).billable.row(), [billable_ms, 0, 0, billable_ms])
+
+    def test_merge_states(self):
+        first = AggregateState()
+        first.fold_runs(self.runs[::2])
+        second = AggregateState()
+        second.fold_runs(self.runs[1::2])
+        first.merge(second)
+
+        self.assertEqual(self.state_rows(first), self.expected_rows(self.runs))
+        self.assertEqual(first.latest_run_started_at, self.runs[-1]['run_started_at'])
+
+    def test_evaluate_workflow_runs_with_state(self):
+        env = dict(os.environ, STATS_STATE='state.json')
+        for runs in [self.runs[:100], self.runs[80:]]:
+            with open('runs.json', 'w') as f:
+                json.dump(runs, f)
+            subprocess.run(['python', 'evaluate_workflow_runs.py'], env=env, check=True)
+
+        with open('workflow-stats.csv', 'r') as f:
+            actual_lines = f.read().splitlines()
+        expected_rows = self.expected_rows(self.runs)
+        self.assertEqual(len(actual_lines), len(expected_rows) + 1)
+        for line in actual_lines[1:]:
+            name, *row = line.split(',')
+            self.assertEqual(row, [str(value) for value in expected_rows[name]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+This file contains unit tests for the `workflow_chains.py` module.
+
+Usage:
+    python -m unittest test_workflow_chains.py
+
+Requirements:
+    - Python 3.x
+    - `workflow_chains.py` module to test
+
+Description:
+    This script contains unit tests for the `workflow_chains.py` module. The tests verify that triggered runs are
+    linked to the same parents as a scan of every pair of runs, in any order of runs that complete in the same
+    second, that the critical path of a chain follows the runs that end last, that the lead time percentiles and the
+    critical workflow of every critical path are evaluated, and that `evaluate_workflow_runs.py` writes
+    `workflow-chains.csv`.
+
+Output:
+    - Test results for the `workflow_chains.py` module
+
+Example:
+    python -m unittest test_workflow_chains.TestWorkflowChains.test_critical_path
+"""
+
+import unittest
+import csv
+import json
+import os
+import random
+import subprocess
+
+from run_concurrency import format_time
+from workflow_chains import CHAIN_COLUMNS, ChainIndex
+
+START = 1689984000
+
+
+def make_run(name, head_sha, created, updated, event='workflow_run', repository_name='repo'):
+    return {'name': name, 'event': event, 'head_sha': head_sha, 'conclusion': 'success', 'duration': 0.0,
+            'created_at': format_time(START + created), 'updated_at': format_time(START + updated),
+            'repository_name': repository_name}
+
+
+def make_chain(head_sha, created, ci_time, build_time, deploy_time):
+    ci_end = created + ci_time
+    build_end = ci_end + 10 + build_time
+    return [make_run('CI', head_sha, created, ci_end, 'push'),
+            make_run('Build', head_sha, ci_end + 10, build_end),
+            make_run('Deploy', head_sha, build_end + 10, build_end + 10 + deploy_time)]
+
+
+def index_of(runs):
+    index = ChainIndex()
+    for run in runs:
+        index.add(run)
+    return index
+
+
+class TestWorkflowChains(unittest.TestCase):
+    def tearDown(self):
+        for file in ['runs.json', 'workflow-stats.csv', 'workflow-chains.csv']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_link_matches_scan_of_every_pair(self):
+        generator = random.Random(9)
+        runs = []
+        for _ in range(600):
+            created = generator.randint(0, 20000)
+            runs.append(make_run(generator.choice(['CI', 'Build', 'Deploy']), generator.choice(['a', 'b', 'c']),
+                                 created, created + generator.randint(1, 3000),
+                                 generator.choice(['push', 'workflow_run']),
+                                 generator.choice(['repo-1', 'repo-2'])))
+        parents = index_of(runs).link()
+
+        for i, run in enumerate(runs):
+            if run['event'] != 'workflow_run':
+                self.assertEqual(parents[i], -1)
+                continue
+            candidates = [j for j, other in enumerate(runs)
+                          if other['head_sha'] == run['head_sha'] and other['name'] != run['name']
+                          and other['repository_name'] == run['repository_name']
+                          and other['updated_at'] <= run['created_at']]
+            if not candidates:
+                self.assertEqual(parents[i], -2)
+            else:
+                latest = max(runs[j]['updated_at'] for j in candidates)
+                self.assertEqual(runs[parents[i]]['updated_at'], latest)
+                self.assertIn(parents[i], candidates)
+
+    def test_critical_path(self):
+        # CI triggers Build and Docs, and Build, which ends last, triggers Deploy
+        runs = make_chain('a', 0, 100, 200, 50) + [make_run('Docs', 'a', 110, 250),
+                                                   make_run('Deploy', 'orphan', 0, 10),
+                                                   make_run('CI', 'single', 0, 10, 'push')]
+        [(lead_time, path)] = list(index_of(runs).chains())
+        self.assertEqual(lead_time, 370)
+        self.assertEqual([(runs[run]['name'], seconds) for run, seconds in path],
+                         [('CI', 100), ('Build', 210), ('Deploy', 60)])
+
+    def test_runs_completing_in_the_second_they_are_created(self):
+        # Build is skipped in the second it is created, which is the second CI completes in
+        runs = [make_run('CI', 'a', 0, 50, 'push'), make_run('Build', 'a', 50, 50), make_run('Deploy', 'a', 100, 200),
+                make_run('Lint', 'b', 0, 0), make_run('Docs', 'b', 0, 0)]
+        for ordered_runs in [runs, runs[::-1]]:
+            rows = index_of(ordered_runs).rows()
+            self.assertEqual([row[:2] for row in rows], [['CI > Build > Deploy', 1]])
+
+    def test_rows(self):
+        runs = []
+        for i in range(20):
+            runs += make_chain(f'sha-{i}', i * 1000, 100, 100 + i * 10, 50)
+        runs += make_chain('short', 50000, 100, 50, 50)[:2]
+        rows = [dict(zip(CHAIN_COLUMNS, row)) for row in index_of(runs).rows()]
+
+        self.assertEqual([row['chain'] for row in rows], ['CI > Build > Deploy', 'CI > Build'])
+        lead_times = sorted(100 + 10 + 100 + i * 10 + 10 + 50 for i in range(20))
+        self.assertEqual(rows[0]['chains'], 20)
+        self.assertEqual([rows[0][column] for column in CHAIN_COLUMNS[2:6]],
+                         [lead_times[9], lead_times[17], lead_times[18], lead_times[19]])
+        self.assertEqual(rows[0]['critical_workflow'], 'Build')
+        build_times = sum(10 + 100 + i * 10 for i in range(20))
+        self.assertEqual(rows[0]['critical_workflow_share'], f'{build_times / sum(lead_times) * 100:.2f}')
+        self.assertEqual((rows[1]['chains'], rows[1]['lead_time_max']), (1, 160))
+
+    def test_evaluate_workflow_runs_chains(self):
+        runs = make_chain('a', 0, 100, 200, 50) + make_chain('b', 1000, 100, 300, 50)
+        with open('runs.json', 'w') as f:
+            json.dump(runs, f)
+        subprocess.run(['python', 'evaluate_workflow_runs.py'], env=dict(os.environ, WORKFLOW_CHAINS='true'),
+                       check=True)
+
+        with open('workflow-chains.csv', 'r') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows, [CHAIN_COLUMNS,
+                                ['CI > Build > Deploy', '2', '370', '470', '470', '470', 'Build', '61.90']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+"""
+This file contains unit tests for the `workflow_runs_db.py` script.
+
+Usage:
+    python -m unittest test_workflow_runs_db.py
+
+Requirements:
+    - Python 3.x
+    - `workflow_runs_db.py` and `evaluate_workflow_runs.py` scripts to test
+
+Description:
+    This script contains unit tests for the `workflow_runs_db.py` script. The tests verify that the script loads the
+    workflow runs into a SQLite database, and that the SQL stats reproduce the `workflow-stats.csv` file generated by
+    `evaluate_workflow_runs.py`.
+
+Output:
+    - Test results for the `workflow_runs_db.py` script
+
+Example:
+    python -m unittest test_workflow_runs_db.TestWorkflowRunsDb.test_stats_match_evaluate_workflow_runs
+"""
+
+import unittest
+import json
+import sqlite3
+import subprocess
+import os
+
+
+def make_run(name, conclusion, duration, run_number, head_branch='main', event='push', started='2023-08-01'):
+    return {
+        "conclusion": conclusion,
+        "created_at": f"{started}T10:00:00Z",
+        "display_title": name,
+        "event": event,
+        "head_branch": head_branch,
+        "name": name,
+        "run_attempt": 1,
+        "run_number": run_number,
+        "run_started_at": f"{started}T10:00:00Z",
+        "status": "completed",
+        "updated_at": f"{started}T10:00:{duration:02d}Z",
+        "url": f"https://repo-url/actions/runs/{1000 + run_number}",
+        "actor": "octocat",
+        "duration": duration
+    }
+
+
+class TestWorkflowRunsDb(unittest.TestCase):
+    def setUp(self):
+        runs = [
+            make_run('workflow_1', 'success', 12, 1),
+            make_run('workflow_1', 'success', 12, 2, started='2023-08-03'),
+            make_run('workflow_1', 'success', 13, 3, started='2023-08-05'),
+            make_run('workflow_2', 'success', 10, 4, head_branch='feature', event='pull_request'),
+            make_run('workflow_2', 'failure', 21, 5, head_branch='feature', event='pull_request'),
+            make_run('workflow_3', 'skipped', 4, 6),
+            make_run('workflow_3', 'failure', 30, 7, head_branch='feature'),
+            make_run('workflow_3', 'cancelled', 17, 8),
+        ]
+        with open('runs.json', 'w') as f:
+            json.dump(runs, f)
+
+    def tearDown(self):
+        for file in ['runs.json', 'workflow-stats.csv', 'db-stats.csv', 'test-runs.db']:
+            if os.path.exists(file):
+                os.remove(file)
+
+    def test_load_creates_indexes_and_does_not_duplicate(self):
+        subprocess.run(['python', 'workflow_runs_db.py', 'load', 'runs.json', '--db', 'test-runs.db', '--repository', 'repo_1'], check=True)
+        subprocess.run(['python', 'workflow_runs_db.py', 'load', 'runs.json', '--db', 'test-runs.db', '--repository', 'repo_1'], check=True)
+
+        conn = sqlite3.connect('test-runs.db')
+        total_runs = conn.execute('SELECT COUNT(*) FROM runs WHERE repository_name = ?', ('repo_1',)).fetchone()[0]
+        indexes = [row[1] for row in conn.execute("SELECT * FROM sqlite_master WHERE type = 'index'")]
+        conn.close()
+
+        self.assertEqual(total_runs, 8)
+        self.assertIn('idx_runs_repository_name_started', indexes)
+        self.assertIn('idx_runs_conclusion', indexes)
+
+    def test_load_adds_missing_columns(self):
+        # A database created before the owner_name column was added
+        conn = sqlite3.connect('test-runs.db')
+        conn.execute('CREATE TABLE runs (url TEXT PRIMARY KEY, repository_name TEXT, name TEXT)')
+        conn.close()
+
+        subprocess.run(['python', 'workflow_runs_db.py', 'load', 'runs.json', '--db', 'test-runs.db'], check=True)
+        result = subprocess.run(
+            ['python', 'workflow_runs_db.py', 'stats', '--db', 'test-runs.db', '--group-by', 'owner_name', 'name'],
+            capture_output=True, text=True, check=True)
+
+        self.assertEqual(result.stdout.splitlines()[0],
+                         'owner_name,workflow_name,average_duration,median_duration,success_rate,total_runs')
+        self.assertEqual(len(result.stdout.splitlines()), 4)
+
+    def test_stats_match_evaluate_workflow_runs(self):
+        subprocess.run(['python', 'evaluate_workflow_runs.py'], check=True)
+        subprocess.run(['python', 'workflow_runs_db.py', 'load', 'runs.json', '--db', 'test-runs.db'], check=True)
+        subprocess.run(['python', 'workflow_runs_db.py', 'stats', '--db', 'test-runs.db', '--output', 'db-stats.csv'], check=True)
+
+        with open('workflow-stats.csv', 'r') as f:
+            expected_lines = f.read().splitlines()
+        with open('db-stats.csv', 'r') as f:
+            actual_lines = f.read().splitlines()
+
+        self.assertEqual(actual_lines[0], expected_lines[0])
+        self.assertEqual(sorted(actual_lines[1:]), sorted(expected_lines[1:]))
+
+    def test_stats_with_extra_group_by_and_date_range(self):
+        subprocess.run(['python', 'workflow_runs_db.py', 'load', 'runs.json', '--db', 'test-runs.db'], check=True)
+        result = subprocess.run(
+            ['python', 'workflow_runs_db.py', 'stats', '--db', 'test-runs.db', '--group-by', 'name', 'head_branch',
+             '--until', '2023-08-03'],
+            capture_output=True, text=True, check=True)
+
+        expected_csv_contents = (
+            'workflow_name,head_branch,average_duration,median_duration,success_rate,total_runs\n'
+            'workflow_1,main,12.00,12.00,100.00,2\n'
+            'workflow_2,feature,15.50,15.50,50.00,2\n'
+            'workflow_3,feature,30.00,30.00,0.00,1\n'
+            'workflow_3,main,10.50,10.50,50.00,2\n'
+        )
+        self.assertEqual(result.stdout, expected_csv_contents)
+
+
+if __name__ == '__main__':
+    unittest.main()
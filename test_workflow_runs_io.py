@@ -0,0 +1,113 @@
+"""
+This file contains unit tests for the `workflow_runs_io.py` module.
+
+Usage:
+    python -m unittest test_workflow_runs_io.py
+
+Requirements:
+    - Python 3.x
+    - `workflow_runs_io.py` module to test
+    - `zstandard` package, for the Zstandard tests only
+
+Description:
+    This script contains unit tests for the `workflow_runs_io.py` module. The tests verify that runs files are
+    written and read back in every layout, and that `evaluate_workflow_runs.py` evaluates compressed runs files.
+
+Output:
+    - Test results for the `workflow_runs_io.py` module
+
+Example:
+    python -m unittest test_workflow_runs_io.TestWorkflowRunsIo.test_gzip_runs_file
+"""
+
+import unittest
+import gzip
+import json
+import os
+import subprocess
+
+from workflow_runs_io import RunsWriter, iter_runs, iter_record_lines, runs_file_name, compress_file
+
+RUNS = [
+    {"conclusion": "success", "name": "workflow_1", "duration": 12},
+    {"conclusion": "failure", "name": "workflow_1", "duration": 20},
+    {"conclusion": "success", "name": "workflow_2, with a comma", "duration": 5},
+]
+
+
+class TestWorkflowRunsIo(unittest.TestCase):
+    def write_runs(self, path):
+        with RunsWriter(path) as writer:
+            for run in RUNS:
+                writer.write(run)
+        return writer.total
+
+    def test_runs_file_name(self):
+        self.assertEqual(runs_file_name('runs'), 'runs.json')
+        self.assertEqual(runs_file_name('org-runs', 'gzip'), 'org-runs.ndjson.gz')
+        self.assertEqual(runs_file_name('runs', 'zstd'), 'runs.ndjson.zst')
+
+    def test_json_runs_file(self):
+        self.assertEqual(self.write_runs('test-runs.json'), 3)
+
+        # The JSON array layout must stay readable by any JSON parser
+        with open('test-runs.json', 'r') as f:
+            self.assertEqual(json.load(f), RUNS)
+        self.assertEqual(list(iter_runs('test-runs.json')), RUNS)
+        self.assertEqual(len(list(iter_record_lines('test-runs.json'))), 3)
+
+    def test_empty_json_runs_file(self):
+        with RunsWriter('test-runs.json'):
+            pass
+        with open('test-runs.json', 'r') as f:
+            self.assertEqual(json.load(f), [])
+        self.assertEqual(list(iter_runs('test-runs.json')), [])
+
+    def test_gzip_runs_file(self):
+        self.write_runs('test-runs.ndjson.gz')
+
+        with gzip.open('test-runs.ndjson.gz', 'rt') as f:
+            self.assertEqual([json.loads(line) for line in f], RUNS)
+        self.assertEqual(list(iter_runs('test-runs.ndjson.gz')), RUNS)
+
+    def test_zstd_runs_file(self):
+        try:
+            import zstandard
+        except ImportError:
+            self.skipTest('zstandard is not installed')
+        self.write_runs('test-runs.ndjson.zst')
+        self.assertEqual(list(iter_runs('test-runs.ndjson.zst')), RUNS)
+
+    def test_compress_file(self):
+        with open('test-stats.csv', 'w') as f:
+            f.write('workflow_name,total_runs\nworkflow_1,2\n')
+
+        compressed_file = compress_file('test-stats.csv', 'gzip')
+
+        self.assertEqual(compressed_file, 'test-stats.csv.gz')
+        self.assertFalse(os.path.exists('test-stats.csv'))
+        with gzip.open(compressed_file, 'rt') as f:
+            self.assertEqual(f.read(), 'workflow_name,total_runs\nworkflow_1,2\n')
+
+    def test_evaluate_compressed_runs_file(self):
+        self.write_runs('runs.ndjson.gz')
+
+        subprocess.run(['python', 'evaluate_workflow_runs.py'], env=dict(os.environ, OUTPUT_COMPRESSION='gzip'))
+
+        with open('workflow-stats.csv', 'r') as f:
+            actual_csv_contents = f.read()
+        expected_csv_contents = (
+            'workflow_name,average_duration,median_duration,success_rate,total_runs\n'
+            'workflow_1,16.00,16.00,50.00,2\n'
+            '"workflow_2, with a comma",5.00,5.00,100.00,1\n'
+        )
+        self.assertEqual(actual_csv_contents, expected_csv_contents)
+
+    def tearDown(self):
+        for file in os.listdir('.'):
+            if file.startswith('test-runs.') or file.startswith('test-stats.') or file in ['runs.ndjson.gz', 'workflow-stats.csv']:
+                os.remove(file)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,364 @@
+"""
+webhook_server.py - Receive `workflow_run` webhook events and keep the workflow statistics up to date.
+
+Usage:
+    python webhook_server.py [--port <port>] [--stats-file <csv_file>] [--state-file <json_file>]
+                             [--flush-interval <seconds>]
+
+Requirements:
+    - Python 3.x
+    - A webhook on the repository or organisation, sending `workflow_run` events to the server
+
+Description:
+    This script runs an HTTP server that receives `workflow_run` webhook events, instead of retrieving the workflow
+    runs from the GitHub API on a schedule. Every completed run is added to the stats of its workflow as it arrives,
+    with the same definitions as `evaluate_workflow_runs.py` (see `workflow_stats.py`), so each event costs the same
+    small amount of work however many runs have been received. The stats of every workflow are kept as an
+    `Aggregate` (see `workflow_aggregates.py`), with the number of runs of every distinct duration, so the memory of
+    the server is bounded by the distinct durations rather than by the runs it has received.
+
+    The signature of every event is verified against the secret of the webhook, which is set in the
+    `WEBHOOK_SECRET` environment variable. Events with a missing or invalid `X-Hub-Signature-256` header are
+    rejected. Without `WEBHOOK_SECRET`, signatures are not verified, which is only meant for local testing.
+
+    Only events with the `completed` action are evaluated, and events whose `workflow_run` lacks the fields of the
+    stats are rejected. GitHub may deliver an event more than once, and a run may be re-run, so runs are
+    deduplicated with the `DEDUP_POLICY` of `evaluate_workflow_runs.py` (see `run_dedup.py`): with the default
+    `latest` policy, a later attempt of a run replaces the attempt that was counted, which is subtracted from the
+    stats. Only the runs created in the last `RERUN_DAYS` days, before the latest run received, are kept for this,
+    as older runs can no longer be re-run. If `REPO_NAME` is set, the events of other repositories are ignored, with
+    the repository filters of `run_archive.py`: `owner/repo` or `repo`, with wildcards, e.g. `myorg/web-*`. If a
+    `workflow-names.txt` file exists, only the runs of the workflows listed in the file are evaluated.
+
+    The server answers the following requests:
+
+        - `POST /`: Receive a webhook event.
+        - `GET /stats`: Return the current stats in the CSV format of `workflow-stats.csv`.
+
+    The stats are also written to the stats file (default `workflow-stats.csv`) every `--flush-interval` seconds
+    (default 60) when new runs have arrived, and when the server stops. The aggregates and the recent runs are
+    written to the state file (default `webhook-stats-state.json`) at the same time, and are loaded when the server
+    starts, so the stats are kept across restarts. The port defaults to the `WEBHOOK_PORT` environment variable, or
+    8080.
+
+    Recorded payloads can be replayed locally, e.g. with `curl`:
+
+        curl -X POST -H 'X-GitHub-Event: workflow_run' --data @payload.json http://localhost:8080/
+
+Output:
+    - The current stats in CSV, served on `GET /stats` and written to the stats file
+    - The aggregates of every workflow and the recent runs, written to the state file
+
+Example:
+    WEBHOOK_SECRET=mysecret python webhook_server.py --port 8080 --flush-interval 300
+"""
+
+import argparse
+import csv
+import hashlib
+import hmac
+import io
+import os
+import sys
+import threading
+
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import json_backend
+from run_archive import matches_repository
+from run_dedup import run_index
+from workflow_aggregates import Aggregate
+from workflow_stats import STATS_COLUMNS, parse_timestamp, run_duration
+
+DEFAULT_PORT = 8080
+DEFAULT_FLUSH_INTERVAL = 60
+STATS_FILE = 'workflow-stats.csv'
+STATE_FILE = 'webhook-stats-state.json'
+STATE_VERSION = 1
+WORKFLOW_NAMES_FILE = 'workflow-names.txt'
+
+# Days after its creation that a workflow run can be re-run, and after which its redelivered events are not expected
+RERUN_DAYS = 30
+
+# Fields of the workflow_run of a payload that the stats are evaluated from
+REQUIRED_FIELDS = ['id', 'name', 'created_at', 'run_started_at', 'updated_at']
+
+# Fields of the recent runs kept in the state file
+RECENT_RUN_FIELDS = ['owner_name', 'repository_name', 'id', 'run_attempt', 'name', 'conclusion', 'duration',
+                     'created_at']
+
+# Fields of a workflow run kept from the webhook payload, as retrieved by get_workflow_runs.py
+RUN_FIELDS = [
+    'conclusion', 'created_at', 'display_title', 'event', 'head_branch', 'name', 'run_number', 'run_started_at',
+    'run_attempt', 'status', 'updated_at', 'url', 'id'
+]
+
+
+def verify_signature(secret, body, signature):
+    """Return whether signature is the `X-Hub-Signature-256` header of body signed with secret."""
+    if not signature:
+        return False
+    expected = 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def run_from_event(workflow_run, repository=None):
+    """Return the workflow run of a `workflow_run` payload, with the fields and duration of get_workflow_runs.py, and
+    the owner and name of its repository.
+
+    Raises ValueError if the payload has no valid workflow run.
+    """
+    if not isinstance(workflow_run, dict):
+        raise ValueError('The payload has no workflow_run object')
+    for field in REQUIRED_FIELDS:
+        if workflow_run.get(field) is None:
+            raise ValueError(f'The workflow_run has no {field} field')
+    run = {field: workflow_run.get(field) for field in RUN_FIELDS}
+    actor = workflow_run.get('actor')
+    run['actor'] = actor.get('login') if isinstance(actor, dict) else None
+    run['owner_name'], run['repository_name'] = repository_names(repository)
+    try:
+        parse_timestamp(run['created_at'])
+        run['duration'] = run_duration(run)
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError('The workflow_run has invalid timestamps')
+    return run
+
+
+def repository_names(repository):
+    """Return the owner and name of the repository of a payload, or None for the ones it does not have."""
+    repository = repository if isinstance(repository, dict) else {}
+    owner = repository.get('owner')
+    return owner.get('login') if isinstance(owner, dict) else None, repository.get('name')
+
+
+def write_file(path, content):
+    """Write content to path, replacing it in one step."""
+    temp_file = f'{path}.tmp'
+    with open(temp_file, 'w', newline='') as f:
+        f.write(content)
+    os.replace(temp_file, path)
+
+
+class WebhookStats:
+    """The stats of every workflow, updated one run at a time from the webhook events."""
+
+    def __init__(self, repository=None, workflow_names=None):
+        self.repository = repository
+        self.workflow_names_filter = set(workflow_names) if workflow_names is not None else None
+        self.aggregates = {name: Aggregate() for name in workflow_names or []}
+        # The runs that were counted, with the DEDUP_POLICY, or None if runs are not deduplicated
+        self.index = run_index()
+        # Runs created in the last RERUN_DAYS days that were counted, by run id and attempt, in order of arrival
+        self.recent_runs = {}
+        self.latest_created_at = None
+        self.changed = False
+        self.lock = threading.Lock()
+        # Serialises the writes of the stats and state files
+        self.flush_lock = threading.Lock()
+
+    def handle_event(self, event, payload):
+        """Add the run of a webhook event to the stats. Returns whether the run was added.
+
+        Raises ValueError if the payload of a completed `workflow_run` event is invalid.
+        """
+        if not isinstance(payload, dict):
+            raise ValueError('The payload is not an object')
+        if event != 'workflow_run' or payload.get('action') != 'completed':
+            return False
+        repository = payload.get('repository')
+        if self.repository:
+            owner, name = repository_names(repository)
+            if name is None:
+                raise ValueError('The payload has no repository name')
+            if not matches_repository(owner, name, [self.repository]):
+                return False
+        run = run_from_event(payload.get('workflow_run'), repository)
+        if self.workflow_names_filter is not None and run['name'] not in self.workflow_names_filter:
+            return False
+        with self.lock:
+            if self.index is not None:
+                if not self.index.keep(run):
+                    return False
+                if self.index.superseded:
+                    # An earlier attempt of the run was counted, which this attempt replaces
+                    self.index.superseded = False
+                    for attempt in range(1, (run['run_attempt'] or 1)):
+                        earlier_run = self.recent_runs.pop((run['id'], attempt), None)
+                        if earlier_run is not None:
+                            earlier = Aggregate()
+                            earlier.add(earlier_run)
+                            self.aggregate(earlier_run['name']).subtract(earlier)
+                self.add_recent_run(run)
+            self.aggregate(run['name']).add(run)
+            self.changed = True
+        return True
+
+    def aggregate(self, name):
+        if name not in self.aggregates:
+            self.aggregates[name] = Aggregate()
+        return self.aggregates[name]
+
+    def add_recent_run(self, run):
+        self.recent_runs[(run['id'], run['run_attempt'] or 1)] = {field: run.get(field) for field in RECENT_RUN_FIELDS}
+        if self.latest_created_at is None or run['created_at'] > self.latest_created_at:
+            self.latest_created_at = run['created_at']
+
+    def expire_recent_runs(self):
+        """Forget the runs created more than RERUN_DAYS days before the latest run, once a day of them has expired."""
+        if not self.recent_runs:
+            return
+        latest = parse_timestamp(self.latest_created_at)
+        oldest = parse_timestamp(next(iter(self.recent_runs.values()))['created_at'])
+        if oldest >= latest - timedelta(days=RERUN_DAYS + 1):
+            return
+        cutoff = latest - timedelta(days=RERUN_DAYS)
+        self.recent_runs = {key: run for key, run in self.recent_runs.items()
+                            if parse_timestamp(run['created_at']) >= cutoff}
+        self.index_recent_runs()
+
+    def index_recent_runs(self):
+        """Replace the index with an index of the recent runs only."""
+        self.index = run_index()
+        if self.index is not None:
+            for run in self.recent_runs.values():
+                self.index.keep(run)
+
+    def csv(self):
+        """Return the stats in the CSV format of `workflow-stats.csv`."""
+        f = io.StringIO()
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['workflow_name'] + STATS_COLUMNS)
+        with self.lock:
+            for workflow_name, aggregate in self.aggregates.items():
+                writer.writerow([workflow_name] + aggregate.row())
+        return f.getvalue()
+
+    def state(self):
+        """Return the state file contents, with the aggregates of every workflow and the recent runs."""
+        with self.lock:
+            self.expire_recent_runs()
+            return json_backend.dumps({
+                'version': STATE_VERSION,
+                'workflows': {name: aggregate.to_json() for name, aggregate in self.aggregates.items()},
+                'recent_runs': list(self.recent_runs.values()),
+            })
+
+    def load(self, state_file):
+        """Load the aggregates and the recent runs of a state file, if it exists."""
+        if not os.path.exists(state_file):
+            return
+        with open(state_file, 'r') as f:
+            data = json_backend.load(f)
+        if data.get('version') != STATE_VERSION:
+            raise ValueError(f'Unsupported state file version: {data.get("version")}')
+        with self.lock:
+            for name, aggregate in data['workflows'].items():
+                self.aggregate(name).merge(Aggregate.from_json(aggregate))
+            for run in data['recent_runs']:
+                self.add_recent_run(run)
+            self.index_recent_runs()
+
+    def flush(self, stats_file, state_file=None):
+        """Write the stats to stats_file, and the state to state_file, if new runs have arrived."""
+        with self.flush_lock:
+            with self.lock:
+                if not self.changed:
+                    return
+                self.changed = False
+            write_file(stats_file, self.csv())
+            if state_file:
+                write_file(state_file, self.state())
+
+
+def make_handler(stats, secret=None):
+    """Return the request handler class of a server that updates stats."""
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self.respond(400, 'Invalid Content-Length header\n')
+                return
+            body = self.rfile.read(length)
+            if secret and not verify_signature(secret, body, self.headers.get('X-Hub-Signature-256')):
+                self.respond(401, 'Invalid signature\n')
+                return
+            try:
+                payload = json_backend.loads(body)
+            except ValueError:
+                self.respond(400, 'Invalid JSON payload\n')
+                return
+            try:
+                added = stats.handle_event(self.headers.get('X-GitHub-Event'), payload)
+            except ValueError as e:
+                self.respond(400, f'Invalid workflow_run payload: {e}\n')
+                return
+            self.respond(202 if added else 200, 'Accepted\n' if added else 'Ignored\n')
+
+        def do_GET(self):
+            if self.path.split('?')[0] != '/stats':
+                self.respond(404, 'Not found\n')
+                return
+            self.respond(200, stats.csv(), 'text/csv')
+
+        def respond(self, status, text, content_type='text/plain'):
+            body = text.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return WebhookHandler
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Receive workflow_run webhook events and evaluate workflow stats.')
+    parser.add_argument('--port', type=int, default=int(os.getenv('WEBHOOK_PORT') or DEFAULT_PORT))
+    parser.add_argument('--stats-file', default=STATS_FILE)
+    parser.add_argument('--state-file', default=STATE_FILE)
+    parser.add_argument('--flush-interval', type=float, default=DEFAULT_FLUSH_INTERVAL)
+    args = parser.parse_args(argv)
+
+    workflow_names = None
+    if os.path.isfile(WORKFLOW_NAMES_FILE):
+        with open(WORKFLOW_NAMES_FILE, 'r') as f:
+            workflow_names = [name for name in f.read().splitlines() if name]
+    secret = os.getenv('WEBHOOK_SECRET')
+    if not secret:
+        print('  Warning: WEBHOOK_SECRET environment variable not set, signatures are not verified')
+
+    stats = WebhookStats(os.getenv('REPO_NAME'), workflow_names)
+    stats.load(args.state_file)
+    server = ThreadingHTTPServer(('', args.port), make_handler(stats, secret))
+
+    # Write the stats to the stats file periodically
+    stopped = threading.Event()
+
+    def flush_periodically():
+        while not stopped.wait(args.flush_interval):
+            stats.flush(args.stats_file, args.state_file)
+
+    flusher = threading.Thread(target=flush_periodically, daemon=True)
+    flusher.start()
+    print(f'  Listening for workflow_run events on port {server.server_address[1]}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopped.set()
+        server.server_close()
+        stats.flush(args.stats_file, args.state_file)
+        print(f'  Stats are written to {args.stats_file}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,199 @@
+"""
+window_comparison.py - Compare the stats of every workflow between two windows of days, from the aggregates of a
+state file, and flag statistically significant regressions.
+
+Usage:
+    python window_comparison.py <baseline_state> <current_state> [--baseline-window <first_day>:<last_day>]
+                                [--current-window <first_day>:<last_day>] [--alpha <alpha>] [--output <csv_file>]
+
+Requirements:
+    - Python 3.x
+
+Description:
+    Whether a workflow got slower or less reliable is answered by comparing its runs in a baseline window, e.g. last
+    month, with its runs in a current window, e.g. this month. The daily aggregates of a stats state file (see
+    `workflow_aggregates.py`) hold the number of runs of every distinct duration, so both windows are compared
+    exactly from the state, without retrieving or reading the runs again.
+
+    For every workflow, the comparison holds the number of runs, the median duration, the 95th percentile duration
+    (the duration of the run at rank ceil(0.95 * n) in order of duration) and the success rate in both windows, and
+    their deltas. Two tests tell whether a change is significant:
+
+        - The durations are compared with the Mann-Whitney U test, with the normal approximation corrected for the
+          ties of equal durations. The rank sums are calculated from the duration counts of the windows, in
+          O(D log D) time for D distinct durations, rather than from the runs.
+        - The success rates are compared with the two-proportion z-test.
+
+    A change is flagged as a regression when its two-sided p-value is below the significance level (0.05 by default,
+    set with `COMPARE_ALPHA`), and the durations of the current window are longer, or its success rate is lower.
+
+    The baseline and current states can be the same state file, compared between two of its windows, e.g. the
+    state of a `STATS_WINDOW_DAYS=60` sliding window, or the states of two periods. Without a window, every day of
+    the state is compared. `evaluate_workflow_runs.py` writes the comparison of the last `COMPARE_DAYS` days with the
+    `COMPARE_DAYS` days before them to `workflow-stats-comparison.csv`.
+
+Output:
+    - Workflow comparison in CSV, written to stdout or to the `--output` file, with the workflow name followed by the
+      columns of `COMPARISON_COLUMNS`.
+
+Example:
+    python window_comparison.py workflow-stats-state.json workflow-stats-state.json \\
+        --baseline-window 2023-07-01:2023-07-31 --current-window 2023-08-01:2023-08-31
+"""
+
+import argparse
+import csv
+import math
+import os
+import statistics
+import sys
+
+from datetime import date, timedelta
+
+from workflow_aggregates import AggregateState
+
+DEFAULT_ALPHA = 0.05
+
+COMPARISON_COLUMNS = [
+    'baseline_runs', 'current_runs',
+    'baseline_median_duration', 'current_median_duration', 'median_duration_delta',
+    'baseline_p95_duration', 'current_p95_duration', 'p95_duration_delta',
+    'baseline_success_rate', 'current_success_rate', 'success_rate_delta',
+    'duration_p_value', 'success_rate_p_value', 'regression',
+]
+
+
+def comparison_alpha():
+    """Return the significance level set in the `COMPARE_ALPHA` environment variable."""
+    return float(os.getenv('COMPARE_ALPHA') or DEFAULT_ALPHA)
+
+
+def parse_window(value):
+    """Parse a window of days, e.g. `2023-07-01:2023-07-31`, into its first and last day. Either can be empty."""
+    first_day, _, last_day = value.partition(':')
+    return first_day or None, last_day or None
+
+
+def recent_windows(state, days):
+    """Return the window of the last `days` days of a state, ending on the day of its latest run, and the window of
+    the `days` days before it, as the baseline and current windows."""
+    last_day = date.fromisoformat(state.latest_run_started_at[:10])
+    current_window = ((last_day - timedelta(days=days - 1)).isoformat(), last_day.isoformat())
+    baseline_window = ((last_day - timedelta(days=2 * days - 1)).isoformat(),
+                       (last_day - timedelta(days=days)).isoformat())
+    return baseline_window, current_window
+
+
+def _two_sided_p_value(z):
+    return 2 * (1 - statistics.NormalDist().cdf(abs(z)))
+
+
+def mann_whitney_test(baseline, current):
+    """Return the z-score and the two-sided p-value of the Mann-Whitney U test of the durations of two aggregates.
+
+    A positive z-score means that the durations of the current aggregate tend to be longer.
+    """
+    n1, n2 = baseline.total_runs, current.total_runs
+    n = n1 + n2
+    if n1 == 0 or n2 == 0:
+        return 0.0, 1.0
+    rank_sum = 0.0
+    tie_sum = 0
+    position = 0
+    for duration in sorted(set(baseline.durations) | set(current.durations)):
+        current_count = current.durations.get(duration, 0)
+        count = baseline.durations.get(duration, 0) + current_count
+        # Tied durations share the average of their ranks
+        rank_sum += current_count * (position + (count + 1) / 2)
+        tie_sum += count ** 3 - count
+        position += count
+    u = rank_sum - n2 * (n2 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_sum / (n * (n - 1)))
+    if variance <= 0:
+        return 0.0, 1.0
+    # Continuity correction towards the mean
+    z = (u - mean - math.copysign(0.5, u - mean)) / math.sqrt(variance) if u != mean else 0.0
+    return z, _two_sided_p_value(z)
+
+
+def proportion_test(baseline, current):
+    """Return the z-score and the two-sided p-value of the two-proportion z-test of the success rates."""
+    n1, n2 = baseline.total_runs, current.total_runs
+    if n1 == 0 or n2 == 0:
+        return 0.0, 1.0
+    pooled = (baseline.successes + current.successes) / (n1 + n2)
+    standard_error = math.sqrt(pooled * (1 - pooled) * (1 / n1 + 1 / n2))
+    if standard_error == 0:
+        return 0.0, 1.0
+    z = (current.successes / n2 - baseline.successes / n1) / standard_error
+    return z, _two_sided_p_value(z)
+
+
+def comparison_row(baseline, current, alpha=DEFAULT_ALPHA):
+    """Return the comparison columns of the aggregates of a workflow in the baseline and current windows."""
+    if baseline.total_runs == 0 or current.total_runs == 0:
+        # A window without any run has no stats to compare
+        return [baseline.total_runs, current.total_runs] + [''] * (len(COMPARISON_COLUMNS) - 2)
+    row = [baseline.total_runs, current.total_runs]
+    for baseline_value, current_value in [(baseline.median(), current.median()),
+                                          (baseline.quantile(0.95), current.quantile(0.95)),
+                                          (baseline.successes / baseline.total_runs * 100,
+                                           current.successes / current.total_runs * 100)]:
+        row += [f'{baseline_value:.2f}', f'{current_value:.2f}', f'{current_value - baseline_value:.2f}']
+
+    duration_z, duration_p_value = mann_whitney_test(baseline, current)
+    success_z, success_p_value = proportion_test(baseline, current)
+    regressions = []
+    if duration_p_value < alpha and duration_z > 0:
+        regressions.append('duration')
+    if success_p_value < alpha and success_z < 0:
+        regressions.append('success_rate')
+    return row + [f'{duration_p_value:.4f}', f'{success_p_value:.4f}', ';'.join(regressions)]
+
+
+def compare_states(baseline_state, current_state, baseline_window=(None, None), current_window=(None, None),
+                   alpha=DEFAULT_ALPHA, workflow_names=None):
+    """Return the comparison rows of every workflow between a window of a baseline state and of a current state.
+
+    The states can be the same state, compared between two of its windows.
+    """
+    if workflow_names is None:
+        workflow_names = list(baseline_state.workflows)
+        workflow_names += [name for name in current_state.workflows if name not in baseline_state.workflows]
+    rows = []
+    for name in workflow_names:
+        baseline = baseline_state.window_aggregate(name, *baseline_window)
+        current = current_state.window_aggregate(name, *current_window)
+        rows.append([name] + comparison_row(baseline, current, alpha))
+    return rows
+
+
+def write_comparison(rows, f):
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(['workflow_name'] + COMPARISON_COLUMNS)
+    writer.writerows(rows)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Compare the workflow statistics of two windows of stats states.')
+    parser.add_argument('baseline_state')
+    parser.add_argument('current_state')
+    parser.add_argument('--baseline-window', default=':', help='First and last day of the baseline window, e.g. '
+                        '2023-07-01:2023-07-31')
+    parser.add_argument('--current-window', default=':', help='First and last day of the current window')
+    parser.add_argument('--alpha', type=float, default=comparison_alpha(), help='Significance level')
+    parser.add_argument('--output', help='CSV file to write the comparison to, instead of stdout')
+    args = parser.parse_args(argv)
+
+    rows = compare_states(AggregateState.load(args.baseline_state), AggregateState.load(args.current_state),
+                          parse_window(args.baseline_window), parse_window(args.current_window), args.alpha)
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            write_comparison(rows, f)
+    else:
+        write_comparison(rows, sys.stdout)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
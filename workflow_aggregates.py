@@ -0,0 +1,385 @@
+"""
+workflow_aggregates.py - Mergeable per-workflow aggregates, so that the stats are updated without re-reading every run.
+
+Usage:
+    python workflow_aggregates.py merge <state_file> <state_file> ... --output <state_file>
+    python workflow_aggregates.py stats <state_file> [--output <csv_file>]
+
+Requirements:
+    - Python 3.x
+
+Description:
+    The stats of `workflow-stats.csv` are normally evaluated from every run in the date range. This module keeps
+    the aggregates of every workflow in a state file instead, so that new runs are folded into the previous state and
+    only the new runs have to be read.
+
+    The aggregates of a workflow are kept per day, by the date of `run_started_at`. The aggregate of a day holds:
+
+        - total_runs: The number of runs.
+        - successes: The number of successful or skipped runs.
+        - durations: The number of runs of every distinct duration, which is the quantile summary of the day.
+        - billable_ms: The billable milliseconds of the runs on each runner OS, if `BILLABLE_TIMING` is set.
+
+    Durations are whole seconds, as the timestamps of the GitHub API are, so the number of distinct durations is
+    small and the summary is exact: the sum of the durations, the average and the median are calculated from it
+    exactly as `evaluate_workflow_runs.py` calculates them from the list of durations.
+
+    Aggregates are merged by adding their counts, and subtracted by removing them, so that:
+
+        - New runs are folded into the state once they are completed, as the duration and the conclusion of a run
+          in progress are not final. The state records the latest `updated_at` of the runs it holds, and runs that
+          were updated at or before it are skipped, so that overlapping runs files are not counted twice. A run
+          that was in progress when the state was folded completes later than that, so it is folded once completed.
+        - A re-run of a run that was folded completes later than the state as well, as its next `run_attempt`. The
+          state keeps the repository, id and attempt of the runs created in the last `RERUN_DAYS` days before the
+          latest run, with their conclusion and duration, so that the attempt the re-run supersedes is subtracted
+          before it is folded, as the `latest` policy of `DEDUP_POLICY` only keeps the latest attempt of every run
+          (see `run_dedup.py`). With the `all` and `off` policies, every attempt is folded.
+        - The days older than a sliding window of days, ending on the day of the latest run, are expired, and
+          subtracted from the aggregate of the workflow.
+        - Two states, e.g. of two shards or two periods, are merged into one.
+
+    The aggregate of every workflow over all of its days is kept up to date as days are folded, expired and merged,
+    so the cost of updating a state is proportional to the number of new runs and expired days, and the cost of
+    evaluating the stats to the number of distinct durations, rather than to the number of runs in the window.
+
+Output:
+    - `merge`: The merged state file.
+    - `stats`: Workflow statistics in CSV, written to stdout or to the `--output` file.
+
+Example:
+    python workflow_aggregates.py merge shard-0-state.json shard-1-state.json --output workflow-stats-state.json
+    python workflow_aggregates.py stats workflow-stats-state.json --output workflow-stats.csv
+"""
+
+import argparse
+import csv
+import math
+import os
+import sys
+
+from datetime import date, timedelta
+from fractions import Fraction
+
+import json_backend
+from run_dedup import LATEST
+from workflow_stats import BILLABLE_FIELDS, BillableTime, is_successful, stats_columns, stats_row
+
+STATE_VERSION = 1
+
+# Days after its creation that a workflow run can be re-run
+RERUN_DAYS = 30
+
+# Fields of the recent runs kept in the state file, to subtract the attempts that re-runs supersede
+RECENT_RUN_FIELDS = ['owner_name', 'repository_name', 'id', 'run_attempt', 'name', 'run_started_at', 'created_at',
+                     'conclusion', 'duration']
+
+
+def run_key(run):
+    """Return the repository and id of a run, or None if it has no id."""
+    if run.get('id') is None:
+        return None
+    return run.get('owner_name'), run.get('repository_name'), run['id']
+
+
+class Aggregate:
+    """The counts and duration summary of a group of runs, which can be merged with and subtracted from another."""
+
+    def __init__(self, total_runs=0, successes=0, durations=None, billable_ms=None):
+        self.total_runs = total_runs
+        self.successes = successes
+        self.durations = dict(durations or {})
+        self.billable = BillableTime(billable_ms)
+
+    def add(self, run):
+        self.total_runs += 1
+        if is_successful(run):
+            self.successes += 1
+        self.durations[run['duration']] = self.durations.get(run['duration'], 0) + 1
+        self.billable.add(run)
+
+    def merge(self, other):
+        self.total_runs += other.total_runs
+        self.successes += other.successes
+        for duration, count in other.durations.items():
+            self.durations[duration] = self.durations.get(duration, 0) + count
+        self.billable.merge(other.billable)
+
+    def subtract(self, other):
+        self.total_runs -= other.total_runs
+        self.successes -= other.successes
+        for duration, count in other.durations.items():
+            remaining = self.durations.get(duration, 0) - count
+            if remaining > 0:
+                self.durations[duration] = remaining
+            else:
+                self.durations.pop(duration, None)
+        self.billable.subtract(other.billable)
+
+    @property
+    def duration_sum(self):
+        return sum(Fraction(duration) * count for duration, count in self.durations.items())
+
+    def median(self):
+        """Return the median duration, as `statistics.median` returns it for the list of durations."""
+        middle = [(self.total_runs - 1) // 2, self.total_runs // 2]
+        values = []
+        position = 0
+        for duration in sorted(self.durations):
+            count = self.durations[duration]
+            while middle and middle[0] < position + count:
+                values.append(duration)
+                middle.pop(0)
+            position += count
+        return values[0] if values[0] == values[1] else (values[0] + values[1]) / 2
+
+    def quantile(self, q):
+        """Return the duration at rank ceil(q * total_runs) in order of duration, e.g. the 95th percentile for 0.95."""
+        rank = max(1, math.ceil(q * self.total_runs))
+        position = 0
+        for duration in sorted(self.durations):
+            position += self.durations[duration]
+            if position >= rank:
+                return duration
+        return None
+
+    def row(self):
+        """Return the stats columns, formatted as in `workflow-stats.csv`."""
+        if self.total_runs == 0:
+            return ['0.00', '0.00', '0.00', 0]
+        return [
+            f'{float(self.duration_sum / self.total_runs):.2f}',
+            f'{self.median():.2f}',
+            f'{self.successes / self.total_runs * 100:.2f}',
+            self.total_runs,
+        ]
+
+    def to_json(self):
+        data = {
+            'total_runs': self.total_runs,
+            'successes': self.successes,
+            'durations': [[duration, count] for duration, count in sorted(self.durations.items())],
+        }
+        # The billable time is only kept when it is retrieved, and is missing from the states of earlier versions
+        if any(self.billable.billable_ms.values()):
+            data['billable_ms'] = self.billable.billable_ms
+        return data
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data['total_runs'], data['successes'], {duration: count for duration, count in data['durations']},
+                   data.get('billable_ms'))
+
+
+class AggregateState:
+    """The daily aggregates of every workflow, and the latest run they hold."""
+
+    def __init__(self, policy=LATEST):
+        # Whether the attempt that a re-run supersedes is subtracted, with the `latest` policy of DEDUP_POLICY
+        self.replace_attempts = policy == LATEST
+        self.workflows = {}
+        # Aggregate of every day of a workflow, kept up to date as days are folded, expired and merged
+        self.totals = {}
+        self.latest_run_started_at = None
+        self.latest_run_updated_at = None
+        # Runs that were updated at or before this timestamp were folded into the state before it was loaded
+        self.folded_until = None
+        # Runs created in the last RERUN_DAYS days that were folded, by repository and run id
+        self.recent_runs = {}
+
+    def fold(self, run):
+        """Add a completed run to the aggregate of its workflow and day. Returns whether the run is newer than the
+        state."""
+        if run.get('status') not in [None, 'completed']:
+            return False
+        started_at = run['run_started_at']
+        updated_at = run.get('updated_at') or started_at
+        if self.folded_until is not None and updated_at <= self.folded_until:
+            return False
+        key = run_key(run) if self.replace_attempts else None
+        if key is not None:
+            earlier_run = self.recent_runs.get(key)
+            if earlier_run is not None:
+                if (earlier_run['run_attempt'] or 1) >= (run.get('run_attempt') or 1):
+                    return False
+                # The re-run supersedes the attempt that was folded
+                self.unfold(earlier_run)
+            self.recent_runs[key] = recent_run(run)
+        days = self.workflows.setdefault(run['name'], {})
+        day = started_at[:10]
+        if day not in days:
+            days[day] = Aggregate()
+        days[day].add(run)
+        self.aggregate(run['name']).add(run)
+        if self.latest_run_started_at is None or started_at > self.latest_run_started_at:
+            self.latest_run_started_at = started_at
+        if self.latest_run_updated_at is None or updated_at > self.latest_run_updated_at:
+            self.latest_run_updated_at = updated_at
+        return True
+
+    def unfold(self, run):
+        """Subtract a folded run from the aggregate of its workflow and day, unless the day has expired."""
+        day_aggregate = self.workflows.get(run['name'], {}).get(run['run_started_at'][:10])
+        if day_aggregate is None:
+            return
+        aggregate = Aggregate()
+        aggregate.add(run)
+        day_aggregate.subtract(aggregate)
+        self.totals[run['name']].subtract(aggregate)
+        if day_aggregate.total_runs == 0:
+            days = self.workflows[run['name']]
+            del days[run['run_started_at'][:10]]
+            if not days:
+                del self.workflows[run['name']]
+                del self.totals[run['name']]
+
+    def expire_recent_runs(self):
+        """Forget the runs created more than RERUN_DAYS days before the day of the latest run."""
+        if self.latest_run_started_at is None:
+            return
+        first_day = (date.fromisoformat(self.latest_run_started_at[:10]) - timedelta(days=RERUN_DAYS)).isoformat()
+        self.recent_runs = {key: run for key, run in self.recent_runs.items()
+                            if (run['created_at'] or run['run_started_at']) >= first_day}
+
+    def fold_runs(self, runs):
+        """Fold every run that is newer than the state. Returns the number of runs folded."""
+        return sum(1 for run in runs if self.fold(run))
+
+    def expire(self, window_days):
+        """Remove the days before the sliding window of window_days days, ending on the day of the latest run."""
+        if self.latest_run_started_at is None:
+            return
+        first_day = (date.fromisoformat(self.latest_run_started_at[:10]) - timedelta(days=window_days - 1)).isoformat()
+        for name in list(self.workflows):
+            days = self.workflows[name]
+            for day in [day for day in days if day < first_day]:
+                self.totals[name].subtract(days.pop(day))
+            if not days:
+                del self.workflows[name]
+                del self.totals[name]
+
+    def merge(self, other):
+        """Add the aggregates of another state, e.g. of another shard or period."""
+        for name, other_days in other.workflows.items():
+            days = self.workflows.setdefault(name, {})
+            for day, aggregate in other_days.items():
+                if day not in days:
+                    days[day] = Aggregate()
+                days[day].merge(aggregate)
+                self.aggregate(name).merge(aggregate)
+        for key, run in other.recent_runs.items():
+            earlier_run = self.recent_runs.get(key)
+            if earlier_run is not None:
+                # The run was folded into both states, so the earlier attempt, or one of the same attempts, is
+                # subtracted
+                if (earlier_run['run_attempt'] or 1) > (run['run_attempt'] or 1):
+                    run, earlier_run = earlier_run, run
+                self.unfold(earlier_run)
+            self.recent_runs[key] = run
+        if other.latest_run_started_at is not None and (
+                self.latest_run_started_at is None or other.latest_run_started_at > self.latest_run_started_at):
+            self.latest_run_started_at = other.latest_run_started_at
+        if other.latest_run_updated_at is not None and (
+                self.latest_run_updated_at is None or other.latest_run_updated_at > self.latest_run_updated_at):
+            self.latest_run_updated_at = other.latest_run_updated_at
+        self.folded_until = self.latest_run_updated_at
+
+    def aggregate(self, name):
+        """Return the aggregate of every day of a workflow."""
+        if name not in self.totals:
+            self.totals[name] = Aggregate()
+        return self.totals[name]
+
+    def window_aggregate(self, name, first_day=None, last_day=None):
+        """Return the aggregate of a workflow over the days from first_day to last_day, inclusive, or open if None."""
+        if first_day is None and last_day is None:
+            return self.aggregate(name) if name in self.workflows else Aggregate()
+        aggregate = Aggregate()
+        for day, day_aggregate in self.workflows.get(name, {}).items():
+            if (first_day is None or day >= first_day) and (last_day is None or day <= last_day):
+                aggregate.merge(day_aggregate)
+        return aggregate
+
+    def save(self, path):
+        self.expire_recent_runs()
+        data = {
+            'version': STATE_VERSION,
+            'latest_run_started_at': self.latest_run_started_at,
+            'latest_run_updated_at': self.latest_run_updated_at,
+            'workflows': {
+                name: {day: aggregate.to_json() for day, aggregate in sorted(days.items())}
+                for name, days in self.workflows.items()
+            },
+            'recent_runs': list(self.recent_runs.values()),
+        }
+        temp_file = f'{path}.tmp'
+        with open(temp_file, 'w') as f:
+            f.write(json_backend.dumps(data))
+        os.replace(temp_file, path)
+
+    @classmethod
+    def load(cls, path, policy=LATEST):
+        """Load a state file, or return an empty state if it does not exist."""
+        state = cls(policy)
+        if not os.path.exists(path):
+            return state
+        with open(path, 'r') as f:
+            data = json_backend.load(f)
+        if data.get('version') != STATE_VERSION:
+            raise ValueError(f'Unsupported state file version: {data.get("version")}')
+        state.latest_run_started_at = data['latest_run_started_at']
+        # The states of earlier versions only record the latest run_started_at
+        state.latest_run_updated_at = data.get('latest_run_updated_at', state.latest_run_started_at)
+        state.folded_until = state.latest_run_updated_at
+        for name, days in data['workflows'].items():
+            state.workflows[name] = {day: Aggregate.from_json(aggregate) for day, aggregate in days.items()}
+            for aggregate in state.workflows[name].values():
+                state.aggregate(name).merge(aggregate)
+        # The states of earlier versions do not keep the recent runs
+        for run in data.get('recent_runs', []):
+            state.recent_runs[run_key(run)] = run
+        return state
+
+
+def recent_run(run):
+    """Return the fields of a run kept in the recent runs of a state, with its billable time if it has any."""
+    fields = RECENT_RUN_FIELDS + [field for field in BILLABLE_FIELDS if run.get(field)]
+    return {field: run.get(field) for field in fields}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Merge workflow aggregate states and evaluate their stats.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    merge_parser = subparsers.add_parser('merge', help='Merge state files into one')
+    merge_parser.add_argument('state_files', nargs='+')
+    merge_parser.add_argument('--output', required=True)
+
+    stats_parser = subparsers.add_parser('stats', help='Evaluate the workflow statistics of a state file')
+    stats_parser.add_argument('state_file')
+    stats_parser.add_argument('--output', help='CSV file to write the stats to, instead of stdout')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'merge':
+        state = AggregateState()
+        for state_file in args.state_files:
+            state.merge(AggregateState.load(state_file))
+        state.save(args.output)
+        print(f'  Merged {len(args.state_files)} state files into {args.output}')
+        return
+
+    state = AggregateState.load(args.state_file)
+    f = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['workflow_name'] + stats_columns())
+        for name in state.workflows:
+            writer.writerow([name] + stats_row(state.aggregate(name)))
+    finally:
+        if args.output:
+            f.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
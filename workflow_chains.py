@@ -0,0 +1,218 @@
+"""
+workflow_chains.py - Reconstruct the chains of workflows triggered by `workflow_run` events, and evaluate their lead
+time.
+
+Usage:
+    python workflow_chains.py <runs_file> [--output <csv_file>]
+
+Requirements:
+    - Python 3.x
+
+Description:
+    Delivery often goes through a chain of workflows: a push runs CI, the completion of CI triggers a build with a
+    `workflow_run` event, and the completion of the build triggers a deploy. The stats of every workflow do not tell
+    the lead time of the whole chain, from the push to the end of the deploy.
+
+    The runs API does not return the run that triggered a `workflow_run` run, but a triggered run has the `head_sha`
+    of the run that triggered it, and is created once that run completes. When the `WORKFLOW_CHAINS` environment
+    variable is set, `get_workflow_runs.py` also retrieves the `head_sha` of every run, and the runs are linked as
+    follows:
+
+        - The runs are indexed in a hash table by repository and `head_sha`, and the runs of every `head_sha` are
+          sorted by their `updated_at`.
+        - The parent of a `workflow_run` run is the run of another workflow with the same `head_sha` that completed
+          last before the run was created, found by a binary search.
+        - A run of any other event starts a chain. `workflow_run` runs whose parent is not in the runs, e.g. before
+          the date range, are left out.
+
+    This takes O(N log N) time for N runs, as every run is only compared with the runs of its own commit. The runs are
+    kept in compact arrays of their times and workflow codes, rather than as dicts.
+
+    The lead time of a chain is the time from the creation of its first run to the completion of its last run. The
+    critical path of a chain is the path of triggered runs that ends last, and every run on it adds the time from the
+    completion of its parent (or its own creation, for the first run) to its own completion. Chains are grouped by
+    the workflows of their critical path, e.g. `CI > Build > Deploy`, and for every group, the critical workflow is
+    the workflow that adds the most time to the critical paths of the group.
+
+    `evaluate_workflow_runs.py` evaluates the chains of the runs file when `WORKFLOW_CHAINS` is set.
+
+Output:
+    - `workflow-chains.csv` with a row for every critical path of chains of two or more runs, with the columns:
+        - chain: The workflows of the critical path, separated by ` > `.
+        - chains: The number of chains.
+        - lead_time_p50, lead_time_p90, lead_time_p95, lead_time_max: The percentiles of the lead time of the chains,
+          in seconds, at rank ceil(q * n).
+        - critical_workflow: The workflow that adds the most time to the critical paths.
+        - critical_workflow_share: The percentage of the lead time added by the critical workflow.
+
+Example:
+    python workflow_chains.py org-runs.json --output workflow-chains.csv
+"""
+
+import argparse
+import array
+import bisect
+import csv
+import math
+import os
+import sys
+
+from workflow_runs_io import iter_runs
+from workflow_stats import parse_timestamp
+
+CHAINS_FILE = 'workflow-chains.csv'
+
+# Run fields that link the runs of a chain
+CHAIN_FIELDS = {'name', 'event', 'head_sha', 'created_at', 'updated_at', 'owner_name', 'repository_name'}
+
+CHAIN_COLUMNS = ['chain', 'chains', 'lead_time_p50', 'lead_time_p90', 'lead_time_p95', 'lead_time_max',
+                 'critical_workflow', 'critical_workflow_share']
+
+TRIGGER_EVENT = 'workflow_run'
+
+# Separator of the workflows of a critical path
+PATH_SEPARATOR = ' > '
+
+
+def workflow_chains():
+    """Return whether the workflow chains are evaluated, as set in `WORKFLOW_CHAINS`."""
+    return os.getenv('WORKFLOW_CHAINS', '').lower() in ['1', 'true', 'yes']
+
+
+def nearest_rank(sorted_values, q):
+    """Return the value at rank ceil(q * n) of sorted values."""
+    return sorted_values[max(1, math.ceil(q * len(sorted_values))) - 1]
+
+
+class ChainIndex:
+    """The runs of every commit, in parallel arrays of their creation and completion times, workflow codes and
+    whether they were triggered by a `workflow_run` event."""
+
+    def __init__(self):
+        self.created = array.array('q')
+        self.updated = array.array('q')
+        self.workflows = array.array('i')
+        self.triggered = bytearray()
+        self.workflow_names = []
+        self.workflow_codes = {}
+        # Indices of the runs of every (owner, repository, head_sha)
+        self.commits = {}
+
+    def __len__(self):
+        return len(self.created)
+
+    def add(self, run):
+        head_sha, created_at, updated_at = run.get('head_sha'), run.get('created_at'), run.get('updated_at')
+        if not head_sha or not created_at or not updated_at:
+            return
+        code = self.workflow_codes.get(run['name'])
+        if code is None:
+            code = self.workflow_codes[run['name']] = len(self.workflow_names)
+            self.workflow_names.append(run['name'])
+        key = (run.get('owner_name'), run.get('repository_name'), head_sha)
+        runs = self.commits.get(key)
+        if runs is None:
+            runs = self.commits[key] = []
+        runs.append(len(self.created))
+        created = int(parse_timestamp(created_at).timestamp())
+        self.created.append(created)
+        self.updated.append(max(created, int(parse_timestamp(updated_at).timestamp())))
+        self.workflows.append(code)
+        self.triggered.append(run.get('event') == TRIGGER_EVENT)
+
+    def link(self):
+        """Return the index of the parent of every run, -1 for the first run of a chain, or -2 for a triggered run
+        whose parent is not in the runs."""
+        created, updated, workflows, triggered = self.created, self.updated, self.workflows, self.triggered
+        parents = array.array('q', [-1]) * len(created)
+        for runs in self.commits.values():
+            if not any(triggered[run] for run in runs):
+                continue
+            # Runs that complete in the same second are ordered by creation, so that a run that completes in the
+            # second it is created comes after its parent
+            runs.sort(key=lambda run: (updated[run], created[run]))
+            completions = [updated[run] for run in runs]
+            for index, run in enumerate(runs):
+                if not triggered[run]:
+                    continue
+                parents[run] = -2
+                # The runs of the commit that completed before the run was created, and come before it in order, so
+                # that two runs are never the parent of each other, latest first
+                position = min(bisect.bisect_right(completions, created[run]), index) - 1
+                while position >= 0:
+                    candidate = runs[position]
+                    if workflows[candidate] != workflows[run]:
+                        parents[run] = candidate
+                        break
+                    position -= 1
+        return parents
+
+    def chains(self):
+        """Yield the critical path of every chain of two or more runs, as its lead time and the runs on the path with
+        the time they add."""
+        created, updated = self.created, self.updated
+        parents = self.link()
+        # Every run completes after its parent, or in the same second and created after it, so in order of completion
+        # and creation, latest first, the runs that a run triggers are visited before it, and the end of its chain is
+        # final when it is propagated to its parent
+        ends = array.array('q', updated)
+        next_runs = array.array('q', [-1]) * len(created)
+        for run in sorted(range(len(created)), key=lambda run: (updated[run], created[run]), reverse=True):
+            parent = parents[run]
+            if parent >= 0 and (next_runs[parent] < 0 or ends[run] > ends[parent]):
+                ends[parent] = max(ends[parent], ends[run])
+                next_runs[parent] = run
+        for root in range(len(created)):
+            if parents[root] != -1 or next_runs[root] < 0:
+                continue
+            path = [(root, updated[root] - created[root])]
+            run = next_runs[root]
+            while run >= 0:
+                path.append((run, updated[run] - updated[path[-1][0]]))
+                run = next_runs[run]
+            yield ends[root] - created[root], path
+
+    def rows(self):
+        """Return the rows of `workflow-chains.csv`, most chains first."""
+        groups = {}
+        for lead_time, path in self.chains():
+            signature = tuple(self.workflows[run] for run, _ in path)
+            group = groups.get(signature)
+            if group is None:
+                group = groups[signature] = ([], {})
+            group[0].append(lead_time)
+            for run, seconds in path:
+                group[1][self.workflows[run]] = group[1].get(self.workflows[run], 0) + seconds
+        rows = []
+        for signature, (lead_times, added_times) in sorted(groups.items(), key=lambda item: -len(item[1][0])):
+            lead_times.sort()
+            critical_workflow = max(added_times, key=added_times.get)
+            total = sum(lead_times)
+            rows.append([PATH_SEPARATOR.join(self.workflow_names[code] for code in signature), len(lead_times)]
+                        + [nearest_rank(lead_times, q) for q in [0.5, 0.9, 0.95, 1]]
+                        + [self.workflow_names[critical_workflow],
+                           f'{added_times[critical_workflow] / total * 100 if total else 0:.2f}'])
+        return rows
+
+    def write(self, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(CHAIN_COLUMNS)
+            writer.writerows(self.rows())
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Evaluate the lead time of the workflow chains of a runs file.')
+    parser.add_argument('runs_file')
+    parser.add_argument('--output', default=CHAINS_FILE, help='CSV file to write the chains to')
+    args = parser.parse_args(argv)
+
+    index = ChainIndex()
+    for run in iter_runs(args.runs_file, CHAIN_FIELDS):
+        index.add(run)
+    index.write(args.output)
+    print(f'  Info: The workflow chains of {len(index)} workflow runs are written to {args.output}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -7,11 +7,57 @@ each workflow.
 
 The following environment variables must be set:
 
-- OWNER_NAME: The name of the repository owner (e.g. "myorg").
+- GH_TOKEN: A GitHub token with `repo` scope, or GH_TOKENS: A pool of tokens separated by commas or whitespace. Requests
+  are routed to the token with the most remaining quota.
+- OWNER_NAME: The name of the repository owner (e.g. "myorg"), or the names of several orgs separated by commas
+  (e.g. "myorg1,myorg2"). The repositories of every org are collected through a single work queue, and the org
+  output files get an `owner_name` column.
 - START_DATE: The start date of the date range in ISO format (e.g. "2022-01-01").
 - END_DATE: The end date of the date range in ISO format (e.g. "2022-01-31").
 - REPO_NAME: Optional - The name of the repository (e.g. "myrepo").
 - DELAY_BETWEEN_QUERY: Optional - The number of seconds to wait between queries to the GitHub API. 
+- GROUP_BY: Optional - Additional groupings to evaluate, e.g. "head_branch;event;name,run_attempt".
+- RUNS_DB: Optional - The path of a SQLite database to load the workflow runs into (e.g. "workflow-runs.db").
+- SHARD_COUNT and SHARD_INDEX: Optional - Only collect the repositories of the org in shard SHARD_INDEX (0-based) of
+  SHARD_COUNT shards, and write the output files with a `-shard-<index>` suffix.
+- REPO_CONCURRENCY: Optional - The number of repositories to fetch concurrently. Defaults to 1.
+- PIPELINE_DEPTH: Optional - The number of repositories that can wait to be evaluated, and to be written to the org
+  files, while the next repositories are fetched. Defaults to 2.
+- DRY_RUN: Optional - Set to "true" to print the estimated API calls and duration for every repository of the org,
+  scheduled largest first, without collecting any runs.
+- API_BUDGET: Optional - The maximum number of API calls the collection of the org may use. Defaults to the remaining
+  rate limit of the token when TIME_BUDGET is set.
+- TIME_BUDGET: Optional - The maximum number of seconds the collection of the org may take.
+- BUDGET_POLICY: Optional - `refuse` (default) to collect nothing when the estimated cost exceeds the budget, or
+  `trim` to skip the repositories that do not fit.
+- SAMPLE_PRECISION, SAMPLE_MODE, SAMPLE_CONFIDENCE and SAMPLE_SEED: Optional - Only retrieve a sample of the pages of
+  runs of every repository, sized for the target precision of the success rate, and estimate the stats with
+  confidence intervals.
+- STATS_STATE and STATS_WINDOW_DAYS: Optional - Fold the runs of the repository into the stats state file STATS_STATE,
+  expiring the days before a sliding window of STATS_WINDOW_DAYS days, and evaluate the stats from the state.
+- COMPARE_DAYS and COMPARE_ALPHA: Optional - With STATS_STATE, compare the stats of the last COMPARE_DAYS days of the
+  state with the COMPARE_DAYS days before them, and flag the regressions that are significant at COMPARE_ALPHA (0.05
+  by default) in `workflow-stats-comparison.csv`.
+- BILLABLE_TIMING and TIMING_CACHE_DIR: Optional - Set BILLABLE_TIMING to "true" to retrieve the billable time of
+  every run on each runner OS, and add it per workflow to the stats. The timing of completed runs is cached in
+  TIMING_CACHE_DIR (`timing-cache` by default), so that only new runs cost API calls.
+- ARCHIVE_DIR: Optional - Also write the runs of every repository into an archive partitioned by repository and month,
+  e.g. `archive/<owner>/<repo>/2023-07.ndjson.gz`, which `evaluate_workflow_runs.py` can query for any date range.
+- EVALUATION_CACHE_DIR and FORCE_EVALUATION: Optional - Keep the stats files of the repositories of an org in
+  EVALUATION_CACHE_DIR, by the digest of their runs and evaluation settings, and reuse them for the repositories whose
+  runs have not changed instead of evaluating them again. Set FORCE_EVALUATION to "true" to evaluate every repository.
+- WORKFLOW_CHAINS: Optional - Set to "true" to also retrieve the `head_sha` of every run, and evaluate the lead time
+  of the chains of workflows triggered by `workflow_run` events into `workflow-chains.csv`.
+- CONCURRENCY_TIMELINE and CONCURRENCY_INTERVAL: Optional - Set CONCURRENCY_TIMELINE to "true" to evaluate the
+  number of runs executing at once per workflow, with a time series of every CONCURRENCY_INTERVAL seconds (3600 by
+  default). For an org, the concurrency over every repository is written to `org-wide-workflow-concurrency*.csv`.
+- PROFILE, PROFILE_DIR and PROFILE_INTERVAL: Optional - Set PROFILE to "1" to profile this script and every script
+  it runs with cProfile and tracemalloc, or to "sample" to sample their stacks every PROFILE_INTERVAL seconds, and
+  write the profiles to PROFILE_DIR (`profile` by default).
+- MERGE_SHARDS: Optional - The number of shards to merge into the org output files, instead of collecting runs.
+- FETCH_CONCURRENCY: Optional - The maximum number of concurrent requests to the GitHub API per repository.
+- OUTPUT_COMPRESSION: Optional - `gzip` or `zstd` to write the runs files as compressed newline-delimited JSON (e.g.
+  `org-runs.ndjson.gz`), and to compress the stats files (e.g. `org-workflow-stats.csv.gz`).
 
 The script uses the following external tools:
 
@@ -22,23 +68,103 @@ The script outputs the following files:
 
 - `runs.json`: Workflow runs in JSON, or `org-runs.json`: Workflow runs in JSON for every repo in the org.
 - `workflow-stats.csv`: Workflow statistics in CSV, or `org-workflow-stats.csv`: Workflow statistics in CSV for every repo in the org.
+- `workflow-stats-by-<fields>.csv` or `org-workflow-stats-by-<fields>.csv`: Workflow statistics in CSV for every
+  additional grouping in the `GROUP_BY` environment variable.
+- `workflow-top-runs.csv` or `org-workflow-top-runs.csv`: The slowest and most retried runs of every workflow, if the
+  `TOP_K` environment variable is set.
+- `workflow-stats-estimates.csv` or `org-workflow-stats-estimates.csv`: Estimates of the stats with confidence
+  intervals, if the `SAMPLE_PRECISION` environment variable is set.
+- `workflow-chains.csv` or `org-workflow-chains.csv`: The lead time of the chains of workflows triggered by
+  `workflow_run` events, if the `WORKFLOW_CHAINS` environment variable is set.
+- `workflow-concurrency*.csv` or `org-workflow-concurrency*.csv`: The concurrency of the runs of every workflow, if the
+  `CONCURRENCY_TIMELINE` environment variable is set, and `org-wide-workflow-concurrency*.csv` over every repository.
+- The SQLite database at `RUNS_DB`, if set, which can be queried with `workflow_runs_db.py`.
+
+The output files of the shards are merged with `org_shards.py`.
 
 Usage: python workflow_metrics.py
 """
 
 import os
+import glob
+import itertools
+import queue
+import re
+import shutil
 import subprocess
+import threading
 import time
-import json
+import sys
+
+from datetime import datetime
+
+from github_api import environment_tokens, gh_api, token_pool
+from org_plan import apply_budget, plan_repos, print_plan, remaining_rate_limit
+from org_shards import merge_shards, shard_file, shard_of
+from profiling import start_profiling
+from evaluation_cache import EvaluationCache, evaluation_cache_dir, force_evaluation, runs_digest
+from run_archive import archive_dir
+from run_concurrency import concurrency_timeline
+from run_timing import timing_cache_dir
+from workflow_stats import billable_timing, stats_columns
+from workflow_runs_io import RunsWriter, compress_file, iter_runs, output_compression, runs_file_name
+
+# Profile this process, and every stage it runs as a child process, if PROFILE is set (see profiling.py)
+start_profiling('workflow_metrics')
+
+compression = output_compression()
+runs_file = runs_file_name('runs', compression)
+org_runs_base_file = runs_file_name('org-runs', compression)
+
+# Working directory of the repositories in the pipeline
+WORK_DIR = '.workflow-metrics'
+
+
+def extra_stats_files(prefix=''):
+    """Return the stats files of the additional groupings, the top runs, the estimates, the window comparison, the
+    concurrency and the workflow chains, e.g. with prefix `org-`."""
+    return (glob.glob(f'{prefix}workflow-stats-by-*.csv') + glob.glob(f'{prefix}workflow-top-runs.csv')
+            + glob.glob(f'{prefix}workflow-stats-estimates.csv') + glob.glob(f'{prefix}workflow-stats-comparison.csv')
+            + glob.glob(f'{prefix}workflow-concurrency*.csv') + glob.glob(f'{prefix}workflow-chains.csv'))
+
+
+def evaluate_org_concurrency(runs_file):
+    """Evaluate the concurrency over every repository of the org into `org-wide-workflow-concurrency*.csv`, when
+    CONCURRENCY_TIMELINE is set. Returns the concurrency files."""
+    if not concurrency_timeline():
+        return []
+    subprocess.run(['python', '/run_concurrency.py', runs_file, '--output-prefix', 'org-wide-'])
+    return glob.glob('org-wide-workflow-concurrency*.csv')
+
+
+def compress_stats_files(stats_files):
+    """Compress the stats output files when OUTPUT_COMPRESSION is set."""
+    for stats_file in stats_files:
+        if compression and os.path.exists(stats_file):
+            print(f'  Compressed {stats_file} to {compress_file(stats_file, compression)}')
+
+
+# Merge the output files of every shard, which needs no access to GitHub
+merge_shard_count = os.getenv("MERGE_SHARDS")
+if merge_shard_count:
+    merge_shards(int(merge_shard_count))
+    if os.getenv("RUNS_DB"):
+        subprocess.run(['python', '/workflow_runs_db.py', 'load', org_runs_base_file, '--db', os.getenv("RUNS_DB")])
+    compress_stats_files(['org-workflow-stats.csv'] + extra_stats_files('org-')
+                         + evaluate_org_concurrency(org_runs_base_file))
+    sys.exit(0)
 
 # Get environment variables
-gh_token = os.getenv("GH_TOKEN")
-if not gh_token:
+gh_tokens = environment_tokens()
+if not gh_tokens:
     raise ValueError("GITHUB_TOKEN environment variable not set")
+gh_token = gh_tokens[0]
 
 owner_name = os.getenv("OWNER_NAME")
 if not owner_name:
     raise ValueError("OWNER_NAME environment variable not set")
+owner_names = [owner for owner in re.split(r'[\s,]+', owner_name) if owner]
+multi_owner = len(owner_names) > 1
 
 start_date = os.getenv("START_DATE")
 if not start_date:
@@ -49,56 +175,252 @@ if not end_date:
     raise ValueError("END_DATE environment variable not set")
 
 repo_name = os.getenv("REPO_NAME")
+if repo_name and multi_owner:
+    raise ValueError("REPO_NAME can only be set with a single OWNER_NAME")
+
+repo_concurrency = max(1, int(os.getenv("REPO_CONCURRENCY") or 1))
+pipeline_depth = max(1, int(os.getenv("PIPELINE_DEPTH") or 2))
+
+# The stats state of evaluate_workflow_runs.py holds the workflows of a single repository
+if os.getenv("STATS_STATE") and not repo_name:
+    raise ValueError("STATS_STATE can only be set with REPO_NAME")
 
 sleep_time = os.getenv("DELAY_BETWEEN_QUERY")
 
+runs_db = os.getenv("RUNS_DB")
+
+# The repositories of an org are fetched in their own working directories, so the timing cache and archive
+# directories are made absolute for every child process
+if billable_timing():
+    os.environ["TIMING_CACHE_DIR"] = os.path.abspath(timing_cache_dir())
+if archive_dir():
+    os.environ["ARCHIVE_DIR"] = os.path.abspath(archive_dir())
+
+shard_count = int(os.getenv("SHARD_COUNT") or 1)
+shard_index = int(os.getenv("SHARD_INDEX") or 0)
+if not 0 <= shard_index < shard_count:
+    raise ValueError("SHARD_INDEX must be between 0 and SHARD_COUNT - 1")
+
+dry_run = os.getenv("DRY_RUN", "").lower() in ["1", "true", "yes"]
+api_budget = int(os.getenv("API_BUDGET")) if os.getenv("API_BUDGET") else None
+time_budget = int(os.getenv("TIME_BUDGET")) if os.getenv("TIME_BUDGET") else None
+budget_policy = os.getenv("BUDGET_POLICY") or "refuse"
+
 
 # Authenticate with GitHub CLI
 subprocess.run(['gh', 'auth', 'login', '--with-token'], input=gh_token.encode())
 
 # Get list of repository names if no repository name is specified
 if not repo_name:
-    # Get list of repository names
-    cmd = f'gh api orgs/{owner_name}/repos --jq \'.[] | .name\''
-    query_output = subprocess.check_output(cmd, shell=True, text=True)
-    repo_names = []
-    for line in query_output.strip().split('\n'):
-        repo_names.append(line)
-
-    with open('org-workflow-stats.csv', 'w') as f:
-        f.write('repository_name,workflow_name,average_duration,median_duration,success_rate,total_runs\n')
-    # create a file for org-runs.json 
-    with open('org-runs.json', 'w') as f:
-        f.write('[\n')
-
-    # Get workflow runs for each repository
-    for repo in repo_names:
-
-        # Get workflow runs
-        subprocess.run(['python', '/get_workflow_runs.py', owner_name, repo, start_date, end_date])
+    # Get list of repository names of every owner
+    repos = []
+    for owner in owner_names:
+        query_output = gh_api(f'orgs/{owner}/repos', '.[] | .name', paginate=True)
+        for line in query_output.strip().split('\n'):
+            # Only keep the repositories of this shard
+            shard_key = f'{owner}/{line}' if multi_owner else line
+            if line and (shard_count == 1 or shard_of(shard_key, shard_count) == shard_index):
+                repos.append((owner, line))
+
+    # Name the org output files after the shard, so that the files of every shard can be merged
+    def org_file(file_name):
+        return shard_file(file_name, shard_index) if shard_count > 1 else file_name
+
+    if shard_count > 1:
+        print(f'Shard {shard_index} of {shard_count}: {len(repos)} repositories')
+
+    # Estimate the cost of every repository, schedule the largest first, and fit the plan to the budget, which is
+    # shared by the repositories of every owner
+    plans = None
+    if dry_run or api_budget is not None or time_budget is not None:
+        plans = plan_repos(repos, datetime.fromisoformat(start_date), datetime.fromisoformat(end_date),
+                           int(sleep_time) if sleep_time else 0)
+        rate_limit = remaining_rate_limit()
+        print_plan(plans, rate_limit, repo_concurrency)
+        if dry_run:
+            sys.exit(0)
+        if api_budget is None:
+            api_budget = rate_limit
+        plans = apply_budget(plans, api_budget, time_budget, budget_policy, repo_concurrency)
+        skipped_repos = len(repos) - len(plans)
+        if skipped_repos:
+            print(f'  Warning: {skipped_repos} repositories are skipped as they do not fit the budget')
+        repos = [(plan['owner_name'], plan['repository_name']) for plan in plans]
+    api_calls = {(plan['owner_name'], plan['repository_name']): plan['api_calls'] for plan in plans or []}
+
+    # With several owners, the org output files have an owner column before the repository column
+    key_header = 'owner_name,repository_name' if multi_owner else 'repository_name'
+
+    org_runs_file = org_file(org_runs_base_file)
+    org_stats_file = org_file('org-workflow-stats.csv')
+    with open(org_stats_file, 'w') as f:
+        f.write(f'{key_header},workflow_name,{",".join(stats_columns())}\n')
+    # Remove the org stats files of additional groupings, top runs, estimates, concurrency and chains from a previous
+    # run, as they are appended to per repository
+    for pattern in ['org-workflow-stats-by-*.csv', 'org-workflow-top-runs.csv', 'org-workflow-stats-estimates.csv',
+                    'org-workflow-concurrency*.csv', 'org-workflow-chains.csv']:
+        for stats_file in glob.glob(org_file(pattern)):
+            os.remove(stats_file)
+    # create a file for org-runs.json, which the runs of every repository are written to as they are read
+    org_runs_writer = RunsWriter(org_runs_file)
+
+    def write_repo(owner, repo, work_dir):
+        """Append the workflow runs and stats of a repository in work_dir to the org files."""
+        key = f'{owner},{repo}' if multi_owner else repo
         # Read every JSON record in runs.json, add repo name to each record, and append to org-runs.json
-        with open('runs.json', 'r') as f1, open('org-runs.json', 'a') as f2:
-            data = json.load(f1)
-            for record in data:
-                record['repository_name'] = str(repo)
-            for i, record in enumerate(data):
-                json.dump(record, f2)
-                if i != len(data) - 1:
-                    f2.write(',\n')
-                else:
-                    f2.write('\n]')
-
-        # Evaluate workflow runs statistics
-        subprocess.run(['python', '/evaluate_workflow_runs.py'])
+        for record in iter_runs(os.path.join(work_dir, runs_file)):
+            if multi_owner:
+                record['owner_name'] = owner
+            record['repository_name'] = str(repo)
+            org_runs_writer.write(record)
+
         # Read every line of workflow-stats.csv skipping the header line, add repo name to the beginning of each line, and write to all-workflow-stats.csv
-        with open('workflow-stats.csv', 'r') as f:
+        with open(os.path.join(work_dir, 'workflow-stats.csv'), 'r') as f:
             lines = f.readlines()
-            with open('org-workflow-stats.csv', 'a') as f2:
+            with open(org_stats_file, 'a') as f2:
+                for line in lines[1:]:
+                    f2.write(f'{key},{line}')
+        # Do the same for the stats file of every additional grouping in GROUP_BY, the top runs and the estimates
+        for stats_file in extra_stats_files(os.path.join(work_dir, '')):
+            with open(stats_file, 'r') as f:
+                lines = f.readlines()
+            org_grouping_file = org_file(f'org-{os.path.basename(stats_file)}')
+            is_new_file = not os.path.exists(org_grouping_file)
+            with open(org_grouping_file, 'a') as f2:
+                if is_new_file:
+                    f2.write(f'{key_header},{lines[0]}')
                 for line in lines[1:]:
-                    f2.write(f'{repo},{line}')
-        if sleep_time:
-            print(f'  Sleeping for {sleep_time} seconds to prevent rate limiting...')
-            time.sleep(int(sleep_time))
+                    f2.write(f'{key},{line}')
+
+    # Every repository goes through a pipeline of three stages, which run at the same time on different repositories:
+    # fetching (network-bound), evaluating (CPU-bound) and writing to the org files (disk-bound). The stages are
+    # connected by bounded queues, so that a stage that falls behind blocks the stages before it, and no more than
+    # PIPELINE_DEPTH repositories wait between two stages
+    work_queue = queue.Queue()
+    for repo in repos:
+        work_queue.put(repo)
+    evaluate_queue = queue.Queue(maxsize=pipeline_depth)
+    write_queue = queue.Queue(maxsize=pipeline_depth)
+    work_dir_counter = itertools.count()
+    # Errors of every stage, which are raised once every other repository has gone through the pipeline
+    stage_errors = []
+
+    # The stats of a repository whose runs have not changed are reused from the evaluation cache
+    cache_dir = evaluation_cache_dir()
+    evaluation_cache = EvaluationCache(os.path.abspath(cache_dir)) if cache_dir else None
+    reused_repos = []
+
+    def evaluate_repo(owner, repo, work_dir):
+        """Evaluate the workflow runs statistics of a repository in work_dir, or reuse them from the cache."""
+        if evaluation_cache is None:
+            subprocess.run(['python', '/evaluate_workflow_runs.py'], cwd=work_dir)
+            return
+        digest = runs_digest(work_dir, runs_file)
+        if not force_evaluation() and evaluation_cache.restore(owner, repo, digest, work_dir):
+            print(f'[{owner}/{repo}]: The workflow runs are unchanged, the stats of the previous evaluation are reused')
+            reused_repos.append((owner, repo))
+            return
+        subprocess.run(['python', '/evaluate_workflow_runs.py'], cwd=work_dir)
+        stats_file = os.path.join(work_dir, 'workflow-stats.csv')
+        if os.path.exists(stats_file):
+            evaluation_cache.store(owner, repo, digest, [stats_file] + extra_stats_files(os.path.join(work_dir, '')))
+
+    def fetch_stage():
+        """Get the workflow runs of repositories from the shared work queue until it is empty."""
+        while True:
+            try:
+                owner, repo = work_queue.get_nowait()
+            except queue.Empty:
+                return
+            work_dir = None
+            try:
+                # Wait until the tokens have the quota for the estimated API calls of the repository
+                pool = token_pool()
+                if pool is not None and (owner, repo) in api_calls:
+                    pool.wait_for_quota(api_calls[(owner, repo)])
+                # Every repository has its own working directory, as the runs and stats files of a repository share
+                # their names
+                work_dir = os.path.join(WORK_DIR, f'repo-{next(work_dir_counter)}')
+                os.makedirs(work_dir)
+                if os.path.isfile('workflow-names.txt'):
+                    shutil.copy('workflow-names.txt', work_dir)
+                # Get workflow runs
+                subprocess.run(['python', '/get_workflow_runs.py', owner, repo, start_date, end_date], cwd=work_dir)
+            except Exception as e:
+                # Keep fetching the other repositories
+                print(f'  Error: The workflow runs of {owner}/{repo} could not be retrieved: {e}')
+                stage_errors.append(e)
+                if work_dir is not None:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+                continue
+            evaluate_queue.put((owner, repo, work_dir))
+            if sleep_time:
+                print(f'  Sleeping for {sleep_time} seconds to prevent rate limiting...')
+                time.sleep(int(sleep_time))
+
+    def evaluate_stage():
+        try:
+            while True:
+                item = evaluate_queue.get()
+                if item is None:
+                    return
+                owner, repo, work_dir = item
+                try:
+                    evaluate_repo(owner, repo, work_dir)
+                except Exception as e:
+                    # Keep evaluating the other repositories, so that the fetchers are not blocked
+                    print(f'  Error: The workflow runs of {owner}/{repo} could not be evaluated: {e}')
+                    stage_errors.append(e)
+                    shutil.rmtree(work_dir, ignore_errors=True)
+                    continue
+                write_queue.put(item)
+        finally:
+            # The write stage always ends, even if this stage does not
+            write_queue.put(None)
+
+    def write_stage():
+        while True:
+            item = write_queue.get()
+            if item is None:
+                return
+            owner, repo, work_dir = item
+            try:
+                write_repo(owner, repo, work_dir)
+            except Exception as e:
+                # Keep writing the other repositories, so that the stages before are not blocked
+                print(f'  Error: The workflow runs of {owner}/{repo} could not be written: {e}')
+                stage_errors.append(e)
+            finally:
+                shutil.rmtree(work_dir)
+
+    # Get workflow runs for each repository, from a work queue shared by every owner. The working directories of an
+    # interrupted run are removed first
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+    os.makedirs(WORK_DIR)
+    stages = [threading.Thread(target=evaluate_stage), threading.Thread(target=write_stage)]
+    fetchers = [threading.Thread(target=fetch_stage) for _ in range(repo_concurrency)]
+    for thread in stages + fetchers:
+        thread.start()
+    for fetcher in fetchers:
+        fetcher.join()
+    evaluate_queue.put(None)
+    for stage in stages:
+        stage.join()
+    shutil.rmtree(WORK_DIR)
+
+    # Close the JSON array in org-runs.json
+    org_runs_writer.close()
+    if evaluation_cache is not None:
+        print(f'  Info: The stats of {len(reused_repos)} of {len(repos)} repositories are reused from {cache_dir}')
+    if stage_errors:
+        raise stage_errors[0]
+
+    # Load the workflow runs into the SQLite database, and compress the stats files, which are both done after
+    # merging when the org is sharded
+    if shard_count == 1:
+        if runs_db:
+            subprocess.run(['python', '/workflow_runs_db.py', 'load', org_runs_file, '--db', runs_db])
+        compress_stats_files([org_stats_file] + extra_stats_files('org-') + evaluate_org_concurrency(org_runs_file))
 
 else:
     # Get workflow runs
@@ -106,3 +428,9 @@ else:
 
     # Evaluate workflow runs statistics
     subprocess.run(['python', '/evaluate_workflow_runs.py'])
+
+    # Load the workflow runs into the SQLite database
+    if runs_db:
+        subprocess.run(['python', '/workflow_runs_db.py', 'load', runs_file, '--db', runs_db, '--repository', repo_name])
+
+    compress_stats_files(['workflow-stats.csv'] + extra_stats_files())
@@ -0,0 +1,222 @@
+"""
+workflow_runs_db.py - Load workflow runs into a SQLite database and query workflow statistics with SQL.
+
+Usage:
+    python workflow_runs_db.py load <runs_file> [--db <db_file>] [--repository <repo_name>] [--replace]
+    python workflow_runs_db.py stats [--db <db_file>] [--group-by <column> ...] [--since <date>] [--until <date>]
+                                     [--repository <repo_name>] [--output <csv_file>]
+
+Requirements:
+    - Python 3.x (the `sqlite3` module must support window functions, i.e. SQLite 3.25 or newer)
+
+Description:
+    The `load` command reads a `runs.json` or `org-runs.json` file, or a compressed runs file such as
+    `org-runs.ndjson.gz`, and inserts every workflow run into the `runs` table of the SQLite database (default
+    `workflow-runs.db`). The table is indexed on (repository_name, name, run_started_at) and on (conclusion), so that
+    slicing questions over millions of runs are answered without re-parsing the JSON file. Runs are keyed by their
+    `url`, so loading the same file twice does not duplicate records. For a single repository `runs.json`, which has no
+    `repository_name` field, the repository name can be given with `--repository`. The runs of an `org-runs.json` file
+    collected from several orgs also have an `owner_name` field, which can be used as a GROUP BY dimension. The runs
+    collected with `BILLABLE_TIMING` also have their billable milliseconds in the `billable_ms_ubuntu`,
+    `billable_ms_macos` and `billable_ms_windows` columns.
+
+    The `stats` command reproduces `workflow-stats.csv` with SQL. By default the runs are grouped by workflow name,
+    and extra GROUP BY dimensions can be given with `--group-by`, e.g. `--group-by repository_name name head_branch`.
+    The stats are calculated with the same definitions as `evaluate_workflow_runs.py`:
+
+        - average_duration: The average duration of the runs (in seconds).
+        - median_duration: The median duration of the runs (in seconds).
+        - success_rate: The percentage of successful or skipped runs.
+        - total_runs: The total number of runs.
+
+    The `--since` and `--until` options limit the runs by `run_started_at` (inclusive, ISO 8601 format).
+
+Output:
+    - `load`: The SQLite database file.
+    - `stats`: Workflow statistics in CSV, written to stdout or to the `--output` file.
+
+Example:
+    python workflow_runs_db.py load org-runs.json
+    python workflow_runs_db.py stats --group-by repository_name name event --since 2023-07-24
+"""
+
+import argparse
+import csv
+import sqlite3
+import sys
+
+from profiling import start_profiling
+from workflow_runs_io import iter_runs
+
+DB_FILE = 'workflow-runs.db'
+
+# Columns of the runs table, in the order they are inserted
+COLUMNS = [
+    ('url', 'TEXT PRIMARY KEY'),
+    ('owner_name', 'TEXT'),
+    ('repository_name', 'TEXT'),
+    ('name', 'TEXT'),
+    ('conclusion', 'TEXT'),
+    ('status', 'TEXT'),
+    ('event', 'TEXT'),
+    ('head_branch', 'TEXT'),
+    ('head_sha', 'TEXT'),
+    ('actor', 'TEXT'),
+    ('display_title', 'TEXT'),
+    ('run_number', 'INTEGER'),
+    ('run_attempt', 'INTEGER'),
+    ('created_at', 'TEXT'),
+    ('run_started_at', 'TEXT'),
+    ('updated_at', 'TEXT'),
+    ('duration', 'REAL'),
+    ('billable_ms_ubuntu', 'INTEGER'),
+    ('billable_ms_macos', 'INTEGER'),
+    ('billable_ms_windows', 'INTEGER'),
+]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+
+# Columns that can be used as GROUP BY dimensions
+GROUP_BY_COLUMNS = [
+    'owner_name', 'repository_name', 'name', 'conclusion', 'status', 'event', 'head_branch', 'actor', 'run_attempt'
+]
+
+# Header names of the GROUP BY dimensions in the CSV output, matching workflow-stats.csv
+HEADER_NAMES = {'name': 'workflow_name'}
+
+BATCH_SIZE = 10000
+
+
+def connect(db_file):
+    """Open the database and create the runs table and its indexes if they do not exist."""
+    conn = sqlite3.connect(db_file)
+    columns = ', '.join(f'{name} {kind}' for name, kind in COLUMNS)
+    conn.execute(f'CREATE TABLE IF NOT EXISTS runs ({columns})')
+    # Add the columns that are missing from a database created by an earlier version
+    existing_columns = set(row[1] for row in conn.execute('PRAGMA table_info(runs)'))
+    for name, kind in COLUMNS:
+        if name not in existing_columns:
+            conn.execute(f'ALTER TABLE runs ADD COLUMN {name} {kind}')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_runs_repository_name_started '
+                 'ON runs (repository_name, name, run_started_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_runs_conclusion ON runs (conclusion)')
+    return conn
+
+
+def load_runs(runs_file, db_file=DB_FILE, repository=None, replace=False):
+    """Insert the workflow runs of runs_file into the database. Returns the number of runs loaded."""
+    conn = connect(db_file)
+    # The database can be rebuilt from the runs file at any time, so durability is traded for load speed
+    conn.execute('PRAGMA synchronous = OFF')
+    placeholders = ', '.join('?' for _ in COLUMN_NAMES)
+    insert = f'INSERT OR REPLACE INTO runs ({", ".join(COLUMN_NAMES)}) VALUES ({placeholders})'
+    with conn:
+        if replace:
+            conn.execute('DELETE FROM runs')
+        batch = []
+        total = 0
+        for run in iter_runs(runs_file):
+            total += 1
+            if repository is not None and not run.get('repository_name'):
+                run['repository_name'] = repository
+            batch.append(tuple(run.get(name) for name in COLUMN_NAMES))
+            if len(batch) >= BATCH_SIZE:
+                conn.executemany(insert, batch)
+                batch = []
+        conn.executemany(insert, batch)
+    conn.close()
+    return total
+
+
+def query_stats(db_file=DB_FILE, group_by=('name',), since=None, until=None, repository=None):
+    """Return the header and rows of the workflow statistics, grouped by the group_by columns."""
+    for column in group_by:
+        if column not in GROUP_BY_COLUMNS:
+            raise ValueError(f'Invalid group by column: {column}. Valid columns are: {", ".join(GROUP_BY_COLUMNS)}')
+    dims = ', '.join(group_by)
+
+    conditions = []
+    params = []
+    if repository:
+        conditions.append('repository_name = ?')
+        params.append(repository)
+    if since:
+        conditions.append('run_started_at >= ?')
+        params.append(since)
+    if until:
+        # Include every run started on the until date when only a date is given
+        conditions.append('run_started_at <= ?')
+        params.append(until + 'T23:59:59Z' if len(until) == 10 else until)
+    where = f'WHERE {" AND ".join(conditions)}' if conditions else ''
+
+    # The median is the average of the middle one or two durations of each group, ranked by a window function
+    sql = f'''
+        WITH ranked AS (
+            SELECT {dims}, duration, conclusion,
+                   ROW_NUMBER() OVER (PARTITION BY {dims} ORDER BY duration) AS rn,
+                   COUNT(*) OVER (PARTITION BY {dims}) AS cnt
+            FROM runs {where}
+        )
+        SELECT {dims},
+               AVG(duration),
+               AVG(CASE WHEN rn IN ((cnt + 1) / 2, (cnt + 2) / 2) THEN duration END),
+               100.0 * SUM(CASE WHEN conclusion IN ('success', 'skipped') THEN 1 ELSE 0 END) / COUNT(*),
+               COUNT(*)
+        FROM ranked
+        GROUP BY {dims}
+        ORDER BY {dims}
+    '''
+    conn = connect(db_file)
+    rows = conn.execute(sql, params).fetchall()
+    conn.close()
+
+    header = [HEADER_NAMES.get(column, column) for column in group_by]
+    header += ['average_duration', 'median_duration', 'success_rate', 'total_runs']
+    n = len(group_by)
+    stats = []
+    for row in rows:
+        average_duration, median_duration, success_rate, total_runs = row[n:]
+        stats.append(list(row[:n]) + [
+            f'{average_duration:.2f}', f'{median_duration:.2f}', f'{success_rate:.2f}', total_runs
+        ])
+    return header, stats
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Load workflow runs into SQLite and query workflow statistics.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    load_parser = subparsers.add_parser('load', help='Load a runs JSON file into the database')
+    load_parser.add_argument('runs_file')
+    load_parser.add_argument('--db', default=DB_FILE)
+    load_parser.add_argument('--repository', help='Repository name for runs without a repository_name field')
+    load_parser.add_argument('--replace', action='store_true', help='Delete the existing runs before loading')
+
+    stats_parser = subparsers.add_parser('stats', help='Evaluate workflow statistics with SQL')
+    stats_parser.add_argument('--db', default=DB_FILE)
+    stats_parser.add_argument('--group-by', nargs='+', default=['name'], choices=GROUP_BY_COLUMNS)
+    stats_parser.add_argument('--since', help='Only include runs started on or after this date')
+    stats_parser.add_argument('--until', help='Only include runs started on or before this date')
+    stats_parser.add_argument('--repository', help='Only include runs of this repository')
+    stats_parser.add_argument('--output', help='CSV file to write the stats to, instead of stdout')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'load':
+        total = load_runs(args.runs_file, args.db, args.repository, args.replace)
+        print(f'  Loaded {total} workflow runs from {args.runs_file} into {args.db}')
+        return
+
+    header, rows = query_stats(args.db, args.group_by, args.since, args.until, args.repository)
+    f = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(rows)
+    finally:
+        if args.output:
+            f.close()
+
+
+if __name__ == '__main__':
+    start_profiling('workflow_runs_db')
+    main(sys.argv[1:])
@@ -0,0 +1,179 @@
+"""
+workflow_runs_io.py - Read and write workflow runs files, optionally with streaming compression.
+
+Description:
+    Workflow runs files are written in one of the following layouts, depending on the `OUTPUT_COMPRESSION`
+    environment variable:
+
+        - Not set: A JSON array with one record per line, e.g. `runs.json`.
+        - `gzip`: Newline-delimited JSON compressed with gzip, e.g. `runs.ndjson.gz`.
+        - `zstd`: Newline-delimited JSON compressed with Zstandard, e.g. `runs.ndjson.zst`. This requires the
+          `zstandard` package.
+
+    Records are compressed as they are written and decompressed as they are read, so that the whole file is never
+    held in memory. Newline-delimited JSON files are read one record at a time. Plain JSON arrays of any layout can
+    also be read, in which case the array is loaded in one go. Records are parsed and serialised with the backend
+    selected by `json_backend.py`.
+
+    Run cache files (`.runcache`), which are converted from runs files with `run_cache.py`, are also read, from their
+    memory-mapped columns instead of JSON.
+"""
+
+import gzip
+import io
+import os
+
+import json_backend
+from run_cache import is_run_cache, iter_cached_runs
+
+# Suffix of the runs files for every compression
+RUNS_SUFFIXES = {
+    None: '.json',
+    'gzip': '.ndjson.gz',
+    'zstd': '.ndjson.zst',
+}
+
+COMPRESSION_ALIASES = {
+    '': None,
+    'none': None,
+    'gzip': 'gzip',
+    'gz': 'gzip',
+    'zstd': 'zstd',
+    'zst': 'zstd',
+}
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def output_compression():
+    """Return the compression of the output files configured in the `OUTPUT_COMPRESSION` environment variable."""
+    value = os.getenv('OUTPUT_COMPRESSION', '').strip().lower()
+    if value not in COMPRESSION_ALIASES:
+        raise ValueError(f'Invalid OUTPUT_COMPRESSION: {value}. Valid values are: gzip, zstd')
+    return COMPRESSION_ALIASES[value]
+
+
+def runs_file_name(base, compression=None):
+    """Return the name of a runs file, e.g. `runs.ndjson.gz` for base `runs` and gzip compression."""
+    return base + RUNS_SUFFIXES[compression]
+
+
+def compressed_file_name(file_name, compression):
+    """Return the name of a compressed output file, e.g. `workflow-stats.csv.gz`."""
+    if compression is None:
+        return file_name
+    return file_name + ('.gz' if compression == 'gzip' else '.zst')
+
+
+def find_runs_file(base):
+    """Return the existing runs file with the given base name, preferring the configured compression."""
+    preferred = runs_file_name(base, output_compression())
+    candidates = [preferred] + [runs_file_name(base, c) for c in RUNS_SUFFIXES if runs_file_name(base, c) != preferred]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return preferred
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('The zstandard package is required for zstd compression: pip install zstandard')
+    return zstandard
+
+
+def open_file(path, mode='r'):
+    """Open a text file, compressing or decompressing it as a stream based on its suffix."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', compresslevel=GZIP_LEVEL, encoding='utf-8')
+    if path.endswith('.zst'):
+        zstandard = _zstandard()
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(open(path, mode + 'b'))
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, mode)
+
+
+def is_ndjson(path):
+    return '.ndjson' in os.path.basename(path)
+
+
+def iter_record_lines(path):
+    """Yield the JSON text of every record in a runs file written by RunsWriter, without parsing it."""
+    with open_file(path, 'r') as f:
+        for line in f:
+            record = line.strip()
+            if not is_ndjson(path):
+                record = record.rstrip(',')
+                if record in ('[', ']'):
+                    continue
+            if record:
+                yield record
+
+
+def iter_runs(path, fields=None):
+    """Yield every workflow run in a runs file.
+
+    Only the given fields of the runs of a run cache are read, if fields is set. Runs from JSON hold every field.
+    """
+    if is_run_cache(path):
+        yield from iter_cached_runs(path, fields)
+    elif is_ndjson(path):
+        for record in iter_record_lines(path):
+            yield json_backend.loads(record)
+    else:
+        # A JSON array may be written on a single line, so it is loaded as a whole
+        with open_file(path, 'r') as f:
+            yield from json_backend.load(f)
+
+
+class RunsWriter:
+    """Writes workflow runs to a runs file one record at a time, in the layout of its suffix."""
+
+    def __init__(self, path):
+        self.path = path
+        self.ndjson = is_ndjson(path)
+        self.total = 0
+        self.f = open_file(path, 'w')
+        if not self.ndjson:
+            self.f.write('[')
+
+    def write_raw(self, record):
+        """Write the JSON text of a record."""
+        if self.ndjson:
+            self.f.write(record)
+            self.f.write('\n')
+        else:
+            self.f.write(',\n' if self.total else '\n')
+            self.f.write(record)
+        self.total += 1
+
+    def write(self, run):
+        self.write_raw(json_backend.dumps(run))
+
+    def close(self):
+        if not self.ndjson:
+            self.f.write('\n]\n')
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def compress_file(path, compression):
+    """Compress a file with the given compression, replacing it. Returns the name of the compressed file."""
+    if compression is None:
+        return path
+    compressed_path = compressed_file_name(path, compression)
+    with open(path, 'r') as f1, open_file(compressed_path, 'w') as f2:
+        for line in f1:
+            f2.write(line)
+    os.remove(path)
+    return compressed_path
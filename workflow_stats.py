@@ -0,0 +1,212 @@
+"""
+workflow_stats.py - Definitions of the workflow run statistics shared by the workflow metrics scripts.
+
+Description:
+    This module holds the definitions that the statistics in `workflow-stats.csv` are based on, so that every script
+    that evaluates workflow runs calculates them in the same way:
+
+        - The duration of a run is the difference between its `updated_at` and `run_started_at` fields, in seconds.
+        - A run is successful if its conclusion is either `success` or `skipped`.
+        - The average and median durations are calculated over all runs of a group.
+        - The success rate is the percentage of successful runs of a group.
+
+    `WorkflowStats` accumulates the runs of one group (e.g. one workflow) and formats the stats columns of a row.
+    `TopRuns` keeps the slowest and the most retried runs of one group.
+
+    The duration of a run is wall-clock time, which does not tell what a run costs: the jobs of a matrix run in
+    parallel, and the minutes of every job are billed. When the `BILLABLE_TIMING` environment variable is set, the
+    billable milliseconds of every run on each runner OS are retrieved (see `run_timing.py`) into the
+    `billable_ms_<os>` fields of the run, and `BillableTime` sums them per group.
+
+    The durations of a group are spilled to disk when the durations of every group exceed a memory budget, in which
+    case the stats are calculated from the spilled durations with the same results (see `duration_spill.py`).
+"""
+
+import heapq
+import itertools
+import os
+import statistics
+
+from datetime import datetime
+
+from duration_spill import SELECT_BUCKETS, SpilledDurations, exact_mean, select
+
+SUCCESS_CONCLUSIONS = ['success', 'skipped']
+
+STATS_COLUMNS = ['average_duration', 'median_duration', 'success_rate', 'total_runs']
+
+# Runner OSes of the billable time of a run, as named by the GitHub API, and the run fields of their billable time
+BILLABLE_OSES = ['UBUNTU', 'MACOS', 'WINDOWS']
+BILLABLE_FIELDS = [f'billable_ms_{os_name.lower()}' for os_name in BILLABLE_OSES]
+
+BILLABLE_COLUMNS = BILLABLE_FIELDS + ['billable_ms']
+
+TOP_RUNS_COLUMNS = ['ranking', 'rank', 'url', 'head_branch', 'run_number', 'run_attempt', 'duration']
+
+# Header names of the run fields used as grouping columns in the CSV files
+HEADER_NAMES = {'name': 'workflow_name'}
+
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp from the GitHub API, e.g. `2023-08-05T01:50:57Z`."""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def run_duration(run):
+    """Return the duration of a workflow run in seconds."""
+    return (parse_timestamp(run['updated_at']) - parse_timestamp(run['run_started_at'])).total_seconds()
+
+
+def is_successful(run):
+    """Return whether a workflow run counts towards the success rate."""
+    return run['conclusion'] in SUCCESS_CONCLUSIONS
+
+
+def billable_timing():
+    """Return whether the billable time of the runs is retrieved and evaluated, as set in `BILLABLE_TIMING`."""
+    return os.getenv('BILLABLE_TIMING', '').lower() in ['1', 'true', 'yes']
+
+
+def stats_columns():
+    """Return the stats columns of `workflow-stats.csv`, with the billable time columns if enabled."""
+    return STATS_COLUMNS + BILLABLE_COLUMNS if billable_timing() else STATS_COLUMNS
+
+
+def stats_row(stats):
+    """Return the stats columns of a group, e.g. a `WorkflowStats`, with the billable time columns if enabled."""
+    return stats.row() + stats.billable.row() if billable_timing() else stats.row()
+
+
+def header_name(field):
+    """Return the CSV header name of a grouping field."""
+    return HEADER_NAMES.get(field, field)
+
+
+class BillableTime:
+    """Sums the billable milliseconds of the runs of one group on each runner OS."""
+
+    def __init__(self, billable_ms=None):
+        self.billable_ms = dict.fromkeys(BILLABLE_FIELDS, 0)
+        self.billable_ms.update(billable_ms or {})
+
+    def add(self, run):
+        for field in BILLABLE_FIELDS:
+            self.billable_ms[field] += run.get(field) or 0
+
+    def merge(self, other):
+        for field in BILLABLE_FIELDS:
+            self.billable_ms[field] += other.billable_ms[field]
+
+    def subtract(self, other):
+        for field in BILLABLE_FIELDS:
+            self.billable_ms[field] -= other.billable_ms[field]
+
+    def row(self):
+        """Return the billable time columns, formatted as in `workflow-stats.csv`."""
+        return [self.billable_ms[field] for field in BILLABLE_FIELDS] + [sum(self.billable_ms.values())]
+
+
+class WorkflowStats:
+    """Accumulates the durations and conclusions of the runs of one group.
+
+    If a DurationBudget is given, the durations are spilled to disk when the budget is exceeded.
+    """
+
+    def __init__(self, budget=None):
+        self.durations = []
+        self.successes = 0
+        self.budget = budget
+        self.spilled = None
+        self.billable = BillableTime()
+
+    @property
+    def total_runs(self):
+        return len(self.durations) + (self.spilled.count if self.spilled else 0)
+
+    def add(self, run):
+        self.durations.append(run['duration'])
+        if is_successful(run):
+            self.successes += 1
+        if self.budget is not None:
+            self.budget.added(self)
+
+    def spill(self, spill_file):
+        """Move the durations held in memory to a spill file."""
+        if self.spilled is None:
+            self.spilled = SpilledDurations(spill_file)
+        self.spilled.append(self.durations)
+        self.durations = []
+
+    def iter_durations(self):
+        """Return an iterator over the durations, including the spilled durations."""
+        if self.spilled is None:
+            return iter(self.durations)
+        return itertools.chain(self.spilled, self.durations)
+
+    def median(self):
+        """Return the median duration, as `statistics.median` returns it for the list of durations."""
+        if self.spilled is None:
+            return statistics.median(self.durations)
+        n = self.total_runs
+        # A pass of the selection holds as many counters as the durations of a bucket that are sorted in memory
+        max_in_memory = max(SELECT_BUCKETS, self.budget.max_durations - self.budget.in_memory) if self.budget else n
+        high = select(self.iter_durations, n, n // 2, max_in_memory)
+        if n % 2 == 1:
+            return high
+        return (select(self.iter_durations, n, n // 2 - 1, max_in_memory) + high) / 2
+
+    def mean(self):
+        """Return the average duration, as `statistics.mean` returns it for the list of durations."""
+        if self.spilled is None:
+            return statistics.mean(self.durations)
+        return exact_mean(self.iter_durations())
+
+    def row(self):
+        """Return the stats columns, formatted as in `workflow-stats.csv`."""
+        if self.total_runs == 0:
+            return ['0.00', '0.00', '0.00', 0]
+        return [
+            f'{self.mean():.2f}',
+            f'{self.median():.2f}',
+            f'{self.successes / self.total_runs * 100:.2f}',
+            self.total_runs,
+        ]
+
+
+class TopRuns:
+    """Keeps the k slowest runs and the k runs with the most attempts of one group, in bounded heaps.
+
+    Each heap holds at most k runs, with the smallest of them on top, so that a run is added in O(log k) time.
+    """
+
+    # Rankings, and the run field that every ranking is ordered by
+    RANKINGS = [('slowest', 'duration'), ('most_retried', 'run_attempt')]
+
+    def __init__(self, k):
+        self.k = k
+        self.heaps = {ranking: [] for ranking, _ in self.RANKINGS}
+        # Breaks the ties between runs with the same value, in favour of the run that was added first
+        self.counter = itertools.count()
+
+    def add(self, run):
+        for ranking, field in self.RANKINGS:
+            value = run.get(field) or 0
+            if field == 'run_attempt' and value <= 1:
+                # A run without any retry is not retried at all
+                continue
+            entry = (value, -next(self.counter), run)
+            heap = self.heaps[ranking]
+            if len(heap) < self.k:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+
+    def rows(self):
+        """Return the top runs of every ranking, formatted as the columns of TOP_RUNS_COLUMNS."""
+        rows = []
+        for ranking, _ in self.RANKINGS:
+            entries = sorted(self.heaps[ranking], key=lambda entry: entry[:2], reverse=True)
+            for rank, (_, _, run) in enumerate(entries, start=1):
+                rows.append([ranking, rank, run.get('url'), run.get('head_branch'), run.get('run_number'),
+                             run.get('run_attempt'), run.get('duration')])
+        return rows